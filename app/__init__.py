@@ -1 +1,4 @@
-# ArabicOCR application package
\ No newline at end of file
+# ArabicOCR application package
+
+# Load .env before any module reads its settings from the environment
+from app import config  # noqa: F401
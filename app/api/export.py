@@ -1,54 +1,110 @@
 from fastapi import APIRouter, Body, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 import tempfile
-from typing import Dict, Optional
-import uuid
-from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator
 
 # Import utility functions
-from app.utils.document_export import create_docx
+from app.utils.exporters import EXPORT_FORMATS, export_document
+from app.utils.jobs import JOB_COMPLETED, job_manager
+from app.utils.metrics import EXPORT_BYTES, timed
 
 # Create router
 router = APIRouter()
 
-# Temporary directory for file exports
-TEMP_DIR = Path("./temp")
-TEMP_DIR.mkdir(exist_ok=True)
+# Size of the pieces an export is streamed in
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(64 * 1024)))
 
+# Exports larger than this (bytes) are spooled to a temporary file instead of memory
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(32 * 1024 * 1024)))
 
-@router.post("/docx")
-async def export_docx(
-    data: Dict[str, str] = Body(...),
+
+def iter_output(output: BinaryIO, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield the contents of an export in chunks and close it afterwards"""
+    with output:
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def get_job_content(upload_id: str) -> Dict[str, Any]:
+    """Return the OCR result and stored translation and transliteration of a finished job"""
+    job = job_manager.get(upload_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    outputs = job["outputs"]
+    return {
+        "arabic_text": job["result"]["text"],
+        "translated_text": outputs.get("translation", {}).get("text"),
+        "transliterated_text": outputs.get("transliteration", {}).get("text"),
+        "result": job["result"],
+        "source_path": job_manager.get_attachment(upload_id, "source_file"),
+    }
+
+
+@router.get("/formats")
+async def export_formats():
+    """List the available export formats"""
+    return JSONResponse(
+        content={
+            name: {"media_type": export_format.media_type, "extension": export_format.extension}
+            for name, export_format in EXPORT_FORMATS.items()
+        }
+    )
+
+
+@router.post("/{export_format}")
+async def export(
+    export_format: str,
+    data: Dict[str, Any] = Body(...),
 ):
-    """Export Arabic text, translation, and transliteration to a DOCX file"""
+    """Export Arabic text, translation, and transliteration as docx, txt, json, pdf or searchable_pdf
+
+    Send the texts, or an ``upload_id`` to export the results stored with
+    that OCR job; texts sent alongside an ``upload_id`` take precedence.
+    A searchable PDF needs an ``upload_id`` whose upload is still kept.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown export format")
+    format_info = EXPORT_FORMATS[export_format]
+
+    # Pull the stored results of a job so the client does not have to send them back
+    upload_id = data.get("upload_id")
+    content = get_job_content(upload_id) if upload_id else {}
+    for key in ("arabic_text", "translated_text", "transliterated_text"):
+        if data.get(key):
+            content[key] = data[key]
+
+    if not content.get("arabic_text"):
+        raise HTTPException(status_code=400, detail="Arabic text is required")
+    if format_info.needs_source and not content.get("source_path"):
+        raise HTTPException(status_code=400, detail="This format needs the upload_id of a job whose upload is kept")
+
+    # Build the document off the event loop; large exports spill to a temporary file
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
     try:
-        # Get text, translation, and transliteration from request body
-        arabic_text = data.get("arabic_text")
-        translated_text = data.get("translated_text", "")
-        transliterated_text = data.get("transliterated_text", "")
-        
-        if not arabic_text:
-            raise HTTPException(status_code=400, detail="Arabic text is required")
-        
-        # Create a unique filename
-        filename = f"arabic_ocr_{uuid.uuid4()}.docx"
-        output_path = TEMP_DIR / filename
-        
-        # Create the DOCX file
-        create_docx(
-            str(output_path),
-            arabic_text,
-            translated_text,
-            transliterated_text
-        )
-        
-        # Return the file as a download
-        return FileResponse(
-            path=str(output_path),
-            filename=filename,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-    
+        with timed("export"):
+            await run_in_threadpool(export_document, export_format, output, **content)
+        size = output.seek(0, os.SEEK_END)
+        EXPORT_BYTES.inc(size, format=export_format)
+        output.seek(0)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Document export error: {str(e)}")
\ No newline at end of file
+        output.close()
+        raise HTTPException(status_code=500, detail=f"Document export error: {str(e)}")
+
+    # Stream the document back as a download
+    name = f"arabic_ocr_{upload_id}" if upload_id else "arabic_ocr_results"
+    return StreamingResponse(
+        iter_output(output),
+        media_type=format_info.media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{format_info.extension}"',
+            "Content-Length": str(size),
+        },
+    )
@@ -1,108 +1,345 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Body, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+import asyncio
+import json
 import os
-import shutil
-import tempfile
-from typing import List, Optional
+import time
 import uuid
-from pdf2image import convert_from_path
 from pathlib import Path
-import json
+from typing import Any, Dict, Optional
 
 # Import utility functions
-from app.utils.ocr_engines import process_with_qari, process_with_mistral
-from app.utils.file_utils import validate_file, save_upload_file
+from app.utils.admission import AdmissionError, count_pages, ocr_admission
+from app.utils.file_utils import (
+    MAX_FILE_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    FileTooLargeError,
+    save_upload_file,
+    validate_file,
+)
+from app.utils.job_queue import RELEASE_ON_COMPLETE
+from app.utils.jobs import JOB_BACKEND, JOB_FINISHED_STATES, job_manager
+from app.utils.ocr_cache import ocr_cache
+from app.utils.ocr_engines import OCR_ENGINE_REGISTRY, engine_modes
+from app.utils.ocr_pipeline import run_ocr_job
+from app.utils.storage import StorageQuotaError, storage_manager
+from app.utils.uploads import UploadBusyError, UploadOffsetError, UploadSessionManager
 
 # Create router
 router = APIRouter()
 
-# Temporary directory for file uploads
-TEMP_DIR = Path("./temp")
-TEMP_DIR.mkdir(exist_ok=True)
+# Keep uploads until their job expires so they can be exported as searchable PDFs
+KEEP_UPLOADS = os.getenv("KEEP_UPLOADS", "true").lower() == "true"
+
+# Seconds between checks for new job events, and between keep-alive comments
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "0.25"))
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+
+# Resumable uploads in progress
+upload_sessions = UploadSessionManager(storage_manager)
+
+# Error shown when the storage quota is used up
+STORAGE_FULL_DETAIL = "The server is out of upload space. Please try again later."
+
+
+def queue_ocr_job(
+    upload_id: str, file_path: Path, engine: str, use_cache: bool, content_hash: str, priority: int = 0
+) -> Dict[str, Any]:
+    """Queue the OCR job of an upload saved in its storage workspace
+
+    The job runs on the worker pool (or on the OCR workers of the durable
+    queue), off the event loop. An upload still in storage when its job is
+    forgotten (kept for export, or left by a failed job) is released then.
+    """
+    keep_source = KEEP_UPLOADS
+    if JOB_BACKEND == "sqlite":
+        # Worker processes do not share this process's leases; the job may wait in the queue for a while
+        storage_manager.pin(upload_id)
+        # A worker whose lease was taken over must not delete the upload, so the
+        # worker that completes the job releases it (attached before any worker can)
+        keep_source = True
+        if not KEEP_UPLOADS:
+            job_manager.attach(upload_id, RELEASE_ON_COMPLETE, upload_id)
+
+    job = job_manager.submit(
+        upload_id, run_ocr_job, file_path, engine, upload_id, use_cache, keep_source,
+        priority=priority, content_hash=content_hash,
+    )
+    job_manager.attach(upload_id, "workspace", upload_id, cleanup=lambda: storage_manager.release(upload_id))
+    if KEEP_UPLOADS:
+        job_manager.attach(upload_id, "source_file", file_path)
+    return job
 
 
-@router.post("/upload")
+async def admit_job(request: Request, upload_id: str, file_path: Path) -> None:
+    """Hold this request's admission ticket for the upload's job, weighted by its pages
+
+    Raises HTTPException with a Retry-After header if the pages do not fit in
+    the budget of pages in flight.
+    """
+    ticket = getattr(request.state, "admission", None)
+    if ticket is None:
+        return
+
+    pages = await run_in_threadpool(count_pages, file_path)
+    try:
+        ocr_admission.hold(ticket, upload_id, pages)
+    except AdmissionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+@router.post("/upload", status_code=202)
 async def upload_file(
+    request: Request,
     file: UploadFile = File(...),
-    engine: str = Form("qari"),  # Options: qari, mistral, both
-    background_tasks: BackgroundTasks = None,
+    engine: str = Form("qari"),  # Options: see /engines (qari, mistral, both, merge by default)
+    use_cache: bool = Form(True),  # Set to false to force fresh OCR
+    priority: int = Form(0),  # Higher runs first (durable job queue only)
 ):
-    """Upload a file for OCR processing"""
+    """Upload a file and queue it for OCR processing"""
     # Validate file type
     if not validate_file(file.filename):
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDF, PNG, JPG, and JPEG are allowed.")
 
+    # Validate engine before any work is queued
+    if engine not in engine_modes():
+        raise HTTPException(status_code=400, detail="Invalid OCR engine selection")
+
     # Create a unique ID for this upload
     upload_id = str(uuid.uuid4())
-    temp_folder = TEMP_DIR / upload_id
-    temp_folder.mkdir(exist_ok=True)
-
-    # Save the uploaded file
-    file_path = await save_upload_file(file, temp_folder)
-    
-    # Process the file based on its type
-    file_extension = os.path.splitext(file.filename)[1].lower()
-    
     try:
-        extracted_text = ""
-        
-        # Process PDF files
-        if file_extension == ".pdf":
-            # Convert PDF to images
-            images = convert_from_path(file_path)
-            
-            # Save images temporarily
-            image_paths = []
-            for i, image in enumerate(images):
-                img_path = temp_folder / f"page_{i+1}.png"
-                image.save(img_path, "PNG")
-                image_paths.append(img_path)
-            
-            # Process each image with the selected OCR engine
-            page_texts = []
-            for img_path in image_paths:
-                if engine == "qari":
-                    page_text = process_with_qari(str(img_path))
-                elif engine == "mistral":
-                    page_text = process_with_mistral(str(img_path))
-                elif engine == "both":
-                    qari_text = process_with_qari(str(img_path))
-                    mistral_text = process_with_mistral(str(img_path))
-                    page_text = f"Qari OCR:\n{qari_text}\n\nMistral OCR:\n{mistral_text}"
-                else:
-                    raise HTTPException(status_code=400, detail="Invalid OCR engine selection")
-                
-                page_texts.append(page_text)
-            
-            # Combine all page texts
-            extracted_text = "\n\n--- Page Break ---\n\n".join(page_texts)
-        
-        # Process image files
-        else:
-            if engine == "qari":
-                extracted_text = process_with_qari(str(file_path))
-            elif engine == "mistral":
-                extracted_text = process_with_mistral(str(file_path))
-            elif engine == "both":
-                qari_text = process_with_qari(str(file_path))
-                mistral_text = process_with_mistral(str(file_path))
-                extracted_text = f"Qari OCR:\n{qari_text}\n\nMistral OCR:\n{mistral_text}"
-            else:
-                raise HTTPException(status_code=400, detail="Invalid OCR engine selection")
-        
-        # Schedule cleanup of temporary files
-        if background_tasks:
-            background_tasks.add_task(lambda: shutil.rmtree(temp_folder, ignore_errors=True))
-        
-        return JSONResponse(
-            content={
-                "success": True,
-                "text": extracted_text,
-                "upload_id": upload_id,
-            }
-        )
-    
+        workspace = storage_manager.create(upload_id, reserve=file.size or 0)
+    except StorageQuotaError:
+        raise HTTPException(status_code=507, detail=STORAGE_FULL_DETAIL)
+
+    try:
+        # Copy the spooled upload into the workspace, hashing it on the way
+        file_path, content_hash = await save_upload_file(file, workspace)
+        storage_manager.measure(upload_id)
+        await admit_job(request, upload_id, file_path)
+        job = queue_ocr_job(upload_id, file_path, engine, use_cache, content_hash, priority)
+    except FileTooLargeError:
+        storage_manager.release(upload_id)
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {MAX_FILE_SIZE} bytes.")
+    except HTTPException:
+        storage_manager.release(upload_id)
+        raise
     except Exception as e:
         # Clean up on error
-        shutil.rmtree(temp_folder, ignore_errors=True)
-        raise HTTPException(status_code=500, detail=f"OCR processing error: {str(e)}")
\ No newline at end of file
+        ocr_admission.release(upload_id)
+        storage_manager.release(upload_id)
+        raise HTTPException(status_code=500, detail=f"OCR upload error: {str(e)}")
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "upload_id": upload_id,
+            "status": job["status"],
+        }
+    )
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(data: Dict[str, Any] = Body(...)):
+    """Start a resumable upload of a file sent in chunks
+
+    Send ``filename`` and the total ``size`` in bytes, then PATCH the chunks
+    in order to ``/uploads/{upload_id}`` and finish with ``/complete``.
+    """
+    filename = data.get("filename", "")
+    size = data.get("size")
+
+    if not validate_file(filename):
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF, PNG, JPG, and JPEG are allowed.")
+    if not isinstance(size, int) or size <= 0:
+        raise HTTPException(status_code=400, detail="The file size in bytes is required")
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. The limit is {MAX_FILE_SIZE} bytes.")
+
+    try:
+        session = upload_sessions.create(filename, size)
+    except StorageQuotaError:
+        raise HTTPException(status_code=507, detail=STORAGE_FULL_DETAIL)
+    return JSONResponse(status_code=201, content={**session, "chunk_size": UPLOAD_CHUNK_SIZE})
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Get how much of a resumable upload has arrived, to continue from there"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return JSONResponse(content=session)
+
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload_chunk(upload_id: str, request: Request, upload_offset: int = Header(...)):
+    """Append the request body to a resumable upload
+
+    The ``Upload-Offset`` header must match the bytes received so far; the
+    response carries the new offset. If the connection drops, whatever
+    arrived is kept and the client resumes from the offset ``GET`` reports.
+    """
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    # Refuse a chunk that says up front it runs past the declared size
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and upload_offset + int(content_length) > session["size"]:
+        raise HTTPException(status_code=413, detail="Chunk runs past the declared file size")
+
+    try:
+        offset = await upload_sessions.append(upload_id, upload_offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetError as e:
+        return JSONResponse(status_code=409, content={"detail": str(e), "offset": e.offset})
+    except UploadBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileTooLargeError:
+        raise HTTPException(status_code=413, detail="Chunk runs past the declared file size")
+    except ClientDisconnect:
+        # The client is gone; it will ask for the offset when it comes back
+        return JSONResponse(status_code=400, content={"detail": "Client disconnected"})
+
+    return JSONResponse(content={"upload_id": upload_id, "offset": offset, "size": session["size"]})
+
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Cancel a resumable upload and delete what was received"""
+    if not upload_sessions.discard(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return JSONResponse(content={"success": True})
+
+
+@router.post("/uploads/{upload_id}/complete", status_code=202)
+async def complete_upload(upload_id: str, request: Request, data: Dict[str, Any] = Body({})):
+    """Finish a resumable upload and queue it for OCR processing
+
+    Accepts the same ``engine``, ``use_cache`` and ``priority`` options as ``/upload`` and
+    an optional ``sha256`` of the whole file to check the upload against.
+    An upload refused for lack of capacity is kept, to be completed later.
+    """
+    engine = data.get("engine", "qari")
+    use_cache = data.get("use_cache", True)
+    expected_hash = data.get("sha256")
+    priority = data.get("priority", 0)
+
+    # Validate engine before any work is queued
+    if engine not in engine_modes():
+        raise HTTPException(status_code=400, detail="Invalid OCR engine selection")
+    if not isinstance(priority, int):
+        raise HTTPException(status_code=400, detail="The priority must be an integer")
+
+    try:
+        await admit_job(request, upload_id, upload_sessions.part_path(upload_id))
+        file_path, content_hash = await upload_sessions.finish(upload_id)
+    except KeyError:
+        ocr_admission.release(upload_id)
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetError as e:
+        ocr_admission.release(upload_id)
+        return JSONResponse(status_code=409, content={"detail": "Upload is incomplete", "offset": e.offset})
+    except UploadBusyError as e:
+        ocr_admission.release(upload_id)
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if expected_hash and expected_hash.lower() != content_hash:
+        ocr_admission.release(upload_id)
+        storage_manager.release(upload_id)
+        raise HTTPException(status_code=422, detail="The uploaded file does not match the given sha256")
+
+    try:
+        job = queue_ocr_job(upload_id, file_path, engine, use_cache, content_hash, priority)
+    except Exception as e:
+        # Clean up on error
+        ocr_admission.release(upload_id)
+        storage_manager.release(upload_id)
+        raise HTTPException(status_code=500, detail=f"OCR upload error: {str(e)}")
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "upload_id": upload_id,
+            "status": job["status"],
+        }
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status, progress and result of an OCR job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JSONResponse(content=job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Stream the page results and progress of an OCR job as Server-Sent Events"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Resume after the last event a reconnecting client saw
+    cursor = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal cursor
+        last_sent = time.monotonic()
+
+        while True:
+            events, status = job_manager.events_since(job_id, cursor)
+            if status is None:
+                return
+
+            for event in events:
+                data = json.dumps(event["data"], ensure_ascii=False)
+                yield f"id: {cursor}\nevent: {event['event']}\ndata: {data}\n\n"
+                cursor += 1
+                last_sent = time.monotonic()
+
+                if event["event"] in JOB_FINISHED_STATES:
+                    return
+
+            # Keep proxies from closing an idle stream
+            if time.monotonic() - last_sent > SSE_KEEPALIVE_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/engines")
+async def list_engines():
+    """List the registered OCR engines and the engine selections an upload accepts"""
+    return JSONResponse(
+        content={
+            "modes": list(engine_modes()),
+            "engines": {
+                name: {"version": engine.version, "execution": engine.execution, "batch_size": engine.batch_size}
+                for name, engine in OCR_ENGINE_REGISTRY.items()
+            },
+        }
+    )
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Get OCR cache hit, miss and eviction counters"""
+    return JSONResponse(content=ocr_cache.stats())
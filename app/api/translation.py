@@ -1,35 +1,69 @@
 from fastapi import APIRouter, Body, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import os
-from typing import Dict, Optional
-from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
 
 # Import utility functions
-from app.utils.translation import translate_text
-from app.utils.transliteration import transliterate_text
+from app.utils.jobs import JOB_COMPLETED, job_manager
+from app.utils.translation import translate_batch
+from app.utils.transliteration import TRANSLITERATION_SCHEMES, TRANSLITERATION_SCHEME, transliterate_batch, transliterate_text
 
-# Load environment variables
-load_dotenv()
+# Maximum number of items in one batch request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
 
 # Create router
 router = APIRouter()
 
 
+def get_job_text(upload_id: str) -> str:
+    """Return the OCR text of a finished job"""
+    job = job_manager.get(upload_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]["text"]
+
+
+def get_batch_items(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Validate and return the items of a batch request body"""
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Items are required")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (maximum {BATCH_MAX_ITEMS})")
+    if not all(isinstance(item, dict) and isinstance(item.get("text", ""), str) for item in items):
+        raise HTTPException(status_code=400, detail="Each item must be an object with a text field")
+    return items
+
+
 @router.post("/translate")
 async def translate(
     data: Dict[str, str] = Body(...),
 ):
-    """Translate Arabic text to English or other languages"""
+    """Translate Arabic text to English or other languages
+
+    With an ``upload_id`` the OCR text of that job is translated when no text
+    is sent, and the translation is stored with the job for export.
+    """
+    upload_id = data.get("upload_id")
+
+    # Get text and target language from request body, or the text from the job
+    text = data.get("text") or (get_job_text(upload_id) if upload_id else None)
+    target_language = data.get("target_language", "en")
+
     try:
-        # Get text and target language from request body
-        text = data.get("text")
-        target_language = data.get("target_language", "en")
-        
         if not text:
             raise HTTPException(status_code=400, detail="Text is required")
         
         # Translate the text
-        translated_text = translate_text(text, target_language)
+        [(translated_text, error)] = await translate_batch([(text, target_language)])
+        if error:
+            print(error)
+            translated_text = error
+        elif upload_id:
+            job_manager.set_output(upload_id, "translation", {"text": translated_text, "target_language": target_language})
         
         return JSONResponse(
             content={
@@ -48,23 +82,99 @@ async def translate(
 async def transliterate(
     data: Dict[str, str] = Body(...),
 ):
-    """Transliterate Arabic text to Latin script"""
+    """Transliterate Arabic text to Latin script
+
+    With an ``upload_id`` the OCR text of that job is used when no text is
+    sent, and the transliteration is stored with the job for export.
+    """
+    # Validate transliteration scheme
+    scheme = (data.get("scheme") or TRANSLITERATION_SCHEME).lower()
+    if scheme not in TRANSLITERATION_SCHEMES:
+        raise HTTPException(status_code=400, detail="Invalid transliteration scheme selection")
+
+    # Get text from request body, or the OCR text of a job
+    upload_id = data.get("upload_id")
+    text = data.get("text") or (get_job_text(upload_id) if upload_id else None)
+
     try:
-        # Get text from request body
-        text = data.get("text")
-        
         if not text:
             raise HTTPException(status_code=400, detail="Text is required")
         
-        # Transliterate the text
-        transliterated_text = transliterate_text(text)
+        # Transliterate the text on a worker thread; long documents would hold up the event loop
+        transliterated_text = await run_in_threadpool(transliterate_text, text, scheme)
+        if upload_id:
+            job_manager.set_output(upload_id, "transliteration", {"text": transliterated_text, "scheme": scheme})
         
         return JSONResponse(
             content={
                 "success": True,
                 "transliterated_text": transliterated_text,
+                "scheme": scheme,
             }
         )
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Transliteration error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Transliteration error: {str(e)}")
+
+
+@router.post("/translate/batch")
+async def translate_many(
+    data: Dict[str, Any] = Body(...),
+):
+    """Translate a list of Arabic texts, each with an optional target language
+
+    Results are returned in the order of the items, with an error per item
+    that could not be translated.
+    """
+    items = get_batch_items(data)
+    default_language = data.get("target_language") or "en"
+
+    try:
+        languages = [item.get("target_language") or default_language for item in items]
+        outcomes = iter(await translate_batch(
+            [(item.get("text", ""), language) for item, language in zip(items, languages) if item.get("text")]
+        ))
+
+        results = []
+        for item, language in zip(items, languages):
+            translated_text, error = next(outcomes) if item.get("text") else (None, "Text is required")
+            results.append({"translated_text": translated_text, "target_language": language, "error": error})
+
+        return JSONResponse(
+            content={
+                "success": True,
+                "source_language": "ar",
+                "results": results,
+            }
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
+
+
+@router.post("/transliterate/batch")
+async def transliterate_many(
+    data: Dict[str, Any] = Body(...),
+):
+    """Transliterate a list of Arabic texts, each with an optional scheme"""
+    items = get_batch_items(data)
+    default_scheme = data.get("scheme") or TRANSLITERATION_SCHEME
+
+    try:
+        schemes = [(item.get("scheme") or default_scheme).lower() for item in items]
+        outcomes = await run_in_threadpool(
+            transliterate_batch, [(item.get("text", ""), scheme) for item, scheme in zip(items, schemes)]
+        )
+
+        return JSONResponse(
+            content={
+                "success": True,
+                "results": [
+                    {"transliterated_text": transliterated_text, "scheme": scheme, "error": error}
+                    for (transliterated_text, error), scheme in zip(outcomes, schemes)
+                ],
+            }
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transliteration error: {str(e)}")
@@ -0,0 +1,210 @@
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Read .env once, before any module reads its settings from the environment
+load_dotenv()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() == "true"
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name, "")
+    return int(value) if value.strip() else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name, "")
+    return float(value) if value.strip() else default
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    """Workspace storage (app.utils.storage)"""
+
+    root: str
+    quota_bytes: int
+    ttl: int
+    janitor_interval: int
+    # Folder for rendered page images, e.g. on tmpfs; empty keeps them in each workspace
+    page_root: str
+
+    @classmethod
+    def from_env(cls) -> "StorageSettings":
+        return cls(
+            root=os.getenv("STORAGE_ROOT", "./temp"),
+            quota_bytes=_env_int("STORAGE_QUOTA_BYTES", 5 * 1024 * 1024 * 1024),
+            ttl=_env_int("STORAGE_TTL", 7200),
+            janitor_interval=_env_int("STORAGE_JANITOR_INTERVAL", 300),
+            page_root=os.getenv("STORAGE_PAGE_ROOT", ""),
+        )
+
+
+@dataclass(frozen=True)
+class MistralSettings:
+    """The Mistral API client (app.utils.mistral_client) and OCR engine"""
+
+    api_url: str
+    model: str
+    concurrency: int
+    timeout: float
+    connect_timeout: float
+    max_connections: int
+    max_retries: int
+    backoff_base: float
+    backoff_max: float
+    # Sustained requests per second (0 for no limit) and burst size
+    rate_limit: float
+    rate_burst: int
+
+    @classmethod
+    def from_env(cls) -> "MistralSettings":
+        return cls(
+            api_url=os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/completions"),
+            model=os.getenv("MISTRAL_MODEL", "mistral-large-latest"),
+            concurrency=_env_int("MISTRAL_CONCURRENCY", 4),
+            timeout=_env_float("MISTRAL_TIMEOUT", 120),
+            connect_timeout=_env_float("MISTRAL_CONNECT_TIMEOUT", 10),
+            max_connections=_env_int("MISTRAL_MAX_CONNECTIONS", 10),
+            max_retries=_env_int("MISTRAL_MAX_RETRIES", 5),
+            backoff_base=_env_float("MISTRAL_BACKOFF_BASE", 1.0),
+            backoff_max=_env_float("MISTRAL_BACKOFF_MAX", 60),
+            rate_limit=_env_float("MISTRAL_RATE_LIMIT", 1.0),
+            rate_burst=_env_int("MISTRAL_RATE_BURST", 2),
+        )
+
+
+@dataclass(frozen=True)
+class OCRSettings:
+    """OCR engines and their executors (app.utils.ocr_engines, app.utils.ocr_executors)"""
+
+    qari_concurrency: int
+    # "process" or "thread"
+    qari_executor: str
+    qari_batch_size: int
+    combined_engines: Tuple[str, ...]
+    fake_engine: bool
+    fake_delay: float
+    batch_wait: float
+    warm_up: bool
+
+    @classmethod
+    def from_env(cls) -> "OCRSettings":
+        return cls(
+            qari_concurrency=_env_int("QARI_CONCURRENCY", os.cpu_count() or 1),
+            qari_executor=os.getenv("QARI_EXECUTOR", "process"),
+            qari_batch_size=_env_int("QARI_BATCH_SIZE", 4),
+            combined_engines=tuple(
+                name.strip() for name in os.getenv("OCR_COMBINED_ENGINES", "qari,mistral").split(",") if name.strip()
+            ),
+            fake_engine=_env_bool("OCR_FAKE_ENGINE", False),
+            fake_delay=_env_float("OCR_FAKE_DELAY", 0),
+            batch_wait=_env_float("OCR_BATCH_WAIT", 0.05),
+            warm_up=_env_bool("OCR_WARM_UP", True),
+        )
+
+
+@dataclass(frozen=True)
+class TranslationSettings:
+    """Translation backends and their chunking, concurrency and cache (app.utils.translation*)"""
+
+    # openai, google or stub
+    service: str
+    openai_model: str
+    openai_base_url: Optional[str]
+    timeout: float
+    max_retries: int
+    chunk_tokens: int
+    chars_per_token: float
+    concurrency: int
+    cache_entries: int
+    # Empty keeps the segment cache in memory only
+    cache_dir: str
+    cache_max_bytes: int
+    cache_ttl: int
+
+    @classmethod
+    def from_env(cls) -> "TranslationSettings":
+        return cls(
+            service=os.getenv("TRANSLATION_SERVICE", "openai"),
+            openai_model=os.getenv("OPENAI_TRANSLATION_MODEL", "gpt-4o"),
+            openai_base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=_env_float("TRANSLATION_TIMEOUT", 120),
+            max_retries=_env_int("TRANSLATION_MAX_RETRIES", 3),
+            chunk_tokens=_env_int("TRANSLATION_CHUNK_TOKENS", 1500),
+            chars_per_token=_env_float("TRANSLATION_CHARS_PER_TOKEN", 2.5),
+            concurrency=_env_int("TRANSLATION_CONCURRENCY", 4),
+            cache_entries=_env_int("TRANSLATION_CACHE_ENTRIES", 10000),
+            cache_dir=os.getenv("TRANSLATION_CACHE_DIR", ""),
+            cache_max_bytes=_env_int("TRANSLATION_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+            cache_ttl=_env_int("TRANSLATION_CACHE_TTL", 30 * 24 * 3600),
+        )
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Settings of the process, read once from the environment (and .env)
+
+    The server and API keys are fields of their own; the tuning knobs of
+    storage, OCR and translation are grouped in sub-settings. Modules keep
+    them as constants named after their environment variables, taken from
+    here at import.
+    """
+
+    # "development" runs one auto-reloading process, "production" a pool of workers
+    environment: str
+    host: str
+    port: int
+    workers: int
+    # Import the app and heavy libraries once in the master so workers share them
+    preload: bool
+    # Seconds to let requests finish on shutdown, and before a stuck worker is restarted
+    graceful_timeout: int
+    worker_timeout: int
+    keepalive: int
+    # Restart a worker after this many requests (0 never), guarding against slow leaks
+    max_requests: int
+    log_level: str
+
+    mistral_api_key: Optional[str]
+    openai_api_key: Optional[str]
+    google_translate_api_key: Optional[str]
+
+    storage: StorageSettings
+    mistral: MistralSettings
+    ocr: OCRSettings
+    translation: TranslationSettings
+
+    @property
+    def production(self) -> bool:
+        return self.environment == "production"
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            environment=os.getenv("APP_ENV", "development").lower(),
+            host=os.getenv("HOST", "0.0.0.0"),
+            port=_env_int("PORT", 8000),
+            workers=_env_int("WEB_CONCURRENCY", os.cpu_count() or 1),
+            preload=_env_bool("SERVER_PRELOAD", True),
+            graceful_timeout=_env_int("SERVER_GRACEFUL_TIMEOUT", 30),
+            worker_timeout=_env_int("SERVER_WORKER_TIMEOUT", 120),
+            keepalive=_env_int("SERVER_KEEPALIVE", 5),
+            max_requests=_env_int("SERVER_MAX_REQUESTS", 0),
+            log_level=os.getenv("LOG_LEVEL", "info").lower(),
+            mistral_api_key=os.getenv("MISTRAL_API_KEY") or None,
+            openai_api_key=os.getenv("OPENAI_API_KEY") or None,
+            google_translate_api_key=os.getenv("GOOGLE_TRANSLATE_API_KEY") or None,
+            storage=StorageSettings.from_env(),
+            mistral=MistralSettings.from_env(),
+            ocr=OCRSettings.from_env(),
+            translation=TranslationSettings.from_env(),
+        )
+
+
+# Settings of this process
+settings = Settings.from_env()
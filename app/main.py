@@ -1,5 +1,5 @@
-import os
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,11 +8,30 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.ocr import router as ocr_router
 from app.api.translation import router as translation_router
 from app.api.export import router as export_router
+from app.utils.admission import ADMISSION_ENABLED, AdmissionMiddleware
+from app.utils.file_utils import UploadSizeLimitMiddleware
+from app.utils.jobs import JOB_BACKEND
+from app.utils.metrics import METRICS_ENABLED, MetricsMiddleware, registry
+from app.utils.mistral_client import close_mistral_client
+from app.utils.ocr_executors import shutdown_executors, warm_up_engines
+from app.utils.storage import storage_manager
+from app.utils.translation_backends import close_translation_backend, get_translation_backend
 
 # Create FastAPI app
 app = FastAPI(title="ArabicOCR", description="Arabic OCR Web Application")
 
-# Configure CORS
+# Turn away OCR and translation requests over their limits before the body is read
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Turn away oversized uploads before their body is read (and before they count against admission)
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Count and time every request (added after the size limit so refused uploads are counted too)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Configure CORS (added last so it also wraps the responses of the middleware above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, replace with specific origins
@@ -33,17 +52,34 @@ app.include_router(translation_router, prefix="/api/translation", tags=["Transla
 app.include_router(export_router, prefix="/api/export", tags=["Export"])
 
 
+@app.on_event("startup")
+def startup():
+    """Warm up the OCR engines, create the pooled translation clients and start the storage janitor"""
+    # With the durable queue, OCR runs in the worker processes instead
+    if JOB_BACKEND != "sqlite":
+        warm_up_engines()
+    get_translation_backend()
+    storage_manager.start_janitor()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the OCR engine worker pools and storage janitor and close pooled API connections"""
+    shutdown_executors()
+    storage_manager.stop_janitor()
+    close_mistral_client()
+    await close_translation_backend()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Metrics of this process in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def index(request: Request):
     """Render the main application page"""
     return templates.TemplateResponse("index.html", {"request": request})
-
-
-if __name__ == "__main__":
-    import uvicorn
-
-    # Get port from environment variable or use default
-    port = int(os.environ.get("PORT", 8000))
-    
-    # Run the application
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
@@ -0,0 +1,103 @@
+import importlib
+
+from app.config import Settings, settings
+
+# Heavy libraries the app otherwise imports on first use; preloading imports them
+# once in the master process so every worker shares them
+PRELOAD_MODULES = ("app.utils.document_export", "app.utils.pdf_export", "openai")
+
+
+def preload_modules() -> None:
+    """Import the heavy, lazily loaded modules now"""
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"Could not preload {module}: {str(e)}")
+
+
+def worker_count(config: Settings) -> int:
+    """Number of web workers to start
+
+    Jobs of the in-memory backend live in the process that received them,
+    so several workers need the shared JOB_BACKEND=sqlite queue.
+    """
+    from app.utils.jobs import JOB_BACKEND
+
+    if config.workers > 1 and JOB_BACKEND != "sqlite":
+        print("Running one web worker: set JOB_BACKEND=sqlite (and start python -m app.worker) to run several")
+        return 1
+    return max(config.workers, 1)
+
+
+def run_development(config: Settings) -> None:
+    """One auto-reloading process, for working on the code"""
+    import uvicorn
+
+    uvicorn.run("app.main:app", host=config.host, port=config.port, reload=True, log_level=config.log_level)
+
+
+def run_production(config: Settings) -> None:
+    """A pool of workers under gunicorn, falling back to uvicorn's own workers where gunicorn is unavailable"""
+    workers = worker_count(config)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # gunicorn does not run on Windows; uvicorn can still start workers, without preloading
+        import uvicorn
+
+        uvicorn.run(
+            "app.main:app",
+            host=config.host,
+            port=config.port,
+            workers=workers,
+            log_level=config.log_level,
+            timeout_keep_alive=config.keepalive,
+            timeout_graceful_shutdown=config.graceful_timeout,
+            limit_max_requests=config.max_requests or None,
+        )
+        return
+
+    class Server(BaseApplication):
+        def load_config(self) -> None:
+            options = {
+                "bind": f"{config.host}:{config.port}",
+                "workers": workers,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": config.preload,
+                "graceful_timeout": config.graceful_timeout,
+                "timeout": config.worker_timeout,
+                "keepalive": config.keepalive,
+                "max_requests": config.max_requests,
+                "max_requests_jitter": config.max_requests // 10,
+                "loglevel": config.log_level,
+                "accesslog": "-",
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Loaded once in the master with preloading, otherwise in every worker
+            if config.preload:
+                preload_modules()
+            from app.main import app
+
+            return app
+
+    Server().run()
+
+
+def run(config: Settings = settings) -> None:
+    """Start the web server in the mode APP_ENV selects"""
+    if config.production:
+        run_production(config)
+    else:
+        run_development(config)
+
+
+# Launched from here rather than app.main, which would then be imported twice
+# (once as __main__ and once by the server)
+if __name__ == "__main__":
+    # Development: one auto-reloading process; production (APP_ENV=production): a pool of workers
+    run()
@@ -24,14 +24,17 @@ document.addEventListener('DOMContentLoaded', function() {
     const translationResult = document.getElementById('translation-result');
     const transliterationResult = document.getElementById('transliteration-result');
     const exportButton = document.getElementById('export-button');
+    const exportFormat = document.getElementById('export-format');
     const backButton = document.getElementById('back-button');
     const loadingOverlay = document.getElementById('loading-overlay');
     const loadingMessage = document.getElementById('loading-message');
     const translationTabItem = document.getElementById('translation-tab-item');
     const transliterationTabItem = document.getElementById('transliteration-tab-item');
+    const ocrStatus = document.getElementById('ocr-status');
     
     // State variables
     let selectedFile = null;
+    let uploadId = null;
     let extractedText = '';
     let translatedText = '';
     let transliteratedText = '';
@@ -102,7 +105,7 @@ document.addEventListener('DOMContentLoaded', function() {
     processButton.addEventListener('click', processFile);
     
     // Export button
-    exportButton.addEventListener('click', exportToDocx);
+    exportButton.addEventListener('click', exportResults);
     
     // Back button
     backButton.addEventListener('click', function() {
@@ -193,13 +196,19 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             const data = await response.json();
-            extractedText = data.text;
+            
+            // Show pages as they are recognized and wait for the job to finish
+            uploadId = data.upload_id;
+            const job = await streamJob(uploadId);
+            extractedText = job.result.text;
+            ocrStatus.classList.add('hidden');
             
             // Update UI with extracted text
             arabicResult.innerHTML = formatTextWithLineBreaks(extractedText);
             
             // Process translation if enabled
             if (enableTranslation.checked) {
+                loadingOverlay.classList.remove('hidden');
                 loadingMessage.textContent = 'Translating text...';
                 await processTranslation();
                 translationTabItem.classList.remove('hidden');
@@ -209,6 +218,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // Process transliteration if enabled
             if (enableTransliteration.checked) {
+                loadingOverlay.classList.remove('hidden');
                 loadingMessage.textContent = 'Transliterating text...';
                 await processTransliteration();
                 transliterationTabItem.classList.remove('hidden');
@@ -227,6 +237,106 @@ document.addEventListener('DOMContentLoaded', function() {
             console.error('Error:', error);
             alert('An error occurred while processing the file. Please try again.');
             loadingOverlay.classList.add('hidden');
+            ocrStatus.classList.add('hidden');
+        }
+    }
+    
+    // Stream the page results of an OCR job, rendering each page as it arrives
+    function streamJob(uploadId) {
+        if (!window.EventSource) {
+            return waitForJob(uploadId);
+        }
+        
+        return new Promise((resolve, reject) => {
+            const pageTexts = {};
+            const source = new EventSource(`/api/ocr/jobs/${uploadId}/events`);
+            let finished = false;
+            
+            source.addEventListener('page', function(e) {
+                const page = JSON.parse(e.data);
+                pageTexts[page.page] = page.text;
+                renderPages(pageTexts);
+                
+                // Show the results as soon as the first page is ready
+                if (resultsSection.classList.contains('hidden')) {
+                    uploadSection.classList.add('hidden');
+                    resultsSection.classList.remove('hidden');
+                    loadingOverlay.classList.add('hidden');
+                    ocrStatus.classList.remove('hidden');
+                }
+            });
+            
+            source.addEventListener('progress', function(e) {
+                const progress = JSON.parse(e.data);
+                if (progress.total_pages) {
+                    const message = `Processing page ${progress.completed_pages} of ${progress.total_pages}...`;
+                    loadingMessage.textContent = message;
+                    ocrStatus.textContent = message;
+                }
+            });
+            
+            source.addEventListener('completed', function() {
+                finished = true;
+                source.close();
+                fetchJob(uploadId).then(resolve, reject);
+            });
+            
+            source.addEventListener('failed', function(e) {
+                finished = true;
+                source.close();
+                reject(new Error(JSON.parse(e.data).error || 'OCR processing failed'));
+            });
+            
+            // Fall back to polling if the stream breaks
+            source.onerror = function() {
+                if (finished) return;
+                source.close();
+                waitForJob(uploadId).then(resolve, reject);
+            };
+        });
+    }
+    
+    // Render streamed pages in page order
+    function renderPages(pageTexts) {
+        const text = Object.keys(pageTexts)
+            .map(Number)
+            .sort((a, b) => a - b)
+            .map(page => pageTexts[page])
+            .join('\n\n--- Page Break ---\n\n');
+        arabicResult.innerHTML = formatTextWithLineBreaks(text);
+    }
+    
+    // Get the current state of an OCR job
+    async function fetchJob(uploadId) {
+        const response = await fetch(`/api/ocr/jobs/${uploadId}`);
+        
+        if (!response.ok) {
+            throw new Error('Failed to get OCR job status');
+        }
+        
+        return response.json();
+    }
+    
+    // Poll an OCR job until it completes or fails
+    async function waitForJob(uploadId) {
+        while (true) {
+            const job = await fetchJob(uploadId);
+            
+            if (job.status === 'completed') {
+                return job;
+            }
+            
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'OCR processing failed');
+            }
+            
+            // Show page progress while the job runs
+            const progress = job.progress;
+            if (progress.total_pages) {
+                loadingMessage.textContent = `Processing page ${progress.completed_pages} of ${progress.total_pages}...`;
+            }
+            
+            await new Promise(resolve => setTimeout(resolve, 1000));
         }
     }
     
@@ -240,8 +350,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 headers: {
                     'Content-Type': 'application/json'
                 },
+                // The server translates the job's stored OCR text and keeps the result for export
                 body: JSON.stringify({
-                    text: extractedText,
+                    upload_id: uploadId,
                     target_language: targetLanguage
                 })
             });
@@ -272,7 +383,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
-                    text: extractedText
+                    upload_id: uploadId
                 })
             });
             
@@ -293,26 +404,28 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Export to DOCX
-    async function exportToDocx() {
+    // Export results in the selected format
+    async function exportResults() {
+        const format = exportFormat.value;
+        const extension = format.endsWith('pdf') ? 'pdf' : format;
+        
         try {
             loadingOverlay.classList.remove('hidden');
-            loadingMessage.textContent = 'Generating DOCX file...';
+            loadingMessage.textContent = `Generating ${extension.toUpperCase()} file...`;
             
-            const response = await fetch('/api/export/docx', {
+            const response = await fetch(`/api/export/${format}`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
+                // Results are pulled from the job on the server instead of being sent back
                 body: JSON.stringify({
-                    arabic_text: extractedText,
-                    translated_text: translatedText,
-                    transliterated_text: transliteratedText
+                    upload_id: uploadId
                 })
             });
             
             if (!response.ok) {
-                throw new Error('DOCX export failed');
+                throw new Error('Export failed');
             }
             
             // Create a blob from the response
@@ -323,7 +436,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const a = document.createElement('a');
             a.style.display = 'none';
             a.href = url;
-            a.download = 'arabic_ocr_results.docx';
+            a.download = `arabic_ocr_results.${extension}`;
             
             // Append to the document and trigger the download
             document.body.appendChild(a);
@@ -337,7 +450,7 @@ document.addEventListener('DOMContentLoaded', function() {
             
         } catch (error) {
             console.error('Export error:', error);
-            alert('An error occurred while exporting to DOCX. Please try again.');
+            alert('An error occurred while exporting. Please try again.');
             loadingOverlay.classList.add('hidden');
         }
     }
@@ -0,0 +1,296 @@
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Pattern, Tuple
+
+from fastapi.responses import JSONResponse
+
+from app.utils.jobs import JOB_FINISHED_STATES, job_manager
+from app.utils.metrics import ADMISSION_ACTIVE, ADMISSION_PAGES, ADMISSION_REJECTED
+from app.utils.pdf_pages import get_page_count
+
+# Turn away OCR uploads and translation requests beyond the limits below
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# OCR jobs (queued or running) admitted at once, in total and per client (0 for no limit)
+ADMISSION_MAX_OCR_JOBS = int(os.getenv("ADMISSION_MAX_OCR_JOBS", "16"))
+ADMISSION_MAX_OCR_JOBS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_OCR_JOBS_PER_CLIENT", "4"))
+
+# Pages of those jobs in flight at once (0 for no limit). A larger document is
+# still admitted when nothing else is in flight, so it is never refused for good.
+ADMISSION_MAX_PAGES = int(os.getenv("ADMISSION_MAX_PAGES", "500"))
+
+# Translation requests handled at once, in total and per client (0 for no limit)
+ADMISSION_MAX_TRANSLATIONS = int(os.getenv("ADMISSION_MAX_TRANSLATIONS", "16"))
+ADMISSION_MAX_TRANSLATIONS_PER_CLIENT = int(os.getenv("ADMISSION_MAX_TRANSLATIONS_PER_CLIENT", "4"))
+
+# Requests per second each client may send to these endpoints, and how many
+# it may send in a burst (0 for no limit)
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "2"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "20"))
+
+# Seconds a client is told to wait (Retry-After) when the server is at capacity
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "10"))
+
+# Take the client address from X-Forwarded-For; only behind a proxy that sets it
+ADMISSION_TRUST_PROXY = os.getenv("ADMISSION_TRUST_PROXY", "false").lower() == "true"
+
+# Clients whose rate limit state is kept before idle ones are dropped
+_MAX_TRACKED_CLIENTS = 10000
+
+
+class AdmissionError(Exception):
+    """Raised when work is turned away
+
+    ``status_code`` is 429 when the client is over its own limits and 503
+    when the server is at capacity; ``retry_after`` is in seconds.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int, reason: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Admit units of work within global and per-client limits
+
+    Every admitted unit holds a ticket, with its client and weight, until it
+    is released. A request's ticket can be held on by the job it queued; it
+    is then released once ``is_finished`` reports the job done. That is
+    checked only when a limit is reached, so it costs nothing while there is
+    room and works whichever process runs the jobs. Clients are also rate
+    limited with a token bucket of ``burst`` requests refilled at ``rate``
+    per second.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_active: int = 0,
+        max_active_per_client: int = 0,
+        max_weight: int = 0,
+        rate: float = 0,
+        burst: int = 1,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+        is_finished: Optional[Callable[[str], bool]] = None,
+    ):
+        self.name = name
+        self._max_active = max_active
+        self._max_active_per_client = max_active_per_client
+        self._max_weight = max_weight
+        self._rate = rate
+        self._burst = max(burst, 1)
+        self._retry_after = retry_after
+        self._is_finished = is_finished
+        self._tickets: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, client: str) -> str:
+        """Admit one unit of work of weight 1 for ``client`` and return its ticket
+
+        Raises AdmissionError if the client is over its rate or concurrency
+        limit or the server is at capacity.
+        """
+        try:
+            self._take_token(client)
+            ticket = str(uuid.uuid4())
+            try:
+                self._admit(ticket, client, 1)
+            except AdmissionError:
+                if not self._reap():
+                    raise
+                self._admit(ticket, client, 1)
+            return ticket
+        except AdmissionError as e:
+            ADMISSION_REJECTED.inc(work=self.name, reason=e.reason)
+            raise
+
+    def hold(self, ticket: str, job_id: str, weight: int) -> None:
+        """Keep a ticket for the job ``job_id`` until it finishes, weighing ``weight``
+
+        Raises AdmissionError, and releases the ticket, if the extra weight
+        does not fit in the budget.
+        """
+        try:
+            with self._lock:
+                entry = self._tickets.pop(ticket, None)
+            if entry is None:
+                return
+            try:
+                self._admit(job_id, entry["client"], weight, held=True)
+            except AdmissionError:
+                if not self._reap():
+                    raise
+                self._admit(job_id, entry["client"], weight, held=True)
+        except AdmissionError as e:
+            ADMISSION_REJECTED.inc(work=self.name, reason=e.reason)
+            raise
+
+    def release(self, ticket: str) -> None:
+        """Release a request's ticket (nothing to do once it is held for a job), or a job's by its id"""
+        with self._lock:
+            self._tickets.pop(ticket, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Units of work in flight and their total weight"""
+        self._reap()
+        with self._lock:
+            return {
+                "active": len(self._tickets),
+                "weight": sum(entry["weight"] for entry in self._tickets.values()),
+            }
+
+    def _admit(self, ticket: str, client: str, weight: int, held: bool = False) -> None:
+        """Record a ticket if it fits within the limits, or raise AdmissionError"""
+        with self._lock:
+            tickets = self._tickets.values()
+            if self._max_active_per_client and sum(1 for entry in tickets if entry["client"] == client) >= self._max_active_per_client:
+                raise AdmissionError(
+                    "Too many requests in progress for this client", 429, self._retry_after, "client_concurrency"
+                )
+            if self._max_active and len(self._tickets) >= self._max_active:
+                raise AdmissionError("The server is busy. Please try again later.", 503, self._retry_after, "concurrency")
+            total_weight = sum(entry["weight"] for entry in tickets)
+            if self._max_weight and total_weight and total_weight + weight > self._max_weight:
+                raise AdmissionError("The server is busy. Please try again later.", 503, self._retry_after, "pages")
+            self._tickets[ticket] = {"client": client, "weight": weight, "held": held}
+
+    def _take_token(self, client: str) -> None:
+        """Spend one of the client's rate limit tokens, or raise AdmissionError"""
+        if self._rate <= 0:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self._burst, now))
+            tokens = min(self._burst, tokens + (now - updated) * self._rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                raise AdmissionError("Too many requests", 429, math.ceil((1 - tokens) / self._rate), "rate")
+            self._buckets[client] = (tokens - 1, now)
+
+            if len(self._buckets) > _MAX_TRACKED_CLIENTS:
+                # Forget clients whose bucket has filled up again; they start full anyway
+                self._buckets = {
+                    key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                    if tokens + (now - updated) * self._rate < self._burst
+                }
+
+    def _reap(self) -> bool:
+        """Release the tickets of finished jobs; returns True if any were released"""
+        if self._is_finished is None:
+            return False
+
+        with self._lock:
+            held = [ticket for ticket, entry in self._tickets.items() if entry["held"]]
+        finished = [ticket for ticket in held if self._is_finished(ticket)]
+        with self._lock:
+            for ticket in finished:
+                self._tickets.pop(ticket, None)
+        return bool(finished)
+
+
+def job_finished(job_id: str) -> bool:
+    """Return True once an OCR job has finished or been forgotten"""
+    job = job_manager.get(job_id)
+    return job is None or job["status"] in JOB_FINISHED_STATES
+
+
+def count_pages(file_path: Path) -> int:
+    """Pages of an uploaded document, for the page budget
+
+    Images count as one page, and so does a PDF whose pages cannot be counted
+    (its job will fail on it anyway).
+    """
+    try:
+        with open(file_path, "rb") as f:
+            if f.read(5) != b"%PDF-":
+                return 1
+        return max(get_page_count(file_path), 1)
+    except Exception as e:
+        print(f"Could not count the pages of {file_path.name}: {str(e)}")
+        return 1
+
+
+def client_address(scope) -> str:
+    """Address of the client that sent a request, to apply per-client limits to"""
+    if ADMISSION_TRUST_PROXY:
+        forwarded = dict(scope["headers"]).get(b"x-forwarded-for", b"")
+        if forwarded:
+            return forwarded.split(b",")[0].strip().decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+# Admission of OCR jobs, weighted by their pages, and of translation requests
+ocr_admission = AdmissionController(
+    "ocr",
+    max_active=ADMISSION_MAX_OCR_JOBS,
+    max_active_per_client=ADMISSION_MAX_OCR_JOBS_PER_CLIENT,
+    max_weight=ADMISSION_MAX_PAGES,
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+    is_finished=job_finished,
+)
+translation_admission = AdmissionController(
+    "translation",
+    max_active=ADMISSION_MAX_TRANSLATIONS,
+    max_active_per_client=ADMISSION_MAX_TRANSLATIONS_PER_CLIENT,
+    rate=ADMISSION_RATE,
+    burst=ADMISSION_BURST,
+)
+
+# POST routes that are admitted, and by which controller
+ADMISSION_ROUTES: Tuple[Tuple[Pattern, AdmissionController], ...] = (
+    (re.compile(r"^/api/ocr/(upload|uploads/[^/]+/complete)$"), ocr_admission),
+    (re.compile(r"^/api/translation/"), translation_admission),
+)
+
+ADMISSION_ACTIVE.set_function(
+    lambda: {(controller.name,): controller.stats()["active"] for _, controller in ADMISSION_ROUTES}
+)
+ADMISSION_PAGES.set_function(lambda: ocr_admission.stats()["weight"])
+
+
+class AdmissionMiddleware:
+    """Admit requests to the OCR upload and translation endpoints before their body is read
+
+    Requests over a limit get a fast 429 or 503 with a ``Retry-After``
+    header. An admitted request's ticket is in ``request.state.admission``;
+    endpoints that queue a job hold it for the job with ``hold()``, otherwise
+    it is released once the response has been sent.
+    """
+
+    def __init__(self, app, routes: Tuple[Tuple[Pattern, AdmissionController], ...] = ADMISSION_ROUTES):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        controller = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            controller = next((c for pattern, c in self.routes if pattern.match(scope["path"])), None)
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            ticket = controller.acquire(client_address(scope))
+        except AdmissionError as e:
+            response = JSONResponse(
+                status_code=e.status_code, content={"detail": str(e)}, headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["admission"] = ticket
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(ticket)
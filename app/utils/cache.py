@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Size of the blocks read when hashing files
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of some bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(file_path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TieredCache:
+    """Two-tier result cache: an in-memory LRU in front of an optional disk store
+
+    Values are JSON-serializable. The disk tier stores one file per key and
+    evicts entries older than ``ttl`` and, once ``max_bytes`` is exceeded, the
+    least recently written ones.
+    """
+
+    def __init__(
+        self,
+        memory_entries: int,
+        cache_dir: str = "",
+        max_bytes: int = 512 * 1024 * 1024,
+        ttl: int = 7 * 24 * 3600,
+    ):
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._memory_entries = memory_entries
+        self._dir = Path(cache_dir) if cache_dir else None
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._disk_bytes = 0
+
+        if self._dir:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(path.stat().st_size for path in self._dir.glob("*/*.json"))
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached value, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+
+        value = self._disk_get(key)
+
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._memory_put(key, value)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a value in both tiers"""
+        with self._lock:
+            self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counters and the size of each tier"""
+        with self._lock:
+            return {**self._stats, "memory_entries": len(self._memory), "disk_bytes": self._disk_bytes}
+
+    def _memory_put(self, key: str, value: Any) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries (lock held)"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _path(self, key: str) -> Path:
+        """Return the disk path of a key"""
+        name = hash_bytes(key.encode("utf-8"))
+        return self._dir / name[:2] / f"{name}.json"
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        """Read a value from the disk tier, dropping it if it has expired"""
+        if not self._dir:
+            return None
+
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self._ttl:
+                self._disk_remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key: str, value: Any) -> None:
+        """Write a value to the disk tier and enforce its size cap"""
+        if not self._dir:
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+        # Write to a temporary file first so readers never see partial entries
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            old_size = path.stat().st_size if path.exists() else 0
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Cache write error: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - old_size
+            over_quota = self._disk_bytes > self._max_bytes
+
+        if over_quota:
+            self._disk_evict()
+
+    def _disk_remove(self, path: Path) -> None:
+        """Delete one disk entry and account for it"""
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._stats["evictions"] += 1
+
+    def _disk_evict(self) -> None:
+        """Remove expired entries, then the oldest ones until under the size cap"""
+        entries = []
+        for path in self._dir.glob("*/*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        entries.sort()
+
+        cutoff = time.time() - self._ttl
+        for mtime, path in entries:
+            with self._lock:
+                if mtime >= cutoff and self._disk_bytes <= self._max_bytes:
+                    break
+            self._disk_remove(path)
@@ -1,91 +1,188 @@
 from docx import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
 from docx.shared import Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.style import WD_STYLE_TYPE
-from typing import Optional
+from copy import copy
+from io import BytesIO
+import json
+import threading
+from typing import Any, BinaryIO, Dict, List, Optional
 
+# Section headings and paragraph styles of exported documents, in document order
+SECTIONS = (
+    ("arabic_text", "Original Arabic Text", "Arabic"),
+    ("translated_text", "English Translation", "English"),
+    ("transliterated_text", "Latin Transliteration", "Transliteration"),
+)
 
-def create_docx(output_path: str, arabic_text: str, translated_text: Optional[str] = None, transliterated_text: Optional[str] = None) -> None:
-    """Create a DOCX file with Arabic text, translation, and transliteration"""
+
+# Pre-built DOCX template with the export styles, created on first use
+_docx_template: Optional[bytes] = None
+_docx_template_lock = threading.Lock()
+
+
+def _build_docx_template() -> bytes:
+    """Create an empty document with the export styles set up"""
     # Create a new Document
     doc = Document()
-    
+
     # Set up document styles
     styles = doc.styles
-    
+
     # Create a style for Arabic text
-    if 'Arabic' not in styles:
-        arabic_style = styles.add_style('Arabic', WD_STYLE_TYPE.PARAGRAPH)
-        font = arabic_style.font
-        font.name = 'Arial'
-        font.size = Pt(14)
-        font.bold = True
-        arabic_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    
+    arabic_style = styles.add_style('Arabic', WD_STYLE_TYPE.PARAGRAPH)
+    font = arabic_style.font
+    font.name = 'Arial'
+    font.size = Pt(14)
+    font.bold = True
+    arabic_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
     # Create a style for English text
-    if 'English' not in styles:
-        english_style = styles.add_style('English', WD_STYLE_TYPE.PARAGRAPH)
-        font = english_style.font
-        font.name = 'Times New Roman'
-        font.size = Pt(12)
-        english_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    
+    english_style = styles.add_style('English', WD_STYLE_TYPE.PARAGRAPH)
+    font = english_style.font
+    font.name = 'Times New Roman'
+    font.size = Pt(12)
+    english_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
     # Create a style for transliteration
-    if 'Transliteration' not in styles:
-        transliteration_style = styles.add_style('Transliteration', WD_STYLE_TYPE.PARAGRAPH)
-        font = transliteration_style.font
-        font.name = 'Courier New'
-        font.size = Pt(12)
-        font.italic = True
-        transliteration_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
-    
+    transliteration_style = styles.add_style('Transliteration', WD_STYLE_TYPE.PARAGRAPH)
+    font = transliteration_style.font
+    font.name = 'Courier New'
+    font.size = Pt(12)
+    font.italic = True
+    transliteration_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.LEFT
+
     # Create a style for section headings
-    if 'SectionHeading' not in styles:
-        heading_style = styles.add_style('SectionHeading', WD_STYLE_TYPE.PARAGRAPH)
-        font = heading_style.font
-        font.name = 'Arial'
-        font.size = Pt(16)
-        font.bold = True
-        font.color.rgb = RGBColor(0, 0, 128)  # Navy blue
-        heading_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        heading_style.paragraph_format.space_before = Pt(12)
-        heading_style.paragraph_format.space_after = Pt(6)
-    
+    heading_style = styles.add_style('SectionHeading', WD_STYLE_TYPE.PARAGRAPH)
+    font = heading_style.font
+    font.name = 'Arial'
+    font.size = Pt(16)
+    font.bold = True
+    font.color.rgb = RGBColor(0, 0, 128)  # Navy blue
+    heading_style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    heading_style.paragraph_format.space_before = Pt(12)
+    heading_style.paragraph_format.space_after = Pt(6)
+
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _get_docx_template() -> bytes:
+    """Return the DOCX template, building it on first use"""
+    global _docx_template
+    with _docx_template_lock:
+        if _docx_template is None:
+            _docx_template = _build_docx_template()
+        return _docx_template
+
+
+def _styled_paragraph(doc, style) -> Any:
+    """Build a detached prototype paragraph element with one text run in the given style"""
+    paragraph = doc.add_paragraph("x", style=style)
+    element = paragraph._p
+    element.getparent().remove(element)
+    element.r_lst[-1].t_lst[-1].set(qn("xml:space"), "preserve")
+    return element
+
+
+def _copy_paragraph(prototype, text: str) -> Any:
+    """Copy a prototype paragraph with new text"""
+    element = copy(prototype)
+    # The run is the paragraph's last child and the text its last element
+    element[-1][-1].text = text
+    return element
+
+
+def create_docx(
+    arabic_text: str,
+    translated_text: Optional[str] = None,
+    transliterated_text: Optional[str] = None,
+    output: Optional[BinaryIO] = None,
+    **_: Any,
+) -> BinaryIO:
+    """Create a DOCX document with Arabic text, translation, and transliteration
+
+    The document starts from the pre-built template, so styles are not set up
+    again, and each line becomes a copy of a prototype paragraph appended to
+    the body directly, which keeps large exports fast. The document is written
+    to ``output`` (a new in-memory buffer by default), positioned at its start.
+    """
+    doc = Document(BytesIO(_get_docx_template()))
+
     # Add document title
     title = doc.add_paragraph("Arabic OCR Results", style='Title')
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    # Add Arabic text section
-    doc.add_paragraph("Original Arabic Text", style='SectionHeading')
-    
-    # Split Arabic text by lines and add each line
-    for line in arabic_text.split('\n'):
-        if line.strip():
-            doc.add_paragraph(line, style='Arabic')
-        else:
-            doc.add_paragraph()
-    
-    # Add translation section if provided
-    if translated_text:
-        doc.add_paragraph("English Translation", style='SectionHeading')
-        
-        # Split translated text by lines and add each line
-        for line in translated_text.split('\n'):
-            if line.strip():
-                doc.add_paragraph(line, style='English')
-            else:
-                doc.add_paragraph()
-    
-    # Add transliteration section if provided
-    if transliterated_text:
-        doc.add_paragraph("Latin Transliteration", style='SectionHeading')
-        
-        # Split transliterated text by lines and add each line
-        for line in transliterated_text.split('\n'):
+
+    # Prototype paragraphs, one per style; looked up once instead of per line
+    heading = _styled_paragraph(doc, doc.styles['SectionHeading'])
+    body = doc.element.body
+    section_properties = body.sectPr
+
+    texts = {"arabic_text": arabic_text, "translated_text": translated_text, "transliterated_text": transliterated_text}
+    for key, heading_text, style_name in SECTIONS:
+        text = texts[key]
+        if not text:
+            continue
+
+        # Add the section heading
+        section_properties.addprevious(_copy_paragraph(heading, heading_text))
+
+        # Split the text by lines and add each line
+        line_paragraph = _styled_paragraph(doc, doc.styles[style_name])
+        for line in text.split('\n'):
             if line.strip():
-                doc.add_paragraph(line, style='Transliteration')
+                section_properties.addprevious(_copy_paragraph(line_paragraph, line))
             else:
-                doc.add_paragraph()
-    
+                section_properties.addprevious(OxmlElement('w:p'))
+
     # Save the document
-    doc.save(output_path)
\ No newline at end of file
+    output = output if output is not None else BytesIO()
+    doc.save(output)
+    output.seek(0)
+    return output
+
+
+def create_txt(
+    arabic_text: str,
+    translated_text: Optional[str] = None,
+    transliterated_text: Optional[str] = None,
+    output: Optional[BinaryIO] = None,
+    **_: Any,
+) -> BinaryIO:
+    """Create a UTF-8 plain text document with one section per text"""
+    texts = {"arabic_text": arabic_text, "translated_text": translated_text, "transliterated_text": transliterated_text}
+    parts: List[str] = []
+    for key, heading_text, _style in SECTIONS:
+        if texts[key]:
+            parts.append(f"{heading_text}\n{'=' * len(heading_text)}\n\n{texts[key].strip()}\n")
+
+    output = output if output is not None else BytesIO()
+    output.write("\n\n".join(parts).encode("utf-8"))
+    output.seek(0)
+    return output
+
+
+def create_json(
+    arabic_text: str,
+    translated_text: Optional[str] = None,
+    transliterated_text: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+    output: Optional[BinaryIO] = None,
+    **_: Any,
+) -> BinaryIO:
+    """Create a structured JSON document with the texts and, for jobs, the page details"""
+    document: Dict[str, Any] = {
+        "arabic_text": arabic_text,
+        "translated_text": translated_text or None,
+        "transliterated_text": transliterated_text or None,
+    }
+    if result:
+        document.update({key: result[key] for key in ("page_count", "pages", "skipped_pages", "engines") if key in result})
+
+    output = output if output is not None else BytesIO()
+    output.write(json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8"))
+    output.seek(0)
+    return output
@@ -0,0 +1,68 @@
+import importlib
+from io import BytesIO
+from typing import Any, BinaryIO, Callable, Dict, NamedTuple, Optional
+
+
+class ExportFormat(NamedTuple):
+    """A registered export format"""
+
+    writer: Callable[..., BinaryIO]
+    media_type: str
+    extension: str
+    needs_source: bool = False
+
+
+# Registered export formats by name
+EXPORT_FORMATS: Dict[str, ExportFormat] = {}
+
+
+def register_export_format(
+    name: str, writer: Callable[..., BinaryIO], media_type: str, extension: str, needs_source: bool = False
+) -> None:
+    """Register an export format
+
+    ``writer`` is called with the texts as keyword arguments (``arabic_text``,
+    ``translated_text``, ``transliterated_text``), the OCR ``result`` and
+    ``source_path`` when exporting a job, and an ``output`` binary file to
+    write to. Formats with ``needs_source`` need the original upload.
+    """
+    EXPORT_FORMATS[name] = ExportFormat(writer, media_type, extension, needs_source)
+
+
+def lazy_writer(path: str) -> Callable[..., BinaryIO]:
+    """A writer given as ``module:function``, imported on first use
+
+    Keeps heavy export libraries (python-docx, reportlab) out of startup;
+    production servers preload them once instead.
+    """
+    module_name, _, function_name = path.partition(":")
+
+    def writer(**kwargs: Any) -> BinaryIO:
+        return getattr(importlib.import_module(module_name), function_name)(**kwargs)
+
+    return writer
+
+
+def export_document(export_format: str, output: Optional[BinaryIO] = None, **content: Any) -> BinaryIO:
+    """Write content in a registered format and return the output positioned at its start"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    output = output if output is not None else BytesIO()
+    EXPORT_FORMATS[export_format].writer(output=output, **content)
+    output.seek(0)
+    return output
+
+
+register_export_format(
+    "docx",
+    lazy_writer("app.utils.document_export:create_docx"),
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "docx",
+)
+register_export_format("txt", lazy_writer("app.utils.document_export:create_txt"), "text/plain", "txt")
+register_export_format("json", lazy_writer("app.utils.document_export:create_json"), "application/json", "json")
+register_export_format("pdf", lazy_writer("app.utils.pdf_export:create_pdf"), "application/pdf", "pdf")
+register_export_format(
+    "searchable_pdf", lazy_writer("app.utils.pdf_export:create_searchable_pdf"), "application/pdf", "pdf", needs_source=True
+)
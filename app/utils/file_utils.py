@@ -1,21 +1,40 @@
+import hashlib
 import os
+import re
 import shutil
-from fastapi import UploadFile
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pathlib import Path
-from typing import List, Set
+from typing import Any, AsyncIterator, BinaryIO, List, Optional, Tuple
+
+from app.utils.metrics import UPLOAD_BYTES, timed
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
 
-# Maximum file size (10 MB)
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB in bytes
+# Maximum upload size in bytes (10 MB by default)
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+
+# Uploads are read, hashed and written in blocks of this many bytes
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Room left for multipart boundaries and form fields when checking a request's Content-Length
+_FORM_OVERHEAD = 64 * 1024
+
+# Characters that may not appear in a stored file name
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^\w\-]")
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload is larger than the size limit"""
 
 
 def validate_file(filename: str) -> bool:
     """Validate file extension"""
     if not filename:
         return False
-    
+
     file_extension = os.path.splitext(filename)[1].lower()
     return file_extension in ALLOWED_EXTENSIONS
 
@@ -25,19 +44,131 @@ def validate_file_size(file_size: int) -> bool:
     return file_size <= MAX_FILE_SIZE
 
 
-async def save_upload_file(upload_file: UploadFile, destination: Path) -> Path:
-    """Save an uploaded file to the specified destination"""
+def safe_filename(filename: Optional[str]) -> str:
+    """Turn a client supplied file name into a safe name to store it under
+
+    Directories are dropped and unusual characters replaced, so the name can
+    never leave its upload folder; the (lower-cased) extension is kept.
+    """
+    stem, extension = os.path.splitext(os.path.basename((filename or "").replace("\\", "/")))
+    stem = _UNSAFE_FILENAME_CHARS.sub("_", stem).strip("_")[:100] or "upload"
+    extension = _UNSAFE_FILENAME_CHARS.sub("_", extension[1:].lower())
+    return f"{stem}.{extension}" if extension else stem
+
+
+def _write_block(output: BinaryIO, digest: Any, block: bytes) -> None:
+    """Write a block and add it to the running hash"""
+    output.write(block)
+    digest.update(block)
+    UPLOAD_BYTES.inc(len(block))
+
+
+async def write_chunks(chunks: AsyncIterator[bytes], output: BinaryIO, digest: Any, limit: int) -> None:
+    """Write a stream of chunks to an open file, updating ``digest`` as they arrive
+
+    Chunks are gathered into ``UPLOAD_CHUNK_SIZE`` blocks that are written and
+    hashed on the thread pool, so memory use stays flat and the event loop is
+    never blocked on disk. Raises FileTooLargeError as soon as the stream goes
+    over ``limit`` bytes. Whatever was received before an error is still
+    written, so ``output.tell()`` always matches what ``digest`` has seen.
+    """
+    buffer = bytearray()
+    received = 0
+    try:
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > limit:
+                raise FileTooLargeError(f"File is larger than {limit} bytes")
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await run_in_threadpool(_write_block, output, digest, bytes(buffer))
+                buffer.clear()
+    finally:
+        if buffer:
+            await run_in_threadpool(_write_block, output, digest, bytes(buffer))
+
+
+async def _iter_upload(upload_file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an uploaded file in chunks"""
+    while True:
+        chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def save_upload_file(upload_file: UploadFile, destination: Path, max_size: int = MAX_FILE_SIZE) -> Tuple[Path, str]:
+    """Save an uploaded file to the specified destination
+
+    The framework has already spooled the multipart body to a temporary file
+    by the time this runs, so the size of the request is enforced while it is
+    received, by ``UploadSizeLimitMiddleware``. The file is copied from there
+    in chunks, off the event loop, while its SHA-256 is computed, and stored
+    under a sanitized name. Returns the file path and the hex digest; raises
+    FileTooLargeError (leaving no partial file) if it is over ``max_size``.
+    """
+    # Reject straight away when the size is already known
+    if upload_file.size is not None and upload_file.size > max_size:
+        raise FileTooLargeError(f"File is larger than {max_size} bytes")
+
     # Create destination directory if it doesn't exist
     destination.mkdir(parents=True, exist_ok=True)
-    
+
     # Generate file path
-    file_path = destination / upload_file.filename
-    
+    file_path = destination / safe_filename(upload_file.filename)
+
     # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-    
-    return file_path
+    digest = hashlib.sha256()
+    try:
+        with timed("save_upload"), open(file_path, "wb") as buffer:
+            await write_chunks(_iter_upload(upload_file), buffer, digest, max_size)
+    except FileTooLargeError:
+        file_path.unlink(missing_ok=True)
+        raise
+
+    return file_path, digest.hexdigest()
+
+
+class UploadSizeLimitMiddleware:
+    """Reject uploads over the size limit before their body is parsed
+
+    A request whose Content-Length is over the limit is refused without
+    reading it. Otherwise the body is counted as it arrives, and a request
+    that sends more than the limit anyway (e.g. chunked, without a
+    Content-Length) is cut off with a 413 as soon as it goes over.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...] = ("/api/ocr/upload",), max_size: int = MAX_FILE_SIZE):
+        self.app = app
+        self.paths = paths
+        self.max_body_size = max_size + _FORM_OVERHEAD
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.max_body_size:
+                response = JSONResponse(status_code=413, content={"detail": "File too large"})
+                await response(scope, receive, send)
+                return
+            receive = self._limit_body(receive)
+
+        await self.app(scope, receive, send)
+
+    def _limit_body(self, receive):
+        """Wrap ``receive`` to fail the request once its body goes over the limit"""
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # Raised while the form is parsed, before the endpoint runs
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        return limited_receive
 
 
 def clean_temp_files(file_paths: List[Path]):
@@ -47,4 +178,4 @@ def clean_temp_files(file_paths: List[Path]):
             if file_path.is_file():
                 file_path.unlink()
             elif file_path.is_dir():
-                shutil.rmtree(file_path)
\ No newline at end of file
+                shutil.rmtree(file_path)
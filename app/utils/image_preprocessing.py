@@ -0,0 +1,161 @@
+import io
+import os
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Enable the preprocessing stage
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+
+# Convert pages to grayscale before encoding
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+
+# Longest edge (pixels) of the image sent to an engine; 0 keeps the original size
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "2000"))
+
+# Resolution to downscale to when the source DPI is known; 0 disables it
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "0"))
+
+# Optional binarization (Otsu threshold) and deskew
+OCR_BINARIZE = os.getenv("OCR_BINARIZE", "false").lower() == "true"
+OCR_DESKEW = os.getenv("OCR_DESKEW", "false").lower() == "true"
+
+# Output encoding: jpeg, webp or png, and its quality
+OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "jpeg").lower()
+OCR_IMAGE_QUALITY = int(os.getenv("OCR_IMAGE_QUALITY", "80"))
+
+# Largest skew (degrees) searched for when deskewing, and the search step
+_DESKEW_MAX_ANGLE = 5.0
+_DESKEW_STEP = 0.5
+
+_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+
+# Summary of the settings; part of the OCR cache key of engines that use this stage
+PREPROCESS_SIGNATURE = (
+    f"pre={int(OCR_PREPROCESS)},gray={int(OCR_GRAYSCALE)},edge={OCR_MAX_EDGE},dpi={OCR_TARGET_DPI},"
+    f"bin={int(OCR_BINARIZE)},deskew={int(OCR_DESKEW)},fmt={OCR_IMAGE_FORMAT},q={OCR_IMAGE_QUALITY}"
+)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Return the Otsu threshold of an 8-bit grayscale image"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = gray.size
+    weights = np.cumsum(histogram)
+    means = np.cumsum(histogram * np.arange(256))
+
+    background = weights[:-1]
+    foreground = total - background
+    valid = (background > 0) & (foreground > 0)
+
+    mean_background = np.divide(means[:-1], background, out=np.zeros(255), where=valid)
+    mean_foreground = np.divide(means[-1] - means[:-1], foreground, out=np.zeros(255), where=valid)
+    between = np.where(valid, background * foreground * (mean_background - mean_foreground) ** 2, 0)
+    return int(np.argmax(between))
+
+
+def binarize(image: Image.Image) -> Image.Image:
+    """Convert a grayscale image to black and white using Otsu's threshold"""
+    gray = np.asarray(image.convert("L"))
+    threshold = otsu_threshold(gray)
+    return Image.fromarray(np.where(gray > threshold, 255, 0).astype(np.uint8))
+
+
+def estimate_skew(image: Image.Image) -> float:
+    """Estimate text skew in degrees from the sharpness of row projection profiles"""
+    # Work on a small copy; the angle does not need full resolution
+    small = image.convert("L")
+    small.thumbnail((800, 800))
+    ink = np.asarray(small) < otsu_threshold(np.asarray(small))
+    ink_image = Image.fromarray((ink * 255).astype(np.uint8))
+
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-_DESKEW_MAX_ANGLE, _DESKEW_MAX_ANGLE + _DESKEW_STEP, _DESKEW_STEP):
+        rows = np.asarray(ink_image.rotate(float(angle), expand=False)).sum(axis=1, dtype=np.float64)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def deskew(image: Image.Image) -> Image.Image:
+    """Rotate an image so its text lines are horizontal"""
+    angle = estimate_skew(image)
+    if not angle:
+        return image
+    fill = 255 if image.mode == "L" else (255,) * len(image.getbands())
+    return image.rotate(angle, expand=True, fillcolor=fill, resample=Image.BICUBIC)
+
+
+def _target_scale(image: Image.Image) -> float:
+    """Scale factor that satisfies the maximum edge and target DPI settings"""
+    scale = 1.0
+
+    if OCR_MAX_EDGE and max(image.size) > OCR_MAX_EDGE:
+        scale = OCR_MAX_EDGE / max(image.size)
+
+    source_dpi = image.info.get("dpi", (0, 0))[0]
+    if OCR_TARGET_DPI and source_dpi and source_dpi > OCR_TARGET_DPI:
+        scale = min(scale, OCR_TARGET_DPI / source_dpi)
+
+    return scale
+
+
+def preprocess_image(image: Union[str, Path, Image.Image]) -> Tuple[bytes, str]:
+    """Prepare an image for an OCR engine, entirely in memory
+
+    Returns the encoded image bytes and their MIME type. Depending on the
+    configuration the image is converted to grayscale, downscaled, binarized,
+    deskewed and re-encoded as JPEG or WebP.
+    """
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as opened:
+            return _preprocess(opened)
+    return _preprocess(image)
+
+
+def _preprocess(image: Image.Image) -> Tuple[bytes, str]:
+    """Apply the configured preprocessing steps and encode the result"""
+    # Honour EXIF orientation from cameras and phones
+    image = ImageOps.exif_transpose(image)
+
+    if not OCR_PREPROCESS:
+        return _encode(image)
+
+    if OCR_GRAYSCALE or OCR_BINARIZE:
+        image = image.convert("L")
+
+    scale = _target_scale(image)
+    if scale < 1.0:
+        new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(new_size, Image.LANCZOS)
+
+    if OCR_DESKEW:
+        image = deskew(image)
+
+    if OCR_BINARIZE:
+        image = binarize(image)
+
+    return _encode(image)
+
+
+def _encode(image: Image.Image) -> Tuple[bytes, str]:
+    """Encode an image in the configured output format"""
+    pil_format, mime_type = _FORMATS.get(OCR_IMAGE_FORMAT, _FORMATS["jpeg"])
+
+    # JPEG has no alpha channel or palette
+    if pil_format == "JPEG" and image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, pil_format, optimize=True)
+    else:
+        image.save(buffer, pil_format, quality=OCR_IMAGE_QUALITY)
+    return buffer.getvalue(), mime_type
@@ -0,0 +1,472 @@
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.job_states import JOB_COMPLETED, JOB_FAILED, JOB_FINISHED_STATES, JOB_PROCESSING, JOB_QUEUED, JOB_TTL
+from app.utils.metrics import JOB_QUEUE_SECONDS, JOB_SECONDS, JOBS_FINISHED
+from app.utils.storage import storage_manager
+
+# SQLite database file of the durable job queue, shared by the API and the workers
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./data/jobs.sqlite3")
+
+# Attempts before a job is dead-lettered, and seconds before the first retry (doubling after that)
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "30"))
+
+# Seconds a worker holds a job without renewing its lease before another worker may take it over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+# Attachment naming the storage workspace a worker releases once it has completed the job
+RELEASE_ON_COMPLETE = "release_on_complete"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    func TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    progress TEXT NOT NULL,
+    result TEXT,
+    outputs TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    dead_lettered INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority DESC, created_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id);
+CREATE TABLE IF NOT EXISTS job_attachments (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+
+def _function_name(func: Callable[..., Any]) -> str:
+    """Importable ``module:function`` name of a job function"""
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def _load_function(name: str) -> Callable[..., Dict[str, Any]]:
+    """Import a job function from its ``module:function`` name; only application code is allowed"""
+    module_name, _, func_name = name.partition(":")
+    if not module_name.startswith("app."):
+        raise ValueError(f"Refusing to run job function {name}")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class SQLiteJobQueue:
+    """Durable OCR job queue in a local SQLite database
+
+    Has the same interface as JobManager, but ``submit`` only records the job;
+    it is run by ``python -m app.worker`` processes, which may run next to the
+    API or on their own. A worker takes a job by leasing it and renews the
+    lease while it works, so the job of a worker that died is taken over once
+    the lease runs out. Failed attempts are retried with exponential backoff;
+    after ``JOB_MAX_ATTEMPTS`` the job fails for good and is kept as a dead
+    letter that can be requeued. Higher priority jobs are taken first.
+    Job arguments must be JSON serializable (paths are stored as strings).
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, ttl: int = JOB_TTL, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self._path = path
+        self._ttl = ttl
+        self._max_attempts = max_attempts
+        self._local = threading.local()
+        self._cleanups: Dict[str, List[Callable[[], None]]] = {}
+        self._cleanups_lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection to the database"""
+        connection = getattr(self._local, "connection", None)
+        # A connection must not be used across fork (e.g. by preloading server workers)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self):
+        """Start a write transaction; the database is locked for writers until it ends"""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        return connection
+
+    def submit(self, job_id: str, func: Callable[..., Dict[str, Any]], *args, priority: int = 0, **kwargs) -> Dict[str, Any]:
+        """Record a job for the workers; higher ``priority`` jobs are taken first
+
+        ``func`` must be an importable function; like with JobManager it is
+        called with the given arguments plus ``progress_callback`` and
+        ``page_callback`` keyword arguments.
+        """
+        self._prune()
+
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, func, args, status, priority, max_attempts, available_at, progress, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                job_id,
+                _function_name(func),
+                json.dumps([list(args), kwargs], default=str),
+                JOB_QUEUED,
+                priority,
+                self._max_attempts,
+                now,
+                json.dumps({"completed_pages": 0, "total_pages": None}),
+                now,
+                now,
+            ),
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if it is unknown"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "upload_id": row["id"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "outputs": json.loads(row["outputs"]),
+            "error": row["error"],
+            "priority": row["priority"],
+            "attempts": row["attempts"],
+            "dead_lettered": bool(row["dead_lettered"]),
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def events_since(self, job_id: str, cursor: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return the events of a job after position ``cursor`` and the job status"""
+        connection = self._connect()
+        row = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return [], None
+        events = connection.execute(
+            "SELECT event, data FROM job_events WHERE job_id = ? ORDER BY id LIMIT -1 OFFSET ?", (job_id, cursor)
+        ).fetchall()
+        return [{"event": event["event"], "data": json.loads(event["data"])} for event in events], row["status"]
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        """Append an event to a job's event stream"""
+        self._connect().execute(
+            "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+            (job_id, event, json.dumps(data, ensure_ascii=False)),
+        )
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update fields of a job"""
+        columns = {key: json.dumps(value) if key in ("progress", "result") else value for key, value in fields.items()}
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        self._connect().execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?", (*columns.values(), time.time(), job_id)
+        )
+
+    def set_output(self, job_id: str, name: str, output: Dict[str, Any]) -> bool:
+        """Store a derived result (e.g. a translation) with a job; returns False if the job is unknown"""
+        connection = self._transaction()
+        try:
+            row = connection.execute("SELECT outputs FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            outputs = {**json.loads(row["outputs"]), name: output}
+            connection.execute(
+                "UPDATE jobs SET outputs = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(outputs, ensure_ascii=False), time.time(), job_id),
+            )
+            return True
+        finally:
+            connection.execute("COMMIT")
+
+    def attach(self, job_id: str, name: str, value: Any, cleanup: Optional[Callable[[], None]] = None) -> None:
+        """Keep server-side data with a job (e.g. its upload), left out of job snapshots
+
+        ``value`` is stored as JSON. ``cleanup`` is called by this process once
+        the job is forgotten.
+        """
+        self._connect().execute(
+            "INSERT OR REPLACE INTO job_attachments (job_id, name, value) VALUES (?, ?, ?)",
+            (job_id, name, json.dumps(value, default=str)),
+        )
+        if cleanup is not None:
+            with self._cleanups_lock:
+                self._cleanups.setdefault(job_id, []).append(cleanup)
+
+    def get_attachment(self, job_id: str, name: str) -> Any:
+        """Return data attached to a job, or None"""
+        row = self._connect().execute(
+            "SELECT value FROM job_attachments WHERE job_id = ? AND name = ?", (job_id, name)
+        ).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def report_progress(self, job_id: str, completed_pages: int, total_pages: Optional[int]) -> None:
+        """Record how many pages of a job have been processed"""
+        progress = {"completed_pages": completed_pages, "total_pages": total_pages}
+        self.update(job_id, progress=progress)
+        self.add_event(job_id, "progress", progress)
+
+    def counts(self) -> Dict[Tuple[str], int]:
+        """Number of known jobs by status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        counts = {(status,): 0 for status in (JOB_QUEUED, JOB_PROCESSING, *JOB_FINISHED_STATES)}
+        counts.update({(row["status"],): row["count"] for row in rows})
+        return counts
+
+    def claim(self, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[Dict[str, Any]]:
+        """Lease the next job that is ready, or whose lease has run out; returns it with its function and arguments"""
+        while True:
+            now = time.time()
+            connection = self._transaction()
+            try:
+                row = connection.execute(
+                    "SELECT id, func, args, attempts, max_attempts, available_at FROM jobs"
+                    " WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_expires_at < ?)"
+                    " ORDER BY priority DESC, created_at LIMIT 1",
+                    (JOB_QUEUED, now, JOB_PROCESSING, now),
+                ).fetchone()
+                if row is None:
+                    return None
+
+                if row["attempts"] >= row["max_attempts"]:
+                    # Its last worker died holding it
+                    self._dead_letter(connection, row["id"], "Job lease expired on its last attempt")
+                    continue
+
+                connection.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (JOB_PROCESSING, worker_id, now + lease_seconds, now, row["id"]),
+                )
+                args, kwargs = json.loads(row["args"])
+                return {
+                    "id": row["id"],
+                    "func": row["func"],
+                    "args": args,
+                    "kwargs": kwargs,
+                    "attempt": row["attempts"] + 1,
+                    "available_at": row["available_at"],
+                }
+            finally:
+                connection.execute("COMMIT")
+
+    def renew_lease(self, job_id: str, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """Extend a job's lease; returns False if the worker no longer holds it"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, job_id, JOB_PROCESSING, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Store the result of a leased job; returns False (and stores nothing) if the worker no longer holds it"""
+        connection = self._transaction()
+        try:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL, lease_expires_at = NULL,"
+                " updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+                (JOB_COMPLETED, json.dumps(result, ensure_ascii=False), time.time(), job_id, JOB_PROCESSING, worker_id),
+            )
+            if cursor.rowcount == 0:
+                return False
+            # Store the result before announcing it so streams can fetch it right away
+            connection.execute(
+                "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                (job_id, JOB_COMPLETED, json.dumps({"page_count": result.get("page_count")})),
+            )
+            return True
+        finally:
+            connection.execute("COMMIT")
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Record a failed attempt; retries later with backoff, or dead-letters the job. Returns True if it will be retried"""
+        connection = self._transaction()
+        try:
+            row = connection.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?", (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+
+            if row["attempts"] >= row["max_attempts"]:
+                self._dead_letter(connection, job_id, error)
+                return False
+
+            delay = JOB_RETRY_BACKOFF * 2 ** (row["attempts"] - 1)
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires_at = NULL,"
+                " updated_at = ? WHERE id = ?",
+                (JOB_QUEUED, error, time.time() + delay, time.time(), job_id),
+            )
+            connection.execute(
+                "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+                (job_id, "retry", json.dumps({"attempt": row["attempts"], "error": error, "retry_in": delay})),
+            )
+            return True
+        finally:
+            connection.execute("COMMIT")
+
+    def dead_letters(self) -> List[Dict[str, Any]]:
+        """Jobs that failed on every attempt"""
+        rows = self._connect().execute("SELECT id FROM jobs WHERE dead_lettered = 1 ORDER BY updated_at").fetchall()
+        return [self.get(row["id"]) for row in rows]
+
+    def requeue(self, job_id: str) -> bool:
+        """Give a dead-lettered job a fresh set of attempts; returns False if it is not dead-lettered"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, attempts = 0, dead_lettered = 0, error = NULL, available_at = ?, updated_at = ?"
+            " WHERE id = ? AND dead_lettered = 1",
+            (JOB_QUEUED, time.time(), time.time(), job_id),
+        )
+        return cursor.rowcount > 0
+
+    def _dead_letter(self, connection: sqlite3.Connection, job_id: str, error: str) -> None:
+        """Fail a job for good; the caller holds a write transaction"""
+        connection.execute(
+            "UPDATE jobs SET status = ?, error = ?, dead_lettered = 1, lease_owner = NULL, lease_expires_at = NULL,"
+            " updated_at = ? WHERE id = ?",
+            (JOB_FAILED, error, time.time(), job_id),
+        )
+        connection.execute(
+            "INSERT INTO job_events (job_id, event, data) VALUES (?, ?, ?)",
+            (job_id, JOB_FAILED, json.dumps({"error": error})),
+        )
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the TTL (dead letters are kept)"""
+        cutoff = time.time() - self._ttl
+        placeholders = ", ".join("?" for _ in JOB_FINISHED_STATES)
+        connection = self._transaction()
+        try:
+            expired = [
+                row["id"] for row in connection.execute(
+                    f"SELECT id FROM jobs WHERE status IN ({placeholders}) AND dead_lettered = 0 AND updated_at < ?",
+                    (*JOB_FINISHED_STATES, cutoff),
+                )
+            ]
+            for job_id in expired:
+                connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                connection.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+                connection.execute("DELETE FROM job_attachments WHERE job_id = ?", (job_id,))
+        finally:
+            connection.execute("COMMIT")
+
+        with self._cleanups_lock:
+            cleanups = [cleanup for job_id in expired for cleanup in self._cleanups.pop(job_id, [])]
+
+        for cleanup in cleanups:
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"Job cleanup failed: {str(e)}")
+
+
+class JobWorker:
+    """Run queued jobs on a few threads, renewing their leases while they run"""
+
+    def __init__(self, queue: SQLiteJobQueue, concurrency: int = 1, poll_interval: float = 1.0):
+        self._queue = queue
+        self._concurrency = max(concurrency, 1)
+        self._poll_interval = poll_interval
+        self._stop = threading.Event()
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def run(self) -> None:
+        """Work until ``stop`` is called; jobs already started are finished first"""
+        threads = [
+            threading.Thread(target=self._loop, name=f"job-worker-{number}", daemon=True)
+            for number in range(self._concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self) -> None:
+        """Stop taking new jobs"""
+        self._stop.set()
+
+    def _loop(self) -> None:
+        """Take and run jobs one at a time"""
+        while not self._stop.is_set():
+            try:
+                job = self._queue.claim(self.worker_id)
+            except sqlite3.Error as e:
+                print(f"Could not take a job: {str(e)}")
+                job = None
+            if job is None:
+                self._stop.wait(self._poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """Run one leased job and record its outcome"""
+        queue, job_id = self._queue, job["id"]
+        start = time.time()
+        JOB_QUEUE_SECONDS.observe(max(start - job["available_at"], 0))
+        queue.add_event(job_id, JOB_PROCESSING, {"attempt": job["attempt"]})
+
+        # Renew the lease in the background for as long as the job runs
+        done = threading.Event()
+
+        def heartbeat() -> None:
+            while not done.wait(JOB_LEASE_SECONDS / 3):
+                queue.renew_lease(job_id, self.worker_id)
+
+        threading.Thread(target=heartbeat, name=f"lease-{job_id}", daemon=True).start()
+
+        def progress_callback(completed_pages: int, total_pages: Optional[int]) -> None:
+            queue.report_progress(job_id, completed_pages, total_pages)
+
+        def page_callback(page: Dict[str, Any]) -> None:
+            queue.add_event(job_id, "page", page)
+
+        try:
+            func = _load_function(job["func"])
+            result = func(*job["args"], progress_callback=progress_callback, page_callback=page_callback, **job["kwargs"])
+            if queue.complete(job_id, self.worker_id, result):
+                status = JOB_COMPLETED
+                # The workspace is only released by the worker that still holds the job
+                workspace_id = queue.get_attachment(job_id, RELEASE_ON_COMPLETE)
+                if workspace_id:
+                    storage_manager.release(workspace_id)
+            else:
+                print(f"OCR job {job_id} finished after another worker took it over; its result is dropped")
+                status = "abandoned"
+        except Exception as e:
+            print(f"OCR job {job_id} failed (attempt {job['attempt']}): {str(e)}")
+            retried = queue.fail(job_id, self.worker_id, str(e))
+            status = "retried" if retried else JOB_FAILED
+        finally:
+            done.set()
+
+        JOBS_FINISHED.inc(status=status)
+        JOB_SECONDS.observe(time.time() - start, status=status)
@@ -0,0 +1,18 @@
+import os
+
+# Number of OCR jobs that may run at the same time
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+
+# Seconds a finished job is kept before it is forgotten
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+
+# Where jobs are queued: "memory" runs them on this process's worker pool,
+# "sqlite" keeps them in a durable queue served by ``python -m app.worker``
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED)
@@ -0,0 +1,191 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Settings and states shared with the durable queue, which must not import this module
+from app.utils.job_states import (  # noqa: F401
+    JOB_BACKEND,
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_FINISHED_STATES,
+    JOB_PROCESSING,
+    JOB_QUEUED,
+    JOB_TTL,
+    OCR_WORKERS,
+)
+from app.utils.metrics import JOB_QUEUE_SECONDS, JOB_SECONDS, JOBS, JOBS_FINISHED
+
+
+class JobManager:
+    """Track OCR jobs and run them on a bounded worker pool off the event loop"""
+
+    def __init__(self, max_workers: int = OCR_WORKERS, ttl: int = JOB_TTL):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-job")
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._attachments: Dict[str, Dict[str, Any]] = {}
+        self._cleanups: Dict[str, List[Callable[[], None]]] = {}
+        self._lock = threading.Lock()
+        self._ttl = ttl
+
+    def submit(self, job_id: str, func: Callable[..., Dict[str, Any]], *args, priority: int = 0, **kwargs) -> Dict[str, Any]:
+        """Register a job and schedule it on the worker pool
+
+        ``func`` is called with the given arguments plus ``progress_callback``
+        and ``page_callback`` keyword arguments and must return the job result
+        as a dict. ``priority`` is only honoured by the durable queue; jobs
+        here run in the order they were submitted.
+        """
+        self._prune()
+
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "upload_id": job_id,
+                "status": JOB_QUEUED,
+                "progress": {"completed_pages": 0, "total_pages": None},
+                "result": None,
+                "outputs": {},
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+                "events": [],
+            }
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if it is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = {key: value for key, value in job.items() if key != "events"}
+            snapshot["progress"] = dict(job["progress"])
+            snapshot["outputs"] = dict(job["outputs"])
+            return snapshot
+
+    def events_since(self, job_id: str, cursor: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return the events of a job after position ``cursor`` and the job status"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return [], None
+            return job["events"][cursor:], job["status"]
+
+    def add_event(self, job_id: str, event: str, data: Dict[str, Any]) -> None:
+        """Append an event to a job's event stream"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["events"].append({"event": event, "data": data})
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update fields of a job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+
+    def set_output(self, job_id: str, name: str, output: Dict[str, Any]) -> bool:
+        """Store a derived result (e.g. a translation) with a job; returns False if the job is unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job["outputs"][name] = output
+            job["updated_at"] = time.time()
+            return True
+
+    def attach(self, job_id: str, name: str, value: Any, cleanup: Optional[Callable[[], None]] = None) -> None:
+        """Keep server-side data with a job (e.g. its upload), left out of job snapshots
+
+        ``cleanup`` is called once the job is forgotten.
+        """
+        with self._lock:
+            self._attachments.setdefault(job_id, {})[name] = value
+            if cleanup is not None:
+                self._cleanups.setdefault(job_id, []).append(cleanup)
+
+    def get_attachment(self, job_id: str, name: str) -> Any:
+        """Return data attached to a job, or None"""
+        with self._lock:
+            return self._attachments.get(job_id, {}).get(name)
+
+    def report_progress(self, job_id: str, completed_pages: int, total_pages: Optional[int]) -> None:
+        """Record how many pages of a job have been processed"""
+        progress = {"completed_pages": completed_pages, "total_pages": total_pages}
+        self.update(job_id, progress=progress)
+        self.add_event(job_id, "progress", progress)
+
+    def counts(self) -> Dict[Tuple[str], int]:
+        """Number of known jobs by status"""
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {(status,): statuses.count(status) for status in (JOB_QUEUED, JOB_PROCESSING, *JOB_FINISHED_STATES)}
+
+    def _run(self, job_id: str, func: Callable[..., Dict[str, Any]], args: tuple, kwargs: dict) -> None:
+        """Run a job on a worker thread and store its outcome"""
+        job = self.get(job_id)
+        start = time.time()
+        if job is not None:
+            JOB_QUEUE_SECONDS.observe(start - job["created_at"])
+        self.update(job_id, status=JOB_PROCESSING)
+
+        def progress_callback(completed_pages: int, total_pages: Optional[int]) -> None:
+            self.report_progress(job_id, completed_pages, total_pages)
+
+        def page_callback(page: Dict[str, Any]) -> None:
+            self.add_event(job_id, "page", page)
+
+        try:
+            result = func(*args, progress_callback=progress_callback, page_callback=page_callback, **kwargs)
+            # Store the result before announcing it so streams can fetch it right away
+            self.update(job_id, status=JOB_COMPLETED, result=result)
+            self.add_event(job_id, JOB_COMPLETED, {"page_count": result.get("page_count")})
+            status = JOB_COMPLETED
+        except Exception as e:
+            print(f"OCR job {job_id} failed: {str(e)}")
+            self.update(job_id, status=JOB_FAILED, error=str(e))
+            self.add_event(job_id, JOB_FAILED, {"error": str(e)})
+            status = JOB_FAILED
+
+        JOBS_FINISHED.inc(status=status)
+        JOB_SECONDS.observe(time.time() - start, status=status)
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self._ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in JOB_FINISHED_STATES and job["updated_at"] < cutoff
+            ]
+            cleanups = []
+            for job_id in expired:
+                del self._jobs[job_id]
+                self._attachments.pop(job_id, None)
+                cleanups.extend(self._cleanups.pop(job_id, []))
+
+        for cleanup in cleanups:
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"Job cleanup failed: {str(e)}")
+
+
+def create_job_manager():
+    """Create the job manager for the configured JOB_BACKEND"""
+    if JOB_BACKEND == "sqlite":
+        from app.utils.job_queue import SQLiteJobQueue
+
+        return SQLiteJobQueue()
+    return JobManager()
+
+
+# Shared job manager for the application
+job_manager = create_job_manager()
+JOBS.set_function(job_manager.counts)
@@ -0,0 +1,336 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+# Collect metrics and serve them on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Report the time spent in each stage of a request in a Server-Timing response header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+# Prefix of every metric name
+METRICS_PREFIX = "arabicocr_"
+
+# Histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Labels of one sample, and what a gauge callback returns: a value, or values by label values
+_LabelValues = Tuple[str, ...]
+_GaugeReading = Union[float, Dict[_LabelValues, float]]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: _LabelValues) -> str:
+    """Render labels as ``{name="value",...}``"""
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value; whole numbers without a fraction"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """Base class of metrics: a named family of samples told apart by their labels"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[_LabelValues, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> _LabelValues:
+        """Label values of a sample, in label name order"""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Lines of this metric in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Counter(Metric):
+    """A count that only goes up (requests, pages, bytes)"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down (jobs waiting, bytes stored)
+
+    Set it directly, or give it a ``function`` that is read on every scrape.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], _GaugeReading]] = None
+
+    def set(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], _GaugeReading]) -> None:
+        """Read the gauge from ``function`` when metrics are collected"""
+        self._function = function
+
+    def _render_samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                reading = self._function()
+            except Exception as e:
+                print(f"Could not read metric {self.name}: {str(e)}")
+                return []
+            values = reading if isinstance(reading, dict) else {(): reading}
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())
+            ]
+        return super()._render_samples()
+
+
+class Histogram(Metric):
+    """Distribution of observed values (durations, sizes) over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+            counts[index] += 1
+            counts[-1] += value
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+
+        lines = []
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+# Metrics of this process
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_seconds", "Time to answer HTTP requests", ("route",))
+HTTP_REQUEST_BYTES = registry.counter("http_request_bytes_total", "Bytes received in HTTP request bodies", ("route",))
+HTTP_RESPONSE_BYTES = registry.counter("http_response_bytes_total", "Bytes sent in HTTP response bodies", ("route",))
+
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent in each processing stage", ("stage",))
+
+OCR_PAGES = registry.counter("ocr_pages_total", "Pages processed, by how their text was obtained", ("source",))
+OCR_PAGE_SECONDS = registry.histogram(
+    "ocr_page_seconds", "Time from dispatching a page to an engine until its text is ready", ("engine",)
+)
+OCR_TILES = registry.counter("ocr_tiles_total", "Tiles oversized page images were cut into")
+OCR_ENGINE_ERRORS = registry.counter("ocr_engine_errors_total", "Pages an engine could not read", ("engine",))
+
+EXTERNAL_REQUESTS = registry.counter(
+    "external_requests_total", "Calls to external APIs, by outcome (ok or error)", ("service", "outcome")
+)
+EXTERNAL_REQUEST_SECONDS = registry.histogram("external_request_seconds", "Time taken by external API calls", ("service",))
+EXTERNAL_RETRIES = registry.counter("external_retries_total", "Retried requests to external APIs", ("service",))
+
+JOBS = registry.gauge("jobs", "OCR jobs known to the job manager, by status", ("status",))
+JOBS_FINISHED = registry.counter("jobs_finished_total", "OCR job runs that ended, by outcome (completed, failed, retried or abandoned)", ("status",))
+JOB_QUEUE_SECONDS = registry.histogram("job_queue_seconds", "Time OCR jobs waited before a worker started them")
+JOB_SECONDS = registry.histogram("job_seconds", "Time OCR jobs took once started", ("status",))
+
+UPLOAD_BYTES = registry.counter("upload_bytes_total", "Bytes of uploaded files written to storage")
+EXPORT_BYTES = registry.counter("export_bytes_total", "Bytes of exported documents", ("format",))
+STORAGE_BYTES = registry.gauge("storage_bytes", "Bytes used by upload and page storage")
+
+ADMISSION_ACTIVE = registry.gauge("admission_active", "OCR jobs and translation requests admitted and not yet finished", ("work",))
+ADMISSION_PAGES = registry.gauge("admission_pages", "Pages of the admitted OCR jobs not yet finished")
+ADMISSION_REJECTED = registry.counter("admission_rejected_total", "Requests turned away by admission control", ("work", "reason"))
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a block as ``stage`` in the stage histogram and the request's Server-Timing header"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+@contextmanager
+def external_call(service: str) -> Iterator[None]:
+    """Count and time a call to an external API; an exception counts as an error"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with timed(service):
+            yield
+        outcome = "ok"
+    finally:
+        EXTERNAL_REQUESTS.inc(service=service, outcome=outcome)
+        EXTERNAL_REQUEST_SECONDS.observe(time.perf_counter() - start, service=service)
+
+
+def _route_name(scope) -> str:
+    """Name of the endpoint that handled a request; keeps label values few"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    return getattr(endpoint, "__name__", type(endpoint).__name__)
+
+
+class MetricsMiddleware:
+    """Count and time HTTP requests and the bytes they move
+
+    With ``server_timing`` the stages timed while handling a request (and the
+    total) are reported in a ``Server-Timing`` header, as far as they ran
+    before the response started.
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        received = sent = 0
+        status = 500
+
+        async def receive_counted():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    total = ("total", time.perf_counter() - start)
+                    header = ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings + [total])
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"server-timing", header.encode())]}
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            _request_timings.reset(token)
+            route = _route_name(scope)
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+            HTTP_REQUEST_BYTES.inc(received, route=route)
+            HTTP_RESPONSE_BYTES.inc(sent, route=route)
@@ -0,0 +1,210 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.utils.metrics import EXTERNAL_RETRIES, external_call
+
+# Endpoint of the Mistral chat completions API (override to test against a local stub)
+MISTRAL_API_URL = settings.mistral.api_url
+
+# Request timeouts in seconds
+MISTRAL_TIMEOUT = settings.mistral.timeout
+MISTRAL_CONNECT_TIMEOUT = settings.mistral.connect_timeout
+
+# Connection pool size shared by all OCR requests
+MISTRAL_MAX_CONNECTIONS = settings.mistral.max_connections
+
+# Retries on 429/5xx and network errors, with exponential backoff and jitter; no wait
+# between attempts, even one asked for with Retry-After, is longer than the maximum
+MISTRAL_MAX_RETRIES = settings.mistral.max_retries
+MISTRAL_BACKOFF_BASE = settings.mistral.backoff_base
+MISTRAL_BACKOFF_MAX = settings.mistral.backoff_max
+
+# Token bucket sized to the API quota: sustained requests per second and burst size
+MISTRAL_RATE_LIMIT = settings.mistral.rate_limit
+MISTRAL_RATE_BURST = settings.mistral.rate_burst
+
+# Status codes worth retrying
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class MistralAPIError(Exception):
+    """Raised when the Mistral API returns an error that cannot be retried away"""
+
+    def __init__(self, status_code: Optional[int], message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AsyncTokenBucket:
+    """Token bucket rate limiter for coroutines"""
+
+    def __init__(self, rate: float, capacity: int):
+        self._rate = rate
+        self._capacity = max(capacity, 1)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        if self._rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Parse the Retry-After header (seconds or HTTP date) of a response"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry attempt"""
+    return random.uniform(0, min(MISTRAL_BACKOFF_MAX, MISTRAL_BACKOFF_BASE * (2 ** attempt)))
+
+
+class MistralClient:
+    """Shared async client for the Mistral API with pooling, retries and rate limiting"""
+
+    def __init__(self, api_key: str, api_url: str = MISTRAL_API_URL):
+        self._api_url = api_url
+        self._client = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(MISTRAL_TIMEOUT, connect=MISTRAL_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=MISTRAL_MAX_CONNECTIONS,
+            ),
+        )
+        self._bucket = AsyncTokenBucket(MISTRAL_RATE_LIMIT, MISTRAL_RATE_BURST)
+
+    async def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a chat completion request, retrying rate limits and transient failures"""
+        with external_call("mistral"):
+            return await self._chat(payload)
+
+    async def _chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(MISTRAL_MAX_RETRIES + 1):
+            if attempt:
+                EXTERNAL_RETRIES.inc(service="mistral")
+            await self._bucket.acquire()
+            last_attempt = attempt == MISTRAL_MAX_RETRIES
+
+            try:
+                response = await self._client.post(self._api_url, json=payload)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise MistralAPIError(None, f"Mistral API request failed: {str(e)}")
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                raise MistralAPIError(response.status_code, f"{response.status_code} - {response.text}")
+
+            # Honour the server's Retry-After hint (within the backoff cap), falling back to jittered backoff
+            delay = _retry_after(response)
+            await asyncio.sleep(min(delay, MISTRAL_BACKOFF_MAX) if delay is not None else _backoff(attempt))
+
+        raise MistralAPIError(None, "Mistral API retries exhausted")
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool"""
+        await self._client.aclose()
+
+
+# The client lives on a dedicated event loop so worker threads can share its pool
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_client: Optional[MistralClient] = None
+_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Return the background event loop, starting it on first use"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mistral-client", daemon=True).start()
+        return _loop
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """Return the event loop running in this thread, if any"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_on_client_loop(coro) -> Any:
+    """Run a coroutine on the client's event loop and wait for its result"""
+    return submit_to_client_loop(coro).result()
+
+
+def submit_to_client_loop(coro) -> "Future[Any]":
+    """Schedule a coroutine on the client's event loop and return a future of its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def get_mistral_client(api_key: str) -> MistralClient:
+    """Return the shared Mistral client, creating it on first use"""
+    global _client
+    loop = _get_loop()
+    with _lock:
+        if _client is None:
+            # httpx binds its pool to the loop that uses it, so build it there
+            async def create() -> MistralClient:
+                return MistralClient(api_key)
+
+            if _running_loop() is loop:
+                _client = MistralClient(api_key)
+            else:
+                _client = asyncio.run_coroutine_threadsafe(create(), loop).result()
+        return _client
+
+
+def close_mistral_client() -> None:
+    """Close the shared client and stop its event loop"""
+    global _client, _loop
+    with _lock:
+        client, loop = _client, _loop
+        _client, _loop = None, None
+
+    if loop is None:
+        return
+    if client is not None:
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
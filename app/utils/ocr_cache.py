@@ -0,0 +1,30 @@
+import os
+
+from app.utils.cache import TieredCache
+from app.utils.ocr_engines import engine_versions
+from app.utils.tiling import TILING_SIGNATURE
+
+# Number of results kept in the in-memory LRU tier
+OCR_CACHE_MEMORY_ENTRIES = int(os.getenv("OCR_CACHE_MEMORY_ENTRIES", "1024"))
+
+# Directory of the on-disk tier; leave empty to disable it
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "")
+
+# Size cap (bytes) and time to live (seconds) of the on-disk tier
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def engine_key(content_hash: str, engine: str) -> str:
+    """Cache key of one engine's text for one page image"""
+    return f"page:{engine}:{engine_versions().get(engine, '')}:{TILING_SIGNATURE}:{content_hash}"
+
+
+def document_key(content_hash: str, engine: str) -> str:
+    """Cache key of a whole document processed in the given engine mode"""
+    versions = ",".join(f"{name}={version}" for name, version in sorted(engine_versions().items()))
+    return f"document:{engine}:{versions}:{TILING_SIGNATURE}:{content_hash}"
+
+
+# Shared OCR cache for the application
+ocr_cache = TieredCache(OCR_CACHE_MEMORY_ENTRIES, OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES, OCR_CACHE_TTL)
@@ -1,97 +1,295 @@
-import os
-import requests
-from pathlib import Path
-from dotenv import load_dotenv
-import json
+import asyncio
+import base64
+import hashlib
+import time
+from typing import Dict, List, Optional, Tuple
 
-# Load environment variables
-load_dotenv()
+from app.config import settings
+from app.utils.image_preprocessing import PREPROCESS_SIGNATURE, preprocess_image
+from app.utils.mistral_client import MistralAPIError, get_mistral_client, run_on_client_loop
 
-# Get API keys from environment variables
-MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+# API key of the Mistral OCR engine
+MISTRAL_API_KEY = settings.mistral_api_key
 
+# Model used for Mistral OCR requests
+MISTRAL_MODEL = settings.mistral.model
+
+# Maximum number of pages each engine works on at the same time
+QARI_CONCURRENCY = settings.ocr.qari_concurrency
+MISTRAL_CONCURRENCY = settings.mistral.concurrency
+
+# Executor type for the local Qari engine (process or thread)
+QARI_EXECUTOR = settings.ocr.qari_executor
+
+# Pages the local Qari engine reads in one inference pass
+QARI_BATCH_SIZE = settings.ocr.qari_batch_size
+
+# Engines the "both" and "merge" modes run on every page
+OCR_COMBINED_ENGINES = settings.ocr.combined_engines
+
+# Register the deterministic fake engine (for tests and benchmarks), and its simulated seconds per page
+OCR_FAKE_ENGINE = settings.ocr.fake_engine
+OCR_FAKE_DELAY = settings.ocr.fake_delay
+
+# How an engine must be run: coroutines on the shared client loop, on a
+# thread pool (thread safe), or on a process pool with one instance per worker
+EXECUTION_ASYNC = "async"
+EXECUTION_THREAD = "thread"
+EXECUTION_PROCESS = "process"
+
+# Prefixes of the error messages returned by the engines
+ERROR_PREFIXES = ("Error", "Mistral API error")
+
+
+def is_error_text(text: str) -> bool:
+    """Return True if an engine returned an error message instead of text
+
+    Empty text is a valid reading (e.g. of a page with nothing on it), so it
+    is cached like any other.
+    """
+    return text.startswith(ERROR_PREFIXES)
+
+
+class OCREngine:
+    """Base class of OCR engines
+
+    ``version`` is part of the OCR cache key, so changing it never serves
+    stale text. ``execution`` tells the executors how the engine may be run
+    and ``max_workers`` how many pages it works on at once. ``warm_up`` is
+    called once per process that runs the engine (at startup, or when a pool
+    worker starts) and is where models should be loaded. Engines return
+    error messages as text instead of raising.
+    """
+
+    name = ""
+    label = ""
+    version = ""
+    execution = EXECUTION_THREAD
+    max_workers = 1
+    batch_size = 1
+
+    def warm_up(self) -> None:
+        """Load models or open connections ahead of the first page"""
+
+    def process(self, image_path: str) -> str:
+        """Return the text of one image"""
+        raise NotImplementedError
+
+    def process_batch(self, image_paths: List[str]) -> List[str]:
+        """Return the text of several images, in order
+
+        Engines that can read several pages per inference pass override this;
+        pages arrive in batches of up to ``batch_size``.
+        """
+        return [self.process(image_path) for image_path in image_paths]
+
+    async def process_async(self, image_path: str) -> str:
+        """Coroutine version of ``process`` for engines run as EXECUTION_ASYNC"""
+        raise NotImplementedError
+
+
+class QariEngine(OCREngine):
+    """Local Qari-OCR model
 
-def process_with_qari(image_path: str) -> str:
-    """Process an image with Qari-OCR
-    
     Note: This is a placeholder implementation. In a real application,
     you would need to install and import the Qari-OCR library.
     """
-    try:
-        # This is a placeholder. In a real implementation, you would use the Qari-OCR library
-        # For example:
-        # from qari_ocr import QariOCR
-        # ocr = QariOCR()
-        # result = ocr.process_image(image_path)
-        # return result.text
-        
-        # For now, we'll return a placeholder message
-        return "[Qari-OCR placeholder: This would contain the actual OCR result from Qari-OCR]\n\nلقد تم استخراج هذا النص باستخدام تقنية التعرف الضوئي على الحروف العربية."
-    except Exception as e:
-        print(f"Error processing with Qari-OCR: {str(e)}")
-        return f"Error processing with Qari-OCR: {str(e)}"
-
-
-def process_with_mistral(image_path: str) -> str:
-    """Process an image with Mistral OCR API"""
-    if not MISTRAL_API_KEY:
-        return "Error: Mistral API key not found. Please set the MISTRAL_API_KEY environment variable."
-    
-    try:
-        # Read the image file
-        with open(image_path, "rb") as image_file:
-            image_data = image_file.read()
-        
-        # Prepare the API request
-        headers = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        # Convert image to base64 for API request
-        import base64
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
-        
-        # Prepare the payload
-        payload = {
-            "model": "mistral-large-latest",  # Use appropriate model
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Extract all Arabic text from this image. Return only the extracted text without any additional comments or explanations."
-                        },
+
+    name = "qari"
+    label = "Qari"
+    version = "placeholder-1"
+    execution = EXECUTION_PROCESS if QARI_EXECUTOR == "process" else EXECUTION_THREAD
+    max_workers = QARI_CONCURRENCY
+    batch_size = QARI_BATCH_SIZE
+
+    def __init__(self):
+        self._model = None
+
+    def warm_up(self) -> None:
+        """Load the model once for this process"""
+        if self._model is None:
+            # This is a placeholder. In a real implementation, you would load the Qari-OCR model here
+            # For example:
+            # from qari_ocr import QariOCR
+            # self._model = QariOCR()
+            self._model = "placeholder"
+
+    def process(self, image_path: str) -> str:
+        """Process an image with Qari-OCR"""
+        return self.process_batch([image_path])[0]
+
+    def process_batch(self, image_paths: List[str]) -> List[str]:
+        """Process several images with Qari-OCR in one pass"""
+        try:
+            self.warm_up()
+            # This is a placeholder. In a real implementation, you would run the model on the whole batch
+            # For example:
+            # results = self._model.process_images(image_paths)
+            # return [result.text for result in results]
+
+            # For now, we'll return a placeholder message
+            return [
+                "[Qari-OCR placeholder: This would contain the actual OCR result from Qari-OCR]\n\nلقد تم استخراج هذا النص باستخدام تقنية التعرف الضوئي على الحروف العربية."
+                for _ in image_paths
+            ]
+        except Exception as e:
+            print(f"Error processing with Qari-OCR: {str(e)}")
+            return [f"Error processing with Qari-OCR: {str(e)}"] * len(image_paths)
+
+
+class MistralEngine(OCREngine):
+    """Mistral OCR API, called on the shared asynchronous client"""
+
+    name = "mistral"
+    label = "Mistral"
+    version = f"{MISTRAL_MODEL};{PREPROCESS_SIGNATURE}"
+    execution = EXECUTION_ASYNC
+    max_workers = MISTRAL_CONCURRENCY
+
+    def __init__(self):
+        # Bounds the requests in flight; bound to the loop it was created on
+        self._semaphore: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+    def warm_up(self) -> None:
+        """Open the client's connection pool ahead of the first page"""
+        if MISTRAL_API_KEY:
+            get_mistral_client(MISTRAL_API_KEY)
+
+    def process(self, image_path: str) -> str:
+        """Process an image with Mistral OCR API"""
+        return run_on_client_loop(self.process_async(image_path))
+
+    async def process_async(self, image_path: str) -> str:
+        """Process an image with Mistral OCR API without blocking a thread on the request"""
+        if not MISTRAL_API_KEY:
+            return "Error: Mistral API key not found. Please set the MISTRAL_API_KEY environment variable."
+
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore[0] is not loop:
+            self._semaphore = (loop, asyncio.Semaphore(self.max_workers))
+
+        async with self._semaphore[1]:
+            try:
+                # Shrink and re-encode the image in memory before it goes over the wire
+                image_data, mime_type = await asyncio.to_thread(preprocess_image, image_path)
+
+                # Convert image to base64 for API request
+                image_base64 = base64.b64encode(image_data).decode("utf-8")
+
+                # Prepare the payload
+                payload = {
+                    "model": MISTRAL_MODEL,
+                    "messages": [
                         {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": "Extract all Arabic text from this image. Return only the extracted text without any additional comments or explanations."
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:{mime_type};base64,{image_base64}"
+                                    }
+                                }
+                            ]
                         }
                     ]
                 }
-            ]
-        }
-        
-        # Make the API request
-        response = requests.post(
-            "https://api.mistral.ai/v1/chat/completions",
-            headers=headers,
-            json=payload
-        )
-        
-        # Process the response
-        if response.status_code == 200:
-            result = response.json()
-            extracted_text = result["choices"][0]["message"]["content"]
-            return extracted_text
-        else:
-            error_message = f"Mistral API error: {response.status_code} - {response.text}"
-            print(error_message)
-            return error_message
-    
-    except Exception as e:
-        error_message = f"Error processing with Mistral OCR: {str(e)}"
-        print(error_message)
-        return error_message
\ No newline at end of file
+
+                # Make the API request on the shared, pooled and rate-limited client
+                result = await get_mistral_client(MISTRAL_API_KEY).chat(payload)
+
+                # Process the response
+                return result["choices"][0]["message"]["content"]
+
+            except MistralAPIError as e:
+                error_message = f"Mistral API error: {str(e)}"
+                print(error_message)
+                return error_message
+
+            except Exception as e:
+                error_message = f"Error processing with Mistral OCR: {str(e)}"
+                print(error_message)
+                return error_message
+
+
+class FakeEngine(OCREngine):
+    """Deterministic stand-in engine for tests and benchmarks
+
+    Returns Arabic text derived from the image bytes, so the same image always
+    gives the same text, after ``delay`` seconds of simulated work.
+    """
+
+    name = "fake"
+    label = "Fake"
+    version = "fake-1"
+    execution = EXECUTION_THREAD
+    max_workers = 4
+    batch_size = 4
+
+    def __init__(self, delay: float = OCR_FAKE_DELAY):
+        self.delay = delay
+
+    def process(self, image_path: str) -> str:
+        """Return text derived from the image's hash"""
+        return self.process_batch([image_path])[0]
+
+    def process_batch(self, image_paths: List[str]) -> List[str]:
+        """One simulated delay for the whole batch, like a batched model pass"""
+        if self.delay:
+            time.sleep(self.delay)
+        texts = []
+        for image_path in image_paths:
+            with open(image_path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            texts.append(f"نص تجريبي للصفحة {digest[:8]}\nسطر ثان {digest[8:16]}")
+        return texts
+
+
+# Registered engines by name
+OCR_ENGINE_REGISTRY: Dict[str, OCREngine] = {}
+
+
+def register_engine(engine: OCREngine) -> None:
+    """Make an engine available for OCR jobs under its name
+
+    Process-bound engines must be registered at import time so pool workers,
+    which import this module afresh, know them too.
+    """
+    OCR_ENGINE_REGISTRY[engine.name] = engine
+
+
+def get_engine(name: str) -> OCREngine:
+    """Return a registered engine, raising ValueError if it is unknown"""
+    if name not in OCR_ENGINE_REGISTRY:
+        raise ValueError(f"Unknown OCR engine: {name}")
+    return OCR_ENGINE_REGISTRY[name]
+
+
+def engine_modes() -> Tuple[str, ...]:
+    """Engine selections an upload can ask for: each engine, plus "both" and "merge" of the combined engines"""
+    modes = tuple(OCR_ENGINE_REGISTRY)
+    if len(OCR_COMBINED_ENGINES) == 2 and all(name in OCR_ENGINE_REGISTRY for name in OCR_COMBINED_ENGINES):
+        modes += ("both", "merge")
+    return modes
+
+
+def mode_engines(mode: str) -> Tuple[str, ...]:
+    """Names of the engines an engine selection runs"""
+    if mode in ("both", "merge"):
+        return OCR_COMBINED_ENGINES
+    get_engine(mode)
+    return (mode,)
+
+
+def engine_versions() -> Dict[str, str]:
+    """Version of every registered engine"""
+    return {name: engine.version for name, engine in OCR_ENGINE_REGISTRY.items()}
+
+
+register_engine(QariEngine())
+register_engine(MistralEngine())
+if OCR_FAKE_ENGINE:
+    register_engine(FakeEngine())
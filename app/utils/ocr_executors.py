@@ -0,0 +1,336 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.cache import hash_file
+from app.utils.metrics import OCR_ENGINE_ERRORS, OCR_PAGE_SECONDS, OCR_TILES, timed
+from app.utils.mistral_client import submit_to_client_loop
+from app.utils.ocr_cache import engine_key, ocr_cache
+from app.utils.ocr_engines import (
+    ERROR_PREFIXES,
+    EXECUTION_ASYNC,
+    EXECUTION_PROCESS,
+    OCR_ENGINE_REGISTRY,
+    OCREngine,
+    get_engine,
+    is_error_text,
+    mode_engines,
+)
+from app.utils.ocr_merge import MERGE_PREFERRED_ENGINE, merge_texts
+from app.utils.tiling import Tile, needs_tiling, remove_tiles, stitch_texts, write_tiles
+
+# Seconds a page may wait for more pages to fill an engine batch
+OCR_BATCH_WAIT = settings.ocr.batch_wait
+
+# Load engine models and start their worker pools at startup instead of on the first page
+OCR_WARM_UP = settings.ocr.warm_up
+
+_executors: Dict[str, Executor] = {}
+_batchers: Dict[str, "_Batcher"] = {}
+_executors_lock = threading.Lock()
+
+
+def _warm_up_worker(engine_name: str) -> None:
+    """Pool worker initializer: load the engine once for the lifetime of the worker"""
+    get_engine(engine_name).warm_up()
+
+
+def _run_batch(engine_name: str, image_paths: List[str]) -> List[str]:
+    """Run an engine on a batch of images; module level so process pools can pickle it"""
+    return get_engine(engine_name).process_batch(image_paths)
+
+
+def _create_executor(engine: OCREngine) -> Executor:
+    """Create the executor that runs pages for an engine"""
+    if engine.execution == EXECUTION_PROCESS:
+        # Local inference is CPU bound; spawn avoids forking a threaded server
+        return ProcessPoolExecutor(
+            max_workers=engine.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up_worker,
+            initargs=(engine.name,),
+        )
+
+    # Thread-safe engines share this process's instance, which is warmed up at startup
+    return ThreadPoolExecutor(max_workers=engine.max_workers, thread_name_prefix=f"ocr-{engine.name}")
+
+
+class _Batcher:
+    """Group the pages sent to one engine into batches of up to its ``batch_size``
+
+    A batch goes to the engine's executor as soon as it is full, or after
+    ``OCR_BATCH_WAIT`` seconds, so a lone page is never held up for long.
+    """
+
+    def __init__(self, engine: OCREngine, executor: Executor, wait: float = OCR_BATCH_WAIT):
+        self._engine = engine
+        self._executor = executor
+        self._wait = wait
+        self._pending: List[Tuple[str, "Future[str]"]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def submit(self, image_path: str) -> "Future[str]":
+        """Queue a page and return a future of its text"""
+        future: "Future[str]" = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((image_path, future))
+            if len(self._pending) >= self._engine.batch_size:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self._wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if batch:
+            self._dispatch(batch)
+        return future
+
+    def flush(self) -> None:
+        """Send the pages waiting for a batch right away"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._dispatch(batch)
+
+    def _take(self) -> List[Tuple[str, "Future[str]"]]:
+        """Remove and return the waiting pages; the caller holds the lock"""
+        batch, self._pending = self._pending, []
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _dispatch(self, batch: List[Tuple[str, "Future[str]"]]) -> None:
+        """Run a batch on the executor and hand each page its text"""
+        # Pages whose caller gave up (timed out) before the batch left are dropped
+        batch = [(image_path, future) for image_path, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        image_paths = [image_path for image_path, _ in batch]
+        try:
+            try:
+                done = self._executor.submit(_run_batch, self._engine.name, image_paths)
+            except BrokenExecutor:
+                # The pool lost a worker earlier; send the batch to a new one
+                _discard_executor(self._engine.name, self._executor)
+                done = _get_batcher(self._engine)._executor.submit(_run_batch, self._engine.name, image_paths)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        def distribute(done: "Future[List[str]]") -> None:
+            try:
+                texts = done.result()
+            except Exception as e:
+                if isinstance(e, BrokenExecutor):
+                    # A worker died on this batch (e.g. out of memory); later pages get a new pool
+                    _discard_executor(self._engine.name, self._executor)
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+        done.add_done_callback(distribute)
+
+
+def _get_batcher(engine: OCREngine) -> _Batcher:
+    """Return the shared batcher (and executor) for an engine, creating them on first use"""
+    with _executors_lock:
+        batcher = _batchers.get(engine.name)
+        if batcher is None:
+            executor = _executors[engine.name] = _create_executor(engine)
+            batcher = _batchers[engine.name] = _Batcher(engine, executor)
+        return batcher
+
+
+def _discard_executor(engine_name: str, executor: Executor) -> None:
+    """Forget a broken executor, and its batcher, so the engine's next batch starts a new one"""
+    with _executors_lock:
+        if _executors.get(engine_name) is executor:
+            del _executors[engine_name]
+            _batchers.pop(engine_name, None)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _dispatch_page(engine_name: str, image_path: str) -> "Future[str]":
+    """Run one engine on one image the way the engine has to be run"""
+    engine = get_engine(engine_name)
+    if engine.execution == EXECUTION_ASYNC:
+        # Coroutines share the client loop; no thread waits on the request
+        return submit_to_client_loop(engine.process_async(image_path))
+    return _get_batcher(engine).submit(image_path)
+
+
+def warm_up_engines() -> None:
+    """Load every registered engine ahead of the first page
+
+    Engines run in this process are warmed up here; process-bound engines
+    get their worker pool started, and each worker loads the engine once.
+    """
+    if not OCR_WARM_UP:
+        return
+
+    for engine in list(OCR_ENGINE_REGISTRY.values()):
+        try:
+            if engine.execution == EXECUTION_PROCESS:
+                _get_batcher(engine)
+                executor = _executors[engine.name]
+                for _ in range(engine.max_workers):
+                    executor.submit(_run_batch, engine.name, [])
+            else:
+                engine.warm_up()
+        except Exception as e:
+            print(f"Could not warm up OCR engine {engine.name}: {str(e)}")
+
+
+def _dispatch_tiles(engine_name: str, tiles: List[Tile]) -> "Future[str]":
+    """Run one engine on the tiles of an image in parallel and stitch their text together
+
+    If a tile fails, the page gets its error message instead, so a partial
+    text is never taken (or cached) for the whole page.
+    """
+    futures = [_dispatch_page(engine_name, str(tile.path)) for tile in tiles]
+
+    def stitch() -> str:
+        texts = [future.result() for future in futures]
+        errors = [text for text in texts if text.startswith(ERROR_PREFIXES)]
+        if errors:
+            return f"Error: OCR failed on {len(errors)} of {len(texts)} tiles: {errors[0]}"
+        return stitch_texts(tiles, texts)
+
+    return _when_all(futures, stitch)
+
+
+def _when_all(futures: List[Future], result: Callable[[], Any]) -> Future:
+    """Return a future of ``result()``, called once every one of ``futures`` has finished
+
+    Cancelling it (e.g. when a page times out) cancels the futures that have
+    not started yet, so pages still waiting for a batch are never run.
+    """
+    combined: Future = Future()
+    remaining = len(futures)
+    lock = threading.Lock()
+
+    def on_done(_):
+        nonlocal remaining
+        with lock:
+            remaining -= 1
+            if remaining:
+                return
+        # False once the caller has cancelled it; nobody wants the result then
+        if not combined.set_running_or_notify_cancel():
+            return
+        try:
+            combined.set_result(result())
+        except Exception as e:
+            combined.set_exception(e)
+
+    def on_cancel(_):
+        if combined.cancelled():
+            for future in futures:
+                future.cancel()
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    combined.add_done_callback(on_cancel)
+    return combined
+
+
+def _combine(futures: Dict[str, "Future[str]"], engine: str) -> "Future[Dict]":
+    """Return a future that resolves once every engine future has finished"""
+    return _when_all(
+        list(futures.values()),
+        lambda: combine_engine_texts({name: future.result() for name, future in futures.items()}, engine),
+    )
+
+
+def combine_engine_texts(texts: Dict[str, str], engine: str) -> Dict:
+    """Build a page result from the text each engine produced"""
+    error = any(is_error_text(text) for text in texts.values())
+
+    if len(texts) == 1:
+        return {"text": next(iter(texts.values())), "error": error}
+
+    if engine == "merge":
+        primary = MERGE_PREFERRED_ENGINE if MERGE_PREFERRED_ENGINE in texts else next(iter(texts))
+        secondary = next(name for name in texts if name != primary)
+        text = merge_texts(texts[primary], texts[secondary])
+    else:
+        text = "\n\n".join(f"{get_engine(name).label} OCR:\n{engine_text}" for name, engine_text in texts.items())
+    return {"text": text, "engines": texts, "error": error}
+
+
+def _submit_engine(
+    engine: str, image_path: str, content_hash: Optional[str], tiles: Optional[List[Tile]] = None
+) -> "Future[str]":
+    """Run one engine on an image, or on its ``tiles``, answering from the OCR cache when possible"""
+    key = engine_key(content_hash, engine) if content_hash else None
+
+    if key:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            future: "Future[str]" = Future()
+            future.set_result(cached)
+            return future
+
+    start = time.perf_counter()
+    future = _dispatch_tiles(engine, tiles) if tiles else _dispatch_page(engine, image_path)
+
+    def record(done: "Future[str]") -> None:
+        OCR_PAGE_SECONDS.observe(time.perf_counter() - start, engine=engine)
+        if done.cancelled() or done.exception() is not None or is_error_text(done.result()):
+            OCR_ENGINE_ERRORS.inc(engine=engine)
+
+    future.add_done_callback(record)
+
+    if key:
+        def store(done: "Future[str]") -> None:
+            # Error messages are returned as text; never cache them
+            if not done.cancelled() and done.exception() is None and not is_error_text(done.result()):
+                ocr_cache.put(key, done.result())
+
+        future.add_done_callback(store)
+
+    return future
+
+
+def submit_ocr(image_path: str, engine: str, use_cache: bool = True) -> "Future[Dict]":
+    """Schedule OCR of one image and return a future of its page result
+
+    A page result is a dict with the page ``text`` and, when several engines
+    ran, the text of each engine under ``engines``. In ``both`` and ``merge``
+    mode the engines run concurrently on their own executors. Each engine's
+    text is cached under the hash of the image bytes. Oversized images are
+    cut into tiles that are read in parallel and stitched back together.
+    """
+    names = mode_engines(engine)
+    content_hash = hash_file(image_path) if use_cache else None
+
+    tiles = None
+    if needs_tiling(image_path):
+        with timed("tile_page"):
+            tiles = write_tiles(image_path)
+        OCR_TILES.inc(len(tiles))
+
+    futures = {name: _submit_engine(name, image_path, content_hash, tiles) for name in names}
+    combined = _combine(futures, engine)
+    if tiles:
+        combined.add_done_callback(lambda _: remove_tiles(tiles))
+    return combined
+
+
+def shutdown_executors() -> None:
+    """Shut down all engine executors"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+        _batchers.clear()
@@ -0,0 +1,75 @@
+import os
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import List
+
+from app.utils.ocr_engines import is_error_text
+
+# Engine whose line wins when two aligned lines score the same
+MERGE_PREFERRED_ENGINE = os.getenv("MERGE_PREFERRED_ENGINE", "mistral")
+
+# Arabic letters (without diacritics), used to score how plausible a line is
+_ARABIC_LETTER = re.compile(r"[ء-يٱ-ۓ]")
+
+
+def normalize_line(line: str) -> str:
+    """Normalize a line for comparison: drop diacritics, tatweel and extra spaces"""
+    line = "".join(c for c in unicodedata.normalize("NFKD", line) if not unicodedata.combining(c))
+    line = line.replace("ـ", "")
+    return " ".join(line.split())
+
+
+def _score(line: str) -> float:
+    """Heuristic confidence of a line: share of Arabic letters among visible characters"""
+    visible = [c for c in line if not c.isspace()]
+    if not visible:
+        return 0.0
+    arabic = sum(1 for c in visible if _ARABIC_LETTER.match(c))
+    unknown = sum(1 for c in visible if c == "�" or unicodedata.category(c).startswith("C"))
+    return (arabic - unknown) / len(visible)
+
+
+def merge_texts(primary: str, secondary: str) -> str:
+    """Merge two OCR readings of the same page line by line
+
+    ``primary`` is the preferred engine's text. Lines both engines agree on
+    are kept as-is. Lines that differ are paired up in order as two readings
+    of the same line, and only the more plausible of each pair is kept;
+    lines only one engine produced are kept so no text is lost.
+    """
+    if is_error_text(secondary):
+        return primary
+    if is_error_text(primary):
+        return secondary
+
+    primary_lines = [line for line in primary.splitlines() if line.strip()]
+    secondary_lines = [line for line in secondary.splitlines() if line.strip()]
+
+    matcher = SequenceMatcher(
+        None,
+        [normalize_line(line) for line in primary_lines],
+        [normalize_line(line) for line in secondary_lines],
+        autojunk=False,
+    )
+
+    merged: List[str] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            merged.extend(primary_lines[i1:i2])
+            continue
+
+        left = primary_lines[i1:i2]
+        right = secondary_lines[j1:j2]
+
+        # Pair up differing lines in order, even ones read too differently to
+        # look alike, so a line never appears twice; leftovers exist in one engine only
+        for k in range(max(len(left), len(right))):
+            a = left[k] if k < len(left) else None
+            b = right[k] if k < len(right) else None
+            if a is None or b is None:
+                merged.append(a if a is not None else b)
+            else:
+                merged.append(b if _score(b) > _score(a) else a)
+
+    return "\n".join(merged)
@@ -0,0 +1,272 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.cache import hash_file
+from app.utils.metrics import OCR_PAGES, timed
+from app.utils.ocr_cache import document_key, ocr_cache
+from app.utils.ocr_executors import submit_ocr
+from app.utils.page_filters import PAGE_FILTERS, PageFilter
+from app.utils.pdf_pages import get_page_count, iter_pdf_pages
+from app.utils.pdf_text import PDF_TEXT_LAYER, extract_text_layer, is_usable_text
+from app.utils.storage import storage_manager
+
+# Separator placed between the text of consecutive PDF pages
+PAGE_BREAK = "\n\n--- Page Break ---\n\n"
+
+# Seconds a single page may take from being dispatched before giving up on it
+OCR_PAGE_TIMEOUT = float(os.getenv("OCR_PAGE_TIMEOUT", "300"))
+
+# Maximum number of pages of one document dispatched but not yet collected
+OCR_MAX_PAGES_IN_FLIGHT = int(os.getenv("OCR_MAX_PAGES_IN_FLIGHT", "8"))
+
+
+def ocr_pages(
+    pages: Iterable[Tuple[int, Path]],
+    engine: str,
+    page_count: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+    delete_pages: bool = False,
+    use_cache: bool = True,
+    page_callback: Optional[Callable[[Dict], None]] = None,
+) -> List[Dict]:
+    """OCR pages concurrently and return their page results in page order
+
+    Pages are dispatched to the engine executors as they are produced, with at
+    most ``OCR_MAX_PAGES_IN_FLIGHT`` outstanding. Results are collected in
+    submission order, which reassembles the document in page order. A page
+    that does not finish within ``OCR_PAGE_TIMEOUT`` of being dispatched gets an error placeholder
+    instead of holding up the document, and so does a page whose OCR raised.
+    Blank pages are skipped and near-duplicate pages reuse the result of the
+    page they repeat.
+    """
+    page_results: List[Dict] = []
+    results_by_page: Dict[int, Dict] = {}
+    in_flight = deque()
+    page_filter = PageFilter() if PAGE_FILTERS else None
+
+    def collect() -> None:
+        page_number, img_path, source, original_page, future, deadline = in_flight.popleft()
+        if source == "blank":
+            page_result = {"text": ""}
+        elif source == "duplicate":
+            # The original page was dispatched earlier, so it has already been collected
+            original = results_by_page[original_page]
+            page_result = {key: original[key] for key in ("text", "engines", "error") if key in original}
+            page_result["duplicate_of"] = original_page
+        else:
+            try:
+                # Pages run concurrently, so each one's time counts from its own dispatch
+                page_result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                print(f"OCR timed out on page {page_number}")
+                page_result = {"text": f"[OCR timed out on page {page_number}]", "error": True}
+            except Exception as e:
+                # An engine that crashed fails its page, not the whole document
+                print(f"OCR failed on page {page_number}: {str(e)}")
+                page_result = {"text": f"[OCR failed on page {page_number}]", "error": True}
+
+        page_result = {**page_result, "page": page_number, "source": source}
+        OCR_PAGES.inc(source=source)
+        results_by_page[page_number] = page_result
+        page_results.append(page_result)
+
+        if page_callback:
+            page_callback(_page_event(page_result))
+
+        # Drop the rendered page so disk use stays bounded
+        if delete_pages:
+            img_path.unlink(missing_ok=True)
+
+        if progress_callback:
+            progress_callback(len(page_results), page_count)
+
+    for page_number, img_path in _timed_pages(pages):
+        if page_filter:
+            with timed("page_filter"):
+                source, original_page = page_filter.classify(page_number, img_path)
+        else:
+            source, original_page = "ocr", None
+        future = submit_ocr(str(img_path), engine, use_cache) if source == "ocr" else None
+        deadline = time.monotonic() + OCR_PAGE_TIMEOUT
+        in_flight.append((page_number, img_path, source, original_page, future, deadline))
+        if len(in_flight) >= OCR_MAX_PAGES_IN_FLIGHT:
+            collect()
+
+    while in_flight:
+        collect()
+
+    return page_results
+
+
+def _timed_pages(pages: Iterable[Tuple[int, Path]]) -> Iterator[Tuple[int, Path]]:
+    """Yield pages, timing how long each takes to produce (e.g. to render)"""
+    iterator = iter(pages)
+    while True:
+        with timed("render_page"):
+            page = next(iterator, None)
+        if page is None:
+            return
+        yield page
+
+
+def _page_event(page_result: Dict) -> Dict:
+    """The part of a page result streamed to clients as soon as the page is done"""
+    return {key: page_result[key] for key in ("page", "text", "source", "duplicate_of") if key in page_result}
+
+
+def build_result(page_results: List[Dict]) -> Dict:
+    """Join page results into the document result returned by a job"""
+    result = {
+        "text": PAGE_BREAK.join(page["text"] for page in page_results),
+        "page_count": len(page_results),
+        "pages": [
+            {key: page[key] for key in ("page", "source", "duplicate_of") if key in page}
+            for page in page_results
+        ],
+        "skipped_pages": {
+            "blank": sum(1 for page in page_results if page["source"] == "blank"),
+            "duplicate": sum(1 for page in page_results if page["source"] == "duplicate"),
+        },
+    }
+
+    # Keep the text of each engine when several engines ran
+    engine_names = list(dict.fromkeys(name for page in page_results for name in page.get("engines", {})))
+    if engine_names:
+        result["engines"] = {
+            name: PAGE_BREAK.join(page.get("engines", {}).get(name, page["text"]) for page in page_results)
+            for name in engine_names
+        }
+
+    return result
+
+
+def process_document(
+    file_path: Path,
+    engine: str,
+    work_dir: Path,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+    use_cache: bool = True,
+    page_callback: Optional[Callable[[Dict], None]] = None,
+    content_hash: Optional[str] = None,
+) -> Dict:
+    """Extract text from an uploaded PDF or image file
+
+    When the whole file has been processed before with the same engine
+    selection, the cached result is returned without rasterizing anything.
+    ``content_hash`` is the file's SHA-256 if it is already known (e.g.
+    computed while the upload was written), which saves reading it again.
+    """
+    key = document_key(content_hash or hash_file(file_path), engine) if use_cache else None
+    if key:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            if progress_callback:
+                progress_callback(cached["page_count"], cached["page_count"])
+            return {**cached, "cached": True}
+
+    with timed("ocr_document"):
+        page_results = _ocr_document(file_path, engine, work_dir, progress_callback, use_cache, page_callback)
+    result = build_result(page_results)
+
+    # Only cache documents where every page was read successfully
+    if key and not any(page.get("error") for page in page_results):
+        ocr_cache.put(key, result)
+
+    return result
+
+
+def _ocr_document(
+    file_path: Path,
+    engine: str,
+    work_dir: Path,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]],
+    use_cache: bool,
+    page_callback: Optional[Callable[[Dict], None]],
+) -> List[Dict]:
+    """OCR every page of a PDF or image file"""
+    file_extension = os.path.splitext(str(file_path))[1].lower()
+
+    # Process PDF files
+    if file_extension == ".pdf":
+        page_count = get_page_count(file_path)
+
+        # Pages that already carry a usable text layer skip rasterization and OCR
+        with timed("text_layer"):
+            text_layer = extract_text_layer(file_path, page_count) if PDF_TEXT_LAYER else [""] * page_count
+        text_pages = [
+            {"text": text, "page": page_number, "source": "text_layer"}
+            for page_number, text in enumerate(text_layer, start=1)
+            if is_usable_text(text)
+        ]
+        text_page_numbers = {page["page"] for page in text_pages}
+        ocr_page_numbers = [n for n in range(1, page_count + 1) if n not in text_page_numbers]
+
+        def report(completed_pages: int, _: Optional[int]) -> None:
+            if progress_callback:
+                progress_callback(len(text_pages) + completed_pages, page_count)
+
+        # Text layer pages are ready straight away
+        if page_callback:
+            for page in text_pages:
+                page_callback(_page_event(page))
+        report(0, page_count)
+
+        # Remaining pages are rendered a window at a time and OCR'd as soon as they are ready
+        ocr_results = ocr_pages(
+            iter_pdf_pages(file_path, work_dir, page_numbers=ocr_page_numbers),
+            engine,
+            page_count=page_count,
+            progress_callback=report,
+            delete_pages=True,
+            use_cache=use_cache,
+            page_callback=page_callback,
+        )
+
+        return sorted(text_pages + ocr_results, key=lambda page: page["page"])
+
+    # Process image files
+    return ocr_pages(
+        [(1, file_path)],
+        engine,
+        page_count=1,
+        progress_callback=progress_callback,
+        use_cache=use_cache,
+        page_callback=page_callback,
+    )
+
+
+def run_ocr_job(
+    file_path: Path,
+    engine: str,
+    workspace_id: str,
+    use_cache: bool = True,
+    keep_source: bool = False,
+    progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+    page_callback: Optional[Callable[[Dict], None]] = None,
+    content_hash: Optional[str] = None,
+) -> Dict:
+    """Job entry point: OCR a file from its storage workspace and clean up afterwards
+
+    The rendered page images are always removed. After a successful run the
+    whole workspace is released unless ``keep_source`` is set (e.g. for
+    searchable PDF export); after a failure the upload is kept so the job can
+    be retried, and is released with the job.
+    """
+    if not Path(file_path).exists():
+        raise FileNotFoundError("The uploaded file is no longer available")
+
+    with storage_manager.lease(workspace_id):
+        try:
+            page_dir = storage_manager.page_dir(workspace_id)
+            result = process_document(file_path, engine, page_dir, progress_callback, use_cache, page_callback, content_hash)
+        finally:
+            storage_manager.clear_pages(workspace_id)
+
+    if not keep_source:
+        storage_manager.release(workspace_id)
+    return result
@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# Enable blank and duplicate page detection
+PAGE_FILTERS = os.getenv("PAGE_FILTERS", "true").lower() == "true"
+
+# A page is blank when less than this share of its pixels is ink...
+BLANK_INK_RATIO = float(os.getenv("BLANK_INK_RATIO", "0.0005"))
+
+# ...or when its pixel values barely vary at all
+BLANK_MIN_STD = float(os.getenv("BLANK_MIN_STD", "2.0"))
+
+# How much darker than the paper (0-255) a pixel must be to count as ink
+BLANK_INK_DELTA = int(os.getenv("BLANK_INK_DELTA", "80"))
+
+# Maximum perceptual hash distance (of 64 bits) for a duplicate candidate
+DUPLICATE_MAX_DISTANCE = int(os.getenv("DUPLICATE_MAX_DISTANCE", "4"))
+
+# Maximum mean pixel difference (0-255) of thumbnails to confirm a duplicate
+DUPLICATE_MAX_DIFF = float(os.getenv("DUPLICATE_MAX_DIFF", "3.0"))
+
+# Longest edge of the image the blank test runs on
+_ANALYSIS_EDGE = 1024
+
+# Size of the thumbnails compared to confirm duplicates
+_THUMBNAIL_SIZE = (64, 64)
+
+
+def load_gray(image: Union[str, Path, Image.Image]) -> np.ndarray:
+    """Load an image as a downscaled 8-bit grayscale array"""
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as opened:
+            return load_gray(opened)
+
+    gray = image.convert("L")
+    gray.thumbnail((_ANALYSIS_EDGE, _ANALYSIS_EDGE))
+    return np.asarray(gray)
+
+
+def ink_ratio(gray: np.ndarray) -> float:
+    """Share of pixels clearly darker than the paper"""
+    paper = np.median(gray)
+    return float(np.count_nonzero(gray < paper - BLANK_INK_DELTA)) / gray.size
+
+
+def is_blank(gray: np.ndarray) -> bool:
+    """Return True if a page carries no meaningful ink"""
+    return float(gray.std()) < BLANK_MIN_STD or ink_ratio(gray) < BLANK_INK_RATIO
+
+
+def dhash(gray: np.ndarray) -> int:
+    """64-bit difference hash of a grayscale image"""
+    small = np.asarray(Image.fromarray(gray).resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def thumbnail(gray: np.ndarray) -> np.ndarray:
+    """Small fixed-size thumbnail used to confirm duplicate candidates"""
+    return np.asarray(Image.fromarray(gray).resize(_THUMBNAIL_SIZE, Image.BILINEAR), dtype=np.float32)
+
+
+class PageFilter:
+    """Classify the pages of one document as blank, duplicate or needing OCR
+
+    Duplicates are found by perceptual hash and then confirmed by comparing
+    thumbnails, so pages that merely share a layout are not merged.
+    """
+
+    def __init__(self):
+        self._seen: List[Tuple[int, int, np.ndarray]] = []
+
+    def classify(self, page_number: int, image: Union[str, Path, Image.Image]) -> Tuple[str, Optional[int]]:
+        """Return ``("blank", None)``, ``("duplicate", original_page)`` or ``("ocr", None)``"""
+        gray = load_gray(image)
+        if is_blank(gray):
+            return "blank", None
+
+        page_hash = dhash(gray)
+        page_thumbnail = thumbnail(gray)
+        for seen_number, seen_hash, seen_thumbnail in self._seen:
+            if bin(page_hash ^ seen_hash).count("1") > DUPLICATE_MAX_DISTANCE:
+                continue
+            if float(np.abs(page_thumbnail - seen_thumbnail).mean()) <= DUPLICATE_MAX_DIFF:
+                return "duplicate", seen_number
+
+        self._seen.append((page_number, page_hash, page_thumbnail))
+        return "ocr", None
@@ -0,0 +1,245 @@
+import os
+import re
+import threading
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from app.utils.document_export import SECTIONS
+from app.utils.ocr_pipeline import PAGE_BREAK
+from app.utils.pdf_pages import iter_pdf_pages
+from app.utils.storage import storage_manager
+
+# TrueType font with Arabic glyphs used for PDF text
+EXPORT_PDF_FONT = os.getenv("EXPORT_PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+# Resolution and JPEG quality of the page images in searchable PDFs
+EXPORT_PDF_DPI = int(os.getenv("EXPORT_PDF_DPI", "150"))
+EXPORT_PDF_IMAGE_QUALITY = int(os.getenv("EXPORT_PDF_IMAGE_QUALITY", "75"))
+
+# Font sizes of headings and of each section's text
+_HEADING_SIZE = 16
+_TEXT_SIZES = {"Arabic": 14, "English": 12, "Transliteration": 12}
+_MARGIN = 2 * cm
+
+# Lines made only of Arabic letters, spaces and neutral punctuation read right to
+# left as a whole, so their visual order is simply the reverse; anything else
+# (digits, Latin, brackets, vowel marks) goes through the full bidi algorithm
+_SIMPLE_RTL = re.compile(r"[\u0621-\u064A\u066E-\u06D3\uFB50-\uFDFF\uFE70-\uFEFF .,:;!?،؛؟\-]*")
+
+# Name the export font is registered under, once it is
+_font_name: Optional[str] = None
+_font_lock = threading.Lock()
+
+
+def get_font() -> str:
+    """Register the export font on first use and return its name"""
+    global _font_name
+    with _font_lock:
+        if _font_name is None:
+            try:
+                pdfmetrics.registerFont(TTFont("ExportFont", EXPORT_PDF_FONT))
+                _font_name = "ExportFont"
+            except Exception as e:
+                # Latin text still renders; Arabic needs a font with Arabic glyphs
+                print(f"Could not load PDF font {EXPORT_PDF_FONT}: {str(e)}")
+                _font_name = "Helvetica"
+        return _font_name
+
+
+@lru_cache(maxsize=65536)
+def _word_width(word: str, font: str, size: float) -> float:
+    """Width of a word; words repeat a lot, so measurements are cached"""
+    return pdfmetrics.stringWidth(word, font, size)
+
+
+@lru_cache(maxsize=65536)
+def _shape_word(word: str) -> str:
+    """Arabic presentation forms of a word
+
+    Letters only join within a word, so shaping word by word gives the same
+    result as shaping the whole line and lets repeated words hit the cache.
+    """
+    return arabic_reshaper.reshape(word)
+
+
+def visual_order(line: str) -> str:
+    """Put a shaped right-to-left line in visual (left to right) order"""
+    if _SIMPLE_RTL.fullmatch(line):
+        return line[::-1]
+    return get_display(line)
+
+
+def wrap_words(words: List[str], font: str, size: float, width: float) -> List[Tuple[str, float]]:
+    """Join words into ``(line, line_width)`` pieces that fit the width"""
+    space = _word_width(" ", font, size)
+    pieces: List[Tuple[str, float]] = []
+    current: List[str] = []
+    current_width = 0.0
+
+    for word in words:
+        word_width = _word_width(word, font, size)
+        if current and current_width + space + word_width > width:
+            pieces.append((" ".join(current), current_width))
+            current, current_width = [], 0.0
+        current_width += (space if current else 0) + word_width
+        current.append(word)
+
+    pieces.append((" ".join(current), current_width))
+    return pieces
+
+
+def create_pdf(
+    arabic_text: str,
+    translated_text: Optional[str] = None,
+    transliterated_text: Optional[str] = None,
+    output: Optional[BinaryIO] = None,
+    **_: Any,
+) -> BinaryIO:
+    """Create a PDF document with Arabic text, translation, and transliteration
+
+    Arabic is shaped and put in visual order so it renders correctly; it is
+    shaped before wrapping, so line widths are measured on the final glyphs.
+    Shaping and width measurements are cached per word.
+    """
+    output = output if output is not None else BytesIO()
+    font = get_font()
+    page_width, page_height = A4
+    text_width = page_width - 2 * _MARGIN
+
+    pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Arabic OCR Results")
+    y = page_height - _MARGIN
+
+    def advance(height: float) -> float:
+        # Start a new page when the next line does not fit
+        nonlocal y
+        if y - height < _MARGIN:
+            pdf.showPage()
+            y = page_height - _MARGIN
+        y -= height
+        return y
+
+    texts = {"arabic_text": arabic_text, "translated_text": translated_text, "transliterated_text": transliterated_text}
+    for key, heading_text, style_name in SECTIONS:
+        text = texts[key]
+        if not text:
+            continue
+
+        # Add the section heading
+        pdf.setFont(font, _HEADING_SIZE)
+        pdf.setFillColorRGB(0, 0, 0.5)  # Navy blue
+        advance(_HEADING_SIZE * 2)
+        pdf.drawCentredString(page_width / 2, y, heading_text)
+        pdf.setFillColorRGB(0, 0, 0)
+
+        size = _TEXT_SIZES[style_name]
+        pdf.setFont(font, size)
+        for line in text.split("\n"):
+            if style_name == "Arabic":
+                # Right-aligned, shaped and in visual order
+                shaped = [_shape_word(word) for word in line.split(" ")]
+                for piece, piece_width in wrap_words(shaped, font, size, text_width):
+                    pdf.drawString(page_width - _MARGIN - piece_width, advance(size * 1.4), visual_order(piece))
+            else:
+                for piece, _width in wrap_words(line.split(" "), font, size, text_width):
+                    pdf.drawString(_MARGIN, advance(size * 1.4), piece)
+
+    pdf.save()
+    output.seek(0)
+    return output
+
+
+def create_searchable_pdf(
+    arabic_text: str,
+    source_path: Path,
+    result: Optional[Dict[str, Any]] = None,
+    output: Optional[BinaryIO] = None,
+    **_: Any,
+) -> BinaryIO:
+    """Create a searchable PDF: the original page images with the OCR text as an invisible layer
+
+    The engines return plain text without word positions, so each page's
+    lines are spread evenly down the page and stretched to the text width.
+    Text is stored in logical order, unshaped, so searching and copying
+    return the recognized characters.
+    """
+    output = output if output is not None else BytesIO()
+    font = get_font()
+    page_texts = arabic_text.split(PAGE_BREAK)
+    page_count = (result or {}).get("page_count") or len(page_texts)
+
+    pdf = canvas.Canvas(output, pageCompression=1)
+    pdf.setTitle("Arabic OCR Results")
+
+    for index, (image, dpi) in enumerate(_iter_page_images(Path(source_path), page_count)):
+        with image:
+            width, height = image.width * 72 / dpi, image.height * 72 / dpi
+            pdf.setPageSize((width, height))
+            pdf.drawImage(ImageReader(_encode_jpeg(image)), 0, 0, width, height)
+
+        page_text = page_texts[index] if index < len(page_texts) else ""
+        _draw_invisible_text(pdf, font, page_text, width, height)
+        pdf.showPage()
+
+    pdf.save()
+    output.seek(0)
+    return output
+
+
+def _iter_page_images(source_path: Path, page_count: int) -> Iterator[Tuple[Image.Image, float]]:
+    """Yield ``(image, dpi)`` for each page of the source upload"""
+    if source_path.suffix.lower() != ".pdf":
+        image = Image.open(source_path)
+        yield image, float(image.info.get("dpi", (EXPORT_PDF_DPI,))[0]) or EXPORT_PDF_DPI
+        return
+
+    # Render a few pages at a time and delete each one once it is placed
+    with storage_manager.scratch() as work_dir:
+        for _, image_path in iter_pdf_pages(source_path, work_dir, page_count=page_count, dpi=EXPORT_PDF_DPI):
+            image = Image.open(image_path)
+            image.load()
+            image_path.unlink(missing_ok=True)
+            yield image, EXPORT_PDF_DPI
+
+
+def _encode_jpeg(image: Image.Image) -> BytesIO:
+    """Encode a page image as JPEG, which the PDF embeds without re-encoding"""
+    buffer = BytesIO()
+    if image.mode not in ("L", "RGB"):
+        image = image.convert("RGB")
+    image.save(buffer, format="JPEG", quality=EXPORT_PDF_IMAGE_QUALITY)
+    buffer.seek(0)
+    return buffer
+
+
+def _draw_invisible_text(pdf: canvas.Canvas, font: str, page_text: str, width: float, height: float) -> None:
+    """Lay a page's text over it in invisible render mode"""
+    lines = [line.strip() for line in page_text.split("\n") if line.strip()]
+    if not lines:
+        return
+
+    margin = width * 0.05
+    line_height = (height - 2 * margin) / len(lines)
+    size = max(min(line_height * 0.8, 24), 1)
+
+    text = pdf.beginText()
+    text.setTextRenderMode(3)  # Invisible
+    for number, line in enumerate(lines):
+        natural_width = pdfmetrics.stringWidth(line, font, size) or 1
+        text.setFont(font, size)
+        text.setHorizScale(100 * (width - 2 * margin) / natural_width)
+        text.setTextOrigin(margin, height - margin - (number + 1) * line_height)
+        text.textOut(line)
+    pdf.drawText(text)
@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Resolution used when rasterizing PDF pages
+PDF_DPI = int(os.getenv("PDF_DPI", "200"))
+
+# Number of pages rendered per pdftoppm call
+PDF_PAGE_WINDOW = int(os.getenv("PDF_PAGE_WINDOW", "4"))
+
+
+def get_page_count(file_path: Path) -> int:
+    """Return the number of pages in a PDF file"""
+    from pdf2image import pdfinfo_from_path
+
+    return int(pdfinfo_from_path(str(file_path))["Pages"])
+
+
+def iter_pdf_pages(
+    file_path: Path,
+    output_folder: Path,
+    page_count: Optional[int] = None,
+    page_numbers: Optional[Iterable[int]] = None,
+    window: int = PDF_PAGE_WINDOW,
+    dpi: int = PDF_DPI,
+) -> Iterator[Tuple[int, Path]]:
+    """Rasterize a PDF lazily, yielding ``(page_number, image_path)`` pairs
+
+    Pages are rendered straight to PNG files a small window at a time, and the
+    next window is only rendered once the caller has consumed the previous
+    one, so memory and disk use stay constant as the page count grows. When
+    ``page_numbers`` is given only those pages are rendered. The caller owns
+    the yielded files and should delete them once processed.
+    """
+    if page_numbers is None:
+        if page_count is None:
+            page_count = get_page_count(file_path)
+        page_numbers = range(1, page_count + 1)
+
+    for start, end in _windows(sorted(page_numbers), max(window, 1)):
+        yield from zip(
+            range(start, end + 1),
+            _render_window(file_path, output_folder, start, end, dpi),
+        )
+
+
+def _windows(page_numbers: List[int], window: int) -> Iterator[Tuple[int, int]]:
+    """Group sorted page numbers into contiguous ranges of at most ``window`` pages"""
+    start = previous = None
+    for page_number in page_numbers:
+        if start is not None and page_number == previous + 1 and page_number - start < window:
+            previous = page_number
+            continue
+        if start is not None:
+            yield start, previous
+        start = previous = page_number
+    if start is not None:
+        yield start, previous
+
+
+def _render_window(file_path: Path, output_folder: Path, first_page: int, last_page: int, dpi: int) -> Iterator[Path]:
+    """Render a contiguous page range to PNG files and return their paths in page order"""
+    from pdf2image import convert_from_path
+
+    # A fixed-width prefix per window keeps pdf2image from picking up files of other windows
+    prefix = f"page_{first_page:06d}_"
+    paths = convert_from_path(
+        str(file_path),
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        output_folder=str(output_folder),
+        output_file=prefix,
+        fmt="png",
+        paths_only=True,
+    )
+    return iter(Path(p) for p in paths)
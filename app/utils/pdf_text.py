@@ -0,0 +1,51 @@
+import os
+import subprocess
+import unicodedata
+from pathlib import Path
+from typing import List
+
+# Use embedded PDF text instead of OCR where a page has a usable text layer
+PDF_TEXT_LAYER = os.getenv("PDF_TEXT_LAYER", "true").lower() == "true"
+
+# Minimum number of letters for a page's text layer to count as usable
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "20"))
+
+# Minimum share of letters among visible characters; lower means garbled extraction
+PDF_TEXT_MIN_LETTER_RATIO = float(os.getenv("PDF_TEXT_MIN_LETTER_RATIO", "0.5"))
+
+# Seconds allowed for pdftotext on one document
+PDF_TEXT_TIMEOUT = int(os.getenv("PDF_TEXT_TIMEOUT", "60"))
+
+
+def extract_text_layer(file_path: Path, page_count: int) -> List[str]:
+    """Return the embedded text of every page of a PDF using poppler's pdftotext
+
+    Pages without a text layer come back as empty strings. If pdftotext is
+    unavailable or fails, every page is treated as image-only.
+    """
+    try:
+        completed = subprocess.run(
+            ["pdftotext", "-enc", "UTF-8", str(file_path), "-"],
+            capture_output=True,
+            timeout=PDF_TEXT_TIMEOUT,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"PDF text layer extraction error: {str(e)}")
+        return [""] * page_count
+
+    # pdftotext ends every page with a form feed
+    pages = completed.stdout.decode("utf-8", errors="replace").split("\f")[:page_count]
+    pages += [""] * (page_count - len(pages))
+
+    # Map Arabic presentation forms back to base letters
+    return [unicodedata.normalize("NFKC", page).strip() for page in pages]
+
+
+def is_usable_text(text: str) -> bool:
+    """Return True if extracted page text looks like real text rather than noise"""
+    visible = [c for c in text if not c.isspace()]
+    letters = sum(1 for c in visible if c.isalpha())
+    if letters < PDF_TEXT_MIN_CHARS:
+        return False
+    return letters / len(visible) >= PDF_TEXT_MIN_LETTER_RATIO
@@ -0,0 +1,294 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from app.config import settings
+from app.utils.metrics import STORAGE_BYTES
+
+# Folder that holds one workspace per upload or job
+STORAGE_ROOT = Path(settings.storage.root)
+
+# Total bytes the workspaces may take up (0 for no limit)
+STORAGE_QUOTA_BYTES = settings.storage.quota_bytes
+
+# Seconds an idle workspace is kept before the janitor deletes it, and seconds between janitor runs
+STORAGE_TTL = settings.storage.ttl
+STORAGE_JANITOR_INTERVAL = settings.storage.janitor_interval
+
+# Folder for rendered page images; point it at a tmpfs mount (e.g. /dev/shm/arabicocr)
+# to keep them in memory. By default they go to a folder inside each workspace.
+STORAGE_PAGE_ROOT = settings.storage.page_root
+
+# File in each workspace that records when it expires, for the janitor of every process
+_MARKER_FILE = ".workspace.json"
+
+
+class StorageQuotaError(Exception):
+    """Raised when a new workspace would take storage over its quota"""
+
+
+def _tree_size(path: str) -> int:
+    """Total size in bytes of the files under a path, leaving out workspace markers"""
+    try:
+        if not os.path.isdir(path) or os.path.islink(path):
+            return os.stat(path, follow_symlinks=False).st_size
+        with os.scandir(path) as entries:
+            return sum(_tree_size(entry.path) for entry in entries if not entry.name.startswith(_MARKER_FILE))
+    except FileNotFoundError:
+        return 0
+
+
+def _counted(workspace: Dict[str, Any]) -> int:
+    """Bytes a workspace counts against the quota: what it holds, or at least its reservation"""
+    return max(workspace["size"], workspace["reserved"])
+
+
+class StorageManager:
+    """Hand out per-job workspaces under one root, within a disk quota
+
+    A workspace is a folder that is deleted when its owner releases it, or by
+    the janitor thread once it has been idle for its TTL. Its expiry and pin
+    are kept in a marker file inside it, so the janitor of any process that
+    shares the root sees them: ``touch`` and ``pin`` work on workspaces other
+    processes created, and a workspace in use (see ``lease``) has its expiry
+    pushed back by the janitor of the process using it on every run. Folders
+    without a marker, e.g. from an older version, are collected once they are
+    older than the TTL. Rendered page images
+    go to a separate page folder, which can live on tmpfs so the PNG written
+    for each page and read back by the engine never touches the disk.
+
+    Usage is kept as a running count, so checking the quota never walks the
+    tree: workspaces count their reservation until they are measured after
+    being written to (see ``measure``), and the janitor recounts everything,
+    including folders of other processes, on each run.
+    """
+
+    def __init__(
+        self,
+        root: Path = STORAGE_ROOT,
+        quota: int = STORAGE_QUOTA_BYTES,
+        ttl: int = STORAGE_TTL,
+        page_root: Optional[str] = STORAGE_PAGE_ROOT,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.page_root = Path(page_root) if page_root else None
+        self._quota = quota
+        self.ttl = ttl
+        self._workspaces: Dict[str, Dict[str, Any]] = {}
+        # Leases held in this process, also on workspaces other processes created
+        self._leases: Dict[str, int] = {}
+        # Bytes counted for this manager's workspaces, and for the other folders under the root
+        self._used = 0
+        self._other = _tree_size(str(self.root))
+        self._lock = threading.Lock()
+        self._janitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def create(self, workspace_id: Optional[str] = None, reserve: int = 0, ttl: Optional[int] = None) -> Path:
+        """Create a workspace and return its folder
+
+        ``reserve`` is the number of bytes the caller is about to write; it
+        counts against the quota until the workspace actually holds that much.
+        Raises StorageQuotaError if the quota does not leave room for it.
+        """
+        workspace_id = workspace_id or str(uuid.uuid4())
+        with self._lock:
+            if self._quota and self._used + self._other + reserve > self._quota:
+                raise StorageQuotaError("Storage quota exceeded")
+
+            path = self.root / workspace_id
+            path.mkdir(parents=True, exist_ok=True)
+            self._forget(workspace_id)
+            self._used += reserve
+            self._workspaces[workspace_id] = {"reserved": reserve, "size": 0}
+        self._write_marker(workspace_id, {"ttl": ttl or self.ttl, "pinned": False})
+        return path
+
+    def page_dir(self, workspace_id: str) -> Path:
+        """Return the folder for a workspace's rendered page images, creating it if needed"""
+        path = self.page_root / workspace_id if self.page_root else self.root / workspace_id / "pages"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def clear_pages(self, workspace_id: str) -> None:
+        """Delete a workspace's page images but keep the rest of it"""
+        shutil.rmtree(self.page_dir(workspace_id), ignore_errors=True)
+
+    def touch(self, workspace_id: str, ttl: Optional[int] = None) -> None:
+        """Mark a workspace as used now, optionally with a new TTL"""
+        marker = self._read_marker(workspace_id) or {"ttl": self.ttl, "pinned": False}
+        if ttl:
+            marker["ttl"] = ttl
+        self._write_marker(workspace_id, marker)
+
+    def pin(self, workspace_id: str) -> None:
+        """Keep a workspace past its TTL until it is released (e.g. while another process works on it)"""
+        marker = self._read_marker(workspace_id) or {"ttl": self.ttl}
+        marker["pinned"] = True
+        self._write_marker(workspace_id, marker)
+
+    @contextmanager
+    def lease(self, workspace_id: str) -> Iterator[Path]:
+        """Keep the janitor away from a workspace while it is being worked on"""
+        with self._lock:
+            self._leases[workspace_id] = self._leases.get(workspace_id, 0) + 1
+        self.touch(workspace_id)
+        try:
+            yield self.root / workspace_id
+        finally:
+            with self._lock:
+                self._leases[workspace_id] -= 1
+                if not self._leases[workspace_id]:
+                    del self._leases[workspace_id]
+            self.touch(workspace_id)
+            self.measure(workspace_id)
+
+    @contextmanager
+    def scratch(self) -> Iterator[Path]:
+        """A short-lived page folder (e.g. for rendering pages), deleted afterwards"""
+        workspace_id = str(uuid.uuid4())
+        self.create(workspace_id)
+        try:
+            with self.lease(workspace_id):
+                yield self.page_dir(workspace_id)
+        finally:
+            self.release(workspace_id)
+
+    def release(self, workspace_id: str) -> None:
+        """Delete a workspace and its page images"""
+        with self._lock:
+            self._forget(workspace_id)
+        self._remove(workspace_id)
+
+    def measure(self, workspace_id: str) -> None:
+        """Count the bytes a workspace holds now, after files were written to it"""
+        size = _tree_size(str(self.root / workspace_id))
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            if workspace is not None:
+                self._used -= _counted(workspace)
+                workspace["size"] = size
+                self._used += _counted(workspace)
+
+    def usage(self) -> int:
+        """Bytes taken up by the workspaces, counting reservations not yet written"""
+        with self._lock:
+            return self._used + self._other
+
+    def collect(self) -> int:
+        """Delete idle workspaces past their TTL and stale leftovers; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            leased = set(self._leases)
+        # Still in use here: push their expiry back for the janitors of other processes
+        for workspace_id in leased:
+            self.touch(workspace_id)
+
+        with os.scandir(self.root) as entries:
+            expired = [entry for entry in entries if entry.name not in leased and self._expired(entry, now)]
+        for entry in expired:
+            with self._lock:
+                self._forget(entry.name)
+            if entry.is_dir():
+                self._remove(entry.name)
+            else:
+                Path(entry.path).unlink(missing_ok=True)
+        removed = len(expired)
+
+        # Page folders of workspaces that are gone, e.g. from before a restart
+        if self.page_root is not None and self.page_root.is_dir():
+            with os.scandir(self.page_root) as entries:
+                stale = [
+                    entry for entry in entries
+                    if not (self.root / entry.name).exists() and entry.stat().st_mtime < now - self.ttl
+                ]
+            for entry in stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            removed += len(stale)
+
+        self._recount()
+        return removed
+
+    def start_janitor(self, interval: int = STORAGE_JANITOR_INTERVAL) -> None:
+        """Run ``collect`` every ``interval`` seconds on a background thread"""
+        if self._janitor is not None:
+            return
+        self._stop.clear()
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    self.collect()
+                except Exception as e:
+                    print(f"Storage janitor failed: {str(e)}")
+
+        self._janitor = threading.Thread(target=run, name="storage-janitor", daemon=True)
+        self._janitor.start()
+
+    def stop_janitor(self) -> None:
+        """Stop the janitor thread"""
+        if self._janitor is not None:
+            self._stop.set()
+            self._janitor.join()
+            self._janitor = None
+
+    def _expired(self, entry: os.DirEntry, now: float) -> bool:
+        """Whether a folder under the root is past its expiry, or past the TTL if it has no marker"""
+        marker = self._read_marker(entry.name) if entry.is_dir() else None
+        if marker is None:
+            return entry.stat().st_mtime < now - self.ttl
+        return not marker.get("pinned") and marker["expires_at"] < now
+
+    def _read_marker(self, workspace_id: str) -> Optional[Dict[str, Any]]:
+        """Read a workspace's marker file, or None if it has none"""
+        try:
+            with open(self.root / workspace_id / _MARKER_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_marker(self, workspace_id: str, marker: Dict[str, Any]) -> None:
+        """Write a workspace's marker file with its expiry set from now; does nothing if the folder is gone"""
+        marker["expires_at"] = time.time() + marker["ttl"]
+        path = self.root / workspace_id / _MARKER_FILE
+        # Unique per writer, so concurrent writers never replace each other's half-written file
+        temp_path = path.with_name(f"{_MARKER_FILE}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            temp_path.write_text(json.dumps(marker), encoding="utf-8")
+            temp_path.replace(path)
+        except FileNotFoundError:
+            pass
+
+    def _remove(self, workspace_id: str) -> None:
+        """Delete a workspace's folders"""
+        shutil.rmtree(self.root / workspace_id, ignore_errors=True)
+        if self.page_root:
+            shutil.rmtree(self.page_root / workspace_id, ignore_errors=True)
+
+    def _forget(self, workspace_id: str) -> None:
+        """Drop a workspace from the records and the count; the caller holds the lock"""
+        workspace = self._workspaces.pop(workspace_id, None)
+        if workspace is not None:
+            self._used -= _counted(workspace)
+
+    def _recount(self) -> None:
+        """Measure everything under the root again, correcting the running count"""
+        with os.scandir(self.root) as entries:
+            sizes = {entry.name: _tree_size(entry.path) for entry in entries}
+        with self._lock:
+            for workspace_id, workspace in self._workspaces.items():
+                workspace["size"] = sizes.pop(workspace_id, workspace["size"])
+            self._used = sum(_counted(workspace) for workspace in self._workspaces.values())
+            self._other = sum(sizes.values())
+
+
+# Shared storage manager for the application
+storage_manager = StorageManager()
+STORAGE_BYTES.set_function(storage_manager.usage)
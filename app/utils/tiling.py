@@ -0,0 +1,275 @@
+import os
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.utils.ocr_merge import normalize_line
+from app.utils.page_filters import BLANK_INK_DELTA
+
+# Read oversized page images in tiles instead of sending engines the whole image
+OCR_TILING = os.getenv("OCR_TILING", "true").lower() == "true"
+
+# Images with a longer side or more pixels than this are tiled
+OCR_TILE_THRESHOLD_SIDE = int(os.getenv("OCR_TILE_THRESHOLD_SIDE", "4000"))
+OCR_TILE_THRESHOLD_PIXELS = int(os.getenv("OCR_TILE_THRESHOLD_PIXELS", "16000000"))
+
+# Longest side of a tile, overlap included; keep it within OCR_MAX_EDGE so tiles are read at full resolution
+OCR_TILE_SIZE = int(os.getenv("OCR_TILE_SIZE", "2000"))
+
+# Pixels a tile reaches into its neighbours, so a line cut in two is read whole by one of them
+OCR_TILE_OVERLAP = int(os.getenv("OCR_TILE_OVERLAP", "48"))
+
+# Minimum similarity for lines on both sides of a seam to be one line read twice
+OCR_TILE_LINE_SIMILARITY = float(os.getenv("OCR_TILE_LINE_SIMILARITY", "0.8"))
+
+# Share of a tile, back from its far edge, searched for a gap between lines to cut at
+_GAP_SEARCH = 0.3
+
+# Narrowest run of empty columns (pixels) taken for a gap between columns of text
+_MIN_COLUMN_GAP = 32
+
+# Most lines that can repeat where two tiles overlap, and most words where two pieces of a line do
+_MAX_SEAM_LINES = 3
+_MAX_SEAM_WORDS = 3
+
+# Summary of the settings; part of the OCR cache key, since tiled pages read differently
+TILING_SIGNATURE = (
+    f"tile={int(OCR_TILING)},side={OCR_TILE_THRESHOLD_SIDE},px={OCR_TILE_THRESHOLD_PIXELS},"
+    f"size={OCR_TILE_SIZE},overlap={OCR_TILE_OVERLAP}"
+)
+
+# (left, top, right, bottom) of a tile, in pixels
+Box = Tuple[int, int, int, int]
+
+
+class Tile(NamedTuple):
+    """A tile of a page and where its text goes
+
+    Tiles of the same ``column`` and ``row`` are pieces of the same lines,
+    cut where a column of text is wider than a tile and has no gap to cut
+    at; ``lines`` are the indexes of the row's lines that have ink in the
+    tile. ``path`` is set once the tile has been written.
+    """
+
+    box: Box
+    column: int
+    row: int
+    lines: Tuple[int, ...]
+    path: Optional[Path] = None
+
+
+def needs_tiling(image_path: Union[str, Path]) -> bool:
+    """Return True if an image is too large to be read in one piece"""
+    if not OCR_TILING:
+        return False
+    try:
+        # Only the header is read
+        with Image.open(image_path) as image:
+            width, height = image.size
+    except OSError:
+        return False
+    return max(width, height) > OCR_TILE_THRESHOLD_SIDE or width * height > OCR_TILE_THRESHOLD_PIXELS
+
+
+def _emptiest_point(ink: np.ndarray) -> int:
+    """Index of the middle of the longest run with the least ink"""
+    empty = np.concatenate(([False], ink <= ink.min(), [False]))
+    edges = np.flatnonzero(np.diff(empty.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    longest = int(np.argmax(ends - starts))
+    return int(starts[longest] + ends[longest]) // 2
+
+
+def _column_cuts(ink: np.ndarray, size: int, noise: int) -> List[int]:
+    """Positions to cut a page at between columns of text, so that pieces stay within ``size`` where possible
+
+    ``ink`` is the amount of ink in each pixel column; a piece is as wide
+    as the ink in it. Cuts only go into real gaps; a stretch of text wider
+    than ``size`` without one is left for ``plan_tiles`` to cut into pieces.
+    """
+    inked = np.flatnonzero(ink > noise)
+
+    def ink_width(start: int, end: int) -> int:
+        inside = inked[np.searchsorted(inked, start):np.searchsorted(inked, end)]
+        return int(inside[-1]) + 1 - int(inside[0]) if len(inside) else 0
+
+    empty = np.concatenate(([False], ink <= noise, [False]))
+    edges = np.flatnonzero(np.diff(empty.astype(np.int8)))
+    gaps = [
+        int(start + end) // 2 for start, end in zip(edges[::2], edges[1::2])
+        if end - start >= _MIN_COLUMN_GAP and start > 0 and end < len(ink)
+    ]
+
+    cuts: List[int] = []
+    start = 0
+    candidate = None
+    for position in gaps + [len(ink)]:
+        if candidate is not None and ink_width(start, position) > size:
+            cuts.append(candidate)
+            start = candidate
+        candidate = position
+    return cuts
+
+
+def _emptiest_cuts(ink: np.ndarray, size: int) -> List[int]:
+    """Positions to cut a strip at so that no piece is longer than ``size``
+
+    ``ink`` is the amount of ink along the strip. Each cut goes into the
+    widest stretch with the least ink near the end of the piece: a gap
+    between lines when cutting a column into rows, or between words when
+    cutting lines into pieces.
+    """
+    cuts: List[int] = []
+    start = 0
+    while len(ink) - start > size:
+        window_start = start + size - max(int(size * _GAP_SEARCH), 1)
+        start = window_start + _emptiest_point(ink[window_start:start + size])
+        cuts.append(start)
+    return cuts
+
+
+def _line_bands(ink: np.ndarray, noise: int) -> List[Tuple[int, int]]:
+    """(start, end) of the runs of rows with ink, i.e. the lines of text"""
+    inked = np.concatenate(([False], ink > noise, [False]))
+    edges = np.flatnonzero(np.diff(inked.astype(np.int8)))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+
+def plan_tiles(gray: np.ndarray, tile_size: int = OCR_TILE_SIZE, overlap: int = OCR_TILE_OVERLAP) -> List[Tile]:
+    """Split a page into tiles, in right-to-left reading order
+
+    The page is first cut into columns at vertical gaps (between text
+    columns or the pages of a spread), then each column at the gaps between
+    its lines, so that no tile is larger than ``tile_size`` on either side.
+    A column still wider than that is also cut between words into pieces
+    that share their rows, so ``stitch_texts`` can put each line back
+    together. Columns come right to left, the rows of a column top to
+    bottom and the pieces of a row right to left; each tile reaches
+    ``overlap`` pixels into its neighbours.
+    """
+    height, width = gray.shape
+    ink = gray < np.median(gray) - BLANK_INK_DELTA
+    piece = max(tile_size - 2 * overlap, 1)
+
+    column_ink = ink.sum(axis=0)
+    noise = height // 1000
+    tiles: List[Tile] = []
+    column = 0
+    x_edges = [0] + _column_cuts(column_ink, piece, noise) + [width]
+    for start, end in reversed(list(zip(x_edges, x_edges[1:]))):
+        # Leave out the empty margins of the column
+        inked = np.flatnonzero(column_ink[start:end] > noise)
+        if not len(inked):
+            continue
+        left, right = start + int(inked[0]), start + int(inked[-1]) + 1
+        piece_edges = [left] + [left + cut for cut in _emptiest_cuts(column_ink[left:right], piece)] + [right]
+        pieces = list(reversed(list(zip(piece_edges, piece_edges[1:]))))
+        y_edges = [0] + _emptiest_cuts(ink[:, left:right].sum(axis=1), piece) + [height]
+
+        for row, (top, bottom) in enumerate(zip(y_edges, y_edges[1:])):
+            box_top, box_bottom = max(top - overlap, 0), min(bottom + overlap, height)
+            # Lines of the row, for the pieces of a column cut between words
+            bands = _line_bands(ink[top:bottom, left:right].sum(axis=1), (right - left) // 1000) if len(pieces) > 1 else []
+            for piece_left, piece_right in pieces:
+                box_left, box_right = max(piece_left - overlap, 0), min(piece_right + overlap, width)
+                piece_ink = ink[top:bottom, box_left:box_right].sum(axis=1)
+                lines = tuple(
+                    number for number, (band_start, band_end) in enumerate(bands)
+                    if piece_ink[band_start:band_end].max() > (box_right - box_left) // 1000
+                )
+                tiles.append(Tile((box_left, box_top, box_right, box_bottom), column, row, lines))
+        column += 1
+    return tiles
+
+
+def write_tiles(image_path: Union[str, Path]) -> List[Tile]:
+    """Cut an oversized image into tiles saved next to it
+
+    Returns the tiles in reading order (see ``plan_tiles``), with their paths.
+    The caller owns the files and should delete them with ``remove_tiles``.
+    """
+    image_path = Path(image_path)
+    with Image.open(image_path) as image:
+        tiles = []
+        for number, tile in enumerate(plan_tiles(np.asarray(image.convert("L")))):
+            path = image_path.with_name(f"{image_path.stem}_tile_{number:03d}.png")
+            image.crop(tile.box).save(path)
+            tiles.append(tile._replace(path=path))
+    return tiles
+
+
+def remove_tiles(tiles: List[Tile]) -> None:
+    """Delete the files written by ``write_tiles``"""
+    for tile in tiles:
+        if tile.path is not None:
+            tile.path.unlink(missing_ok=True)
+
+
+def _same_line(line: str, repeat: str) -> bool:
+    """Return True if ``repeat`` reads the same line as ``line``, or a piece of it"""
+    line, repeat = normalize_line(line), normalize_line(repeat)
+    return bool(repeat) and (repeat in line or SequenceMatcher(None, line, repeat).ratio() >= OCR_TILE_LINE_SIMILARITY)
+
+
+def _seam_length(previous: List[str], following: List[str]) -> int:
+    """Number of leading lines of ``following`` that repeat the last lines of ``previous``"""
+    for count in range(min(len(previous), len(following), _MAX_SEAM_LINES), 0, -1):
+        if all(_same_line(a, b) for a, b in zip(previous[-count:], following[:count])):
+            return count
+    return 0
+
+
+def _join_pieces(pieces: List[str]) -> str:
+    """Join the pieces of a line, in reading order, dropping the words read twice where they overlap"""
+    words: List[str] = []
+    for piece in pieces:
+        piece_words = piece.split()
+        repeated = 0
+        for count in range(min(len(words), len(piece_words), _MAX_SEAM_WORDS), 0, -1):
+            if [normalize_line(word) for word in words[-count:]] == [normalize_line(word) for word in piece_words[:count]]:
+                repeated = count
+                break
+        words.extend(piece_words[repeated:])
+    return " ".join(words)
+
+
+def _row_lines(tiles: List[Tile], texts: List[str]) -> List[str]:
+    """Lines of one row of a column from the text of its pieces, right to left"""
+    tile_lines = [[line for line in text.splitlines() if line.strip()] for text in texts]
+    if len(tiles) == 1:
+        return tile_lines[0]
+
+    pieces: Dict[int, List[str]] = {}
+    leftover: List[str] = []
+    for tile, lines in zip(tiles, tile_lines):
+        if len(lines) == len(tile.lines):
+            for number, line in zip(tile.lines, lines):
+                pieces.setdefault(number, []).append(line)
+        else:
+            # The engine did not read one line per band of ink; keep its lines whole, after the others
+            leftover.extend(lines)
+    return [_join_pieces(pieces[number]) for number in sorted(pieces)] + leftover
+
+
+def stitch_texts(tiles: List[Tile], texts: List[str]) -> str:
+    """Join the text of tiles, given in reading order, into the page text
+
+    The pieces of each line are joined back together, lines read twice where
+    two rows of a column overlap are kept once, and columns are separated by
+    a blank line.
+    """
+    rows: Dict[Tuple[int, int], Tuple[List[Tile], List[str]]] = {}
+    for tile, text in zip(tiles, texts):
+        row_tiles, row_texts = rows.setdefault((tile.column, tile.row), ([], []))
+        row_tiles.append(tile)
+        row_texts.append(text)
+
+    columns: Dict[int, List[str]] = {}
+    for (column, _), (row_tiles, row_texts) in rows.items():
+        lines = columns.setdefault(column, [])
+        row_lines = _row_lines(row_tiles, row_texts)
+        lines.extend(row_lines[_seam_length(lines, row_lines):])
+    return "\n\n".join("\n".join(lines) for lines in columns.values() if lines)
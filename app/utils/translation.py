@@ -1,106 +1,270 @@
-import os
-import requests
-from dotenv import load_dotenv
-from typing import Optional
+import asyncio
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
 
-# Load environment variables
-load_dotenv()
+from app.config import settings
+from app.utils.cache import TieredCache, hash_bytes
+from app.utils.metrics import external_call
+from app.utils.translation_backends import TranslationError, get_translation_backend
 
-# Get API keys from environment variables
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GOOGLE_TRANSLATE_API_KEY = os.getenv("GOOGLE_TRANSLATE_API_KEY")
+# Input token budget of one translation request, and the estimate used to apply it
+TRANSLATION_CHUNK_TOKENS = settings.translation.chunk_tokens
+TRANSLATION_CHARS_PER_TOKEN = settings.translation.chars_per_token
 
-# Translation service to use (openai or google)
-TRANSLATION_SERVICE = os.getenv("TRANSLATION_SERVICE", "openai")
+# Number of chunks translated at the same time
+TRANSLATION_CONCURRENCY = settings.translation.concurrency
 
+# Segment translation cache (memory entries; optional disk tier, size cap and TTL)
+TRANSLATION_CACHE_ENTRIES = settings.translation.cache_entries
+TRANSLATION_CACHE_DIR = settings.translation.cache_dir
+TRANSLATION_CACHE_MAX_BYTES = settings.translation.cache_max_bytes
+TRANSLATION_CACHE_TTL = settings.translation.cache_ttl
 
-def translate_text(text: str, target_language: str = "en") -> str:
-    """Translate Arabic text to the target language"""
+# Paragraph breaks, sentence ends and the markers that label segments within a chunk
+_PARAGRAPH_BREAK = re.compile(r"(\n\s*\n)")
+_SENTENCE_END = re.compile(r"(?<=[.!?؟۔])(\s+)|(\n)")
+_SEGMENT_MARKER = "[[{}]]"
+_MARKER = re.compile(r"\[\[(\d+)\]\]")
+
+# Text without any Arabic letters (page break markers, numbers) is passed through as-is
+_ARABIC_LETTER = re.compile(r"[؀-ۿݐ-ݿࢠ-ࣿﭐ-﷿ﹰ-﻿]")
+
+# Shared segment cache
+translation_cache = TieredCache(
+    TRANSLATION_CACHE_ENTRIES, TRANSLATION_CACHE_DIR, TRANSLATION_CACHE_MAX_BYTES, TRANSLATION_CACHE_TTL
+)
+
+# Caps chunk requests in flight across all translations of this process; bound to the loop it was created on
+_semaphore: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = None
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the shared concurrency cap of the running loop, creating it on first use"""
+    global _semaphore
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore[0] is not loop:
+        _semaphore = (loop, asyncio.Semaphore(TRANSLATION_CONCURRENCY))
+    return _semaphore[1]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text"""
+    return int(len(text) / TRANSLATION_CHARS_PER_TOKEN) + 1
+
+
+def normalize_segment(segment: str) -> str:
+    """Normalize a segment for caching: NFC, trimmed lines, single spaces"""
+    segment = unicodedata.normalize("NFC", segment)
+    return "\n".join(" ".join(line.split()) for line in segment.strip().splitlines())
+
+
+def split_segments(text: str, budget: int = TRANSLATION_CHUNK_TOKENS) -> List[Tuple[str, bool]]:
+    """Split text into ``(part, translatable)`` pairs that join back to the original
+
+    Paragraphs become segments; paragraphs over the token budget are split
+    further at sentence ends and line breaks. Separators and text without
+    Arabic letters are returned as non-translatable parts.
+    """
+    parts: List[Tuple[str, bool]] = []
+
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        if not paragraph:
+            continue
+        if not _ARABIC_LETTER.search(paragraph):
+            parts.append((paragraph, False))
+            continue
+
+        pieces = [paragraph]
+        if estimate_tokens(paragraph) > budget:
+            pieces = [piece for piece in _SENTENCE_END.split(paragraph) if piece]
+
+        for piece in pieces:
+            if not _ARABIC_LETTER.search(piece):
+                parts.append((piece, False))
+                continue
+
+            # Keep surrounding whitespace out of the segment so the layout survives
+            stripped = piece.strip()
+            start = piece.index(stripped)
+            if start:
+                parts.append((piece[:start], False))
+            parts.append((stripped, True))
+            if start + len(stripped) < len(piece):
+                parts.append((piece[start + len(stripped):], False))
+
+    return parts
+
+
+def pack_chunks(segments: List[str], budget: int = TRANSLATION_CHUNK_TOKENS) -> List[List[str]]:
+    """Pack segments, in order, into chunks that fit the token budget"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+
+    for segment in segments:
+        tokens = estimate_tokens(segment)
+        if current and current_tokens + tokens > budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(segment)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def segment_key(segment: str, target_language: str) -> str:
+    """Cache key of a segment translation"""
+    backend = get_translation_backend()
+    return f"translation:{backend.name}:{backend.model}:{target_language}:{hash_bytes(segment.encode('utf-8'))}"
+
+
+def mark_segments(segments: List[str]) -> str:
+    """Join segments into one text, each preceded by its numbered marker"""
+    return "\n\n".join(f"{_SEGMENT_MARKER.format(i)}\n{segment}" for i, segment in enumerate(segments, start=1))
+
+
+def unmark_segments(text: str, count: int) -> Optional[List[str]]:
+    """Split a translated marked text back into segments, or None if markers were lost"""
+    pieces = _MARKER.split(text)
+    numbers = [int(number) for number in pieces[1::2]]
+    if numbers != list(range(1, count + 1)):
+        return None
+    return [piece.strip() for piece in pieces[2::2]]
+
+
+async def translate_text(text: str, target_language: str = "en") -> str:
+    """Translate Arabic text to the target language
+
+    The text is split into segments that are translated in token-budgeted
+    chunks, concurrently, and reassembled in order. Segment translations are
+    cached, so re-translating an edited document only sends changed segments.
+    """
     if not text:
         return ""
-    
-    # Choose translation service based on configuration
-    if TRANSLATION_SERVICE.lower() == "openai":
-        return translate_with_openai(text, target_language)
-    else:
-        return translate_with_google(text, target_language)
-
-
-def translate_with_openai(text: str, target_language: str = "en") -> str:
-    """Translate text using OpenAI GPT-4o API"""
-    if not OPENAI_API_KEY:
-        return "Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
-    
-    try:
-        import openai
-        
-        # Configure OpenAI client
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Get language name from code
-        language_names = {
-            "en": "English",
-            "fr": "French",
-            "es": "Spanish",
-            "de": "German",
-            "it": "Italian",
-            "pt": "Portuguese",
-            "ru": "Russian",
-            "zh": "Chinese",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "ar": "Arabic",
-            # Add more languages as needed
-        }
-        
-        language_name = language_names.get(target_language, "English")
-        
-        # Create the prompt
-        prompt = f"Translate the following Arabic text to {language_name}. Provide only the translation without any additional text or explanations:\n\n{text}"
-        
-        # Make the API request
-        response = client.chat.completions.create(
-            model="gpt-4o",  # Use GPT-4o for best translation quality
-            messages=[
-                {"role": "system", "content": "You are a professional translator specializing in Arabic to other languages."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,  # Lower temperature for more consistent translations
-            max_tokens=4000
-        )
-        
-        # Extract the translation from the response
-        translation = response.choices[0].message.content.strip()
-        return translation
-    
-    except Exception as e:
-        error_message = f"OpenAI translation error: {str(e)}"
+
+    parts = split_segments(text)
+    translations, errors = await _translate_segments(_unique_segments(parts), target_language)
+    if errors:
+        error_message = next(iter(errors.values()))
         print(error_message)
         return error_message
 
+    return _join_parts(parts, translations)
 
-def translate_with_google(text: str, target_language: str = "en") -> str:
-    """Translate text using Google Translate API via translators library"""
-    try:
-        # Using the translators library which doesn't require an API key for basic usage
-        import translators as ts
-        
-        # Map language codes if needed
-        language_map = {
-            "zh": "zh-CN",  # Chinese (Simplified)
-            "zh-TW": "zh-TW",  # Chinese (Traditional)
-            # Add more mappings as needed
-        }
-        
-        # Get the mapped language code or use the original
-        target_lang = language_map.get(target_language, target_language)
-        
-        # Translate using Google Translate
-        translation = ts.google(text, from_language='ar', to_language=target_lang)
-        
-        return translation
-    
-    except Exception as e:
-        error_message = f"Google translation error: {str(e)}"
-        print(error_message)
-        return error_message
\ No newline at end of file
+
+async def translate_batch(items: List[Tuple[str, str]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Translate many ``(text, target_language)`` items, returning ``(translation, error)`` for each
+
+    Segments of all items with the same target language are pooled, so
+    identical texts and paragraphs are translated once and short texts share
+    chunk requests. A failed chunk only fails the items that contain it.
+    """
+    parsed = [split_segments(text) if text else [] for text, _ in items]
+
+    # Pool the segments of every item per target language
+    pools: Dict[str, List[str]] = {}
+    for parts, (_, target_language) in zip(parsed, items):
+        pools.setdefault(target_language, []).extend(_unique_segments(parts))
+
+    languages = list(pools)
+    outcomes = await asyncio.gather(
+        *(_translate_segments(list(dict.fromkeys(pools[language])), language) for language in languages)
+    )
+    results = dict(zip(languages, outcomes))
+
+    batch: List[Tuple[Optional[str], Optional[str]]] = []
+    for parts, (_, target_language) in zip(parsed, items):
+        translations, errors = results[target_language]
+        error = next((errors[segment] for segment in _unique_segments(parts) if segment in errors), None)
+        batch.append((None, error) if error else (_join_parts(parts, translations), None))
+    return batch
+
+
+def _unique_segments(parts: List[Tuple[str, bool]]) -> List[str]:
+    """Normalized translatable segments of split text, without repeats"""
+    return list(dict.fromkeys(normalize_segment(part) for part, translatable in parts if translatable))
+
+
+def _join_parts(parts: List[Tuple[str, bool]], translations: Dict[str, str]) -> str:
+    """Reassemble split text from its segment translations"""
+    return "".join(
+        translations[normalize_segment(part)] if translatable else part
+        for part, translatable in parts
+    )
+
+
+async def _translate_segments(segments: List[str], target_language: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Translate segments, returning their translations and the errors of failed ones"""
+    # Serve what we can from the cache
+    translations: Dict[str, str] = {}
+    missing: List[str] = []
+    for segment in segments:
+        cached = translation_cache.get(segment_key(segment, target_language))
+        if cached is not None:
+            translations[segment] = cached
+        else:
+            missing.append(segment)
+
+    # Translate the rest chunk by chunk, concurrently
+    chunks = pack_chunks(missing)
+    results = await asyncio.gather(
+        *(_translate_chunk(chunk, target_language) for chunk in chunks), return_exceptions=True
+    )
+
+    errors: Dict[str, str] = {}
+    for chunk, chunk_results in zip(chunks, results):
+        if isinstance(chunk_results, TranslationError) and len(chunk) > 1:
+            # Retry the segments of a failed chunk one by one so one bad segment only fails itself
+            retried, retry_errors = await _translate_segments_singly(chunk, target_language)
+            translations.update(retried)
+            errors.update(retry_errors)
+        elif isinstance(chunk_results, TranslationError):
+            errors.update(dict.fromkeys(chunk, str(chunk_results)))
+        elif isinstance(chunk_results, BaseException):
+            raise chunk_results
+        else:
+            translations.update(zip(chunk, chunk_results))
+    return translations, errors
+
+
+async def _translate_segments_singly(segments: List[str], target_language: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Translate segments in separate requests, returning their translations and errors"""
+    results = await asyncio.gather(
+        *(_translate_chunk([segment], target_language) for segment in segments), return_exceptions=True
+    )
+
+    translations: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    for segment, result in zip(segments, results):
+        if isinstance(result, TranslationError):
+            errors[segment] = str(result)
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            translations[segment] = result[0]
+    return translations, errors
+
+
+async def _translate_chunk(segments: List[str], target_language: str) -> List[str]:
+    """Translate a chunk of segments with the configured backend and cache the results"""
+    backend = get_translation_backend()
+
+    async def translate(text: str) -> str:
+        async with _get_semaphore():
+            with external_call(backend.name):
+                return await backend.translate(text, target_language)
+
+    if len(segments) == 1:
+        translated = [await translate(segments[0])]
+    else:
+        translated = unmark_segments(await translate(mark_segments(segments)), len(segments))
+        if translated is None:
+            # The service dropped or merged markers; fall back to one request per segment
+            translated = list(await asyncio.gather(*(translate(segment) for segment in segments)))
+
+    for segment, translation in zip(segments, translated):
+        translation_cache.put(segment_key(segment, target_language), translation)
+    return translated
@@ -0,0 +1,204 @@
+import asyncio
+import random
+import threading
+from typing import Optional
+
+from app.config import settings
+
+# API keys
+OPENAI_API_KEY = settings.openai_api_key
+GOOGLE_TRANSLATE_API_KEY = settings.google_translate_api_key
+
+# Translation service to use (openai, google or stub)
+TRANSLATION_SERVICE = settings.translation.service
+
+# Model used for OpenAI translations
+OPENAI_TRANSLATION_MODEL = settings.translation.openai_model
+
+# Optional base URL of an OpenAI-compatible API (e.g. a local stub)
+OPENAI_BASE_URL = settings.translation.openai_base_url
+
+# Per-request timeout (seconds) and retries of translation calls
+TRANSLATION_TIMEOUT = settings.translation.timeout
+TRANSLATION_MAX_RETRIES = settings.translation.max_retries
+
+# Target language names used in prompts
+LANGUAGE_NAMES = {
+    "en": "English",
+    "fr": "French",
+    "es": "Spanish",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "ru": "Russian",
+    "zh": "Chinese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "ar": "Arabic",
+    # Add more languages as needed
+}
+
+# Language codes as expected by Google Translate
+GOOGLE_LANGUAGE_MAP = {
+    "zh": "zh-CN",  # Chinese (Simplified)
+    "zh-TW": "zh-TW",  # Chinese (Traditional)
+    # Add more mappings as needed
+}
+
+
+class TranslationError(Exception):
+    """Raised when a translation service call fails"""
+
+
+class TranslationBackend:
+    """A translation service whose client is created once and reused across requests"""
+
+    name = ""
+    model = ""
+
+    async def translate(self, text: str, target_language: str) -> str:
+        """Translate Arabic text to the target language"""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Release the backend's connections"""
+
+
+class OpenAIBackend(TranslationBackend):
+    """Translate with the OpenAI chat completions API over a pooled async client"""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = OPENAI_API_KEY, model: str = OPENAI_TRANSLATION_MODEL):
+        self.model = model
+        self._client = None
+        if api_key:
+            import openai
+
+            # The client keeps its HTTP connection pool for the life of the process
+            self._client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=OPENAI_BASE_URL,
+                timeout=TRANSLATION_TIMEOUT,
+                max_retries=TRANSLATION_MAX_RETRIES,
+            )
+
+    async def translate(self, text: str, target_language: str) -> str:
+        """Translate text using OpenAI GPT-4o API"""
+        if self._client is None:
+            raise TranslationError("Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
+
+        language_name = LANGUAGE_NAMES.get(target_language, "English")
+
+        # Create the prompt
+        prompt = (
+            f"Translate the following Arabic text to {language_name}. Keep every [[n]] marker on its own line, "
+            f"unchanged and in order. Provide only the translation without any additional text or explanations:\n\n{text}"
+        )
+
+        try:
+            response = await self._client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a professional translator specializing in Arabic to other languages."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,  # Lower temperature for more consistent translations
+                max_tokens=4000
+            )
+        except Exception as e:
+            raise TranslationError(f"OpenAI translation error: {str(e)}")
+
+        # Extract the translation from the response; a refusal or content filter leaves no text
+        if not response.choices:
+            raise TranslationError("OpenAI translation error: the response has no choices")
+        choice = response.choices[0]
+        if choice.message.content is None:
+            raise TranslationError(f"OpenAI translation error: no text returned (finish_reason: {choice.finish_reason})")
+        return choice.message.content.strip()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+
+
+class GoogleBackend(TranslationBackend):
+    """Translate with Google Translate via the translators library"""
+
+    name = "google"
+    model = "google"
+
+    def __init__(self):
+        # Importing translators is slow, so it happens once, when the backend is created
+        import translators
+
+        self._translators = translators
+
+    async def translate(self, text: str, target_language: str) -> str:
+        """Translate text using Google Translate API via translators library"""
+        target_lang = GOOGLE_LANGUAGE_MAP.get(target_language, target_language)
+
+        for attempt in range(TRANSLATION_MAX_RETRIES + 1):
+            try:
+                # translators is blocking, so it runs on a worker thread
+                return await asyncio.wait_for(
+                    asyncio.to_thread(self._translators.google, text, from_language="ar", to_language=target_lang),
+                    timeout=TRANSLATION_TIMEOUT,
+                )
+            except Exception as e:
+                if attempt == TRANSLATION_MAX_RETRIES:
+                    raise TranslationError(f"Google translation error: {str(e)}")
+                await asyncio.sleep(random.uniform(0, 2 ** attempt))
+
+
+class StubBackend(TranslationBackend):
+    """Deterministic local backend for tests and benchmarks; makes no network calls"""
+
+    name = "stub"
+    model = "stub"
+
+    async def translate(self, text: str, target_language: str) -> str:
+        # Tag each line so markers and layout survive, as a real service would keep them
+        return "\n".join(
+            line if not line.strip() or line.startswith("[[") else f"[{target_language}] {line}"
+            for line in text.split("\n")
+        )
+
+
+_backend: Optional[TranslationBackend] = None
+_lock = threading.Lock()
+
+
+def create_translation_backend(service: str = TRANSLATION_SERVICE) -> TranslationBackend:
+    """Create the backend for a translation service name"""
+    service = service.lower()
+    if service == "openai":
+        return OpenAIBackend()
+    elif service == "stub":
+        return StubBackend()
+    return GoogleBackend()
+
+
+def get_translation_backend() -> TranslationBackend:
+    """Return the shared translation backend, creating it on first use"""
+    global _backend
+    with _lock:
+        if _backend is None:
+            _backend = create_translation_backend()
+        return _backend
+
+
+def set_translation_backend(backend: TranslationBackend) -> None:
+    """Replace the shared translation backend (e.g. with a stub in tests)"""
+    global _backend
+    with _lock:
+        _backend = backend
+
+
+async def close_translation_backend() -> None:
+    """Close the shared backend's connections"""
+    global _backend
+    with _lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        await backend.aclose()
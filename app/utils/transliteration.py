@@ -1,64 +1,246 @@
 import os
-from typing import Optional
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Pattern, Tuple, Union
 
+# Scheme used when a request does not name one
+TRANSLITERATION_SCHEME = os.getenv("TRANSLITERATION_SCHEME", "simplified")
 
-def transliterate_text(text: str) -> str:
+# Size of the pieces iter_transliterate splits a single large text into
+TRANSLITERATION_CHUNK_SIZE = int(os.getenv("TRANSLITERATION_CHUNK_SIZE", str(64 * 1024)))
+
+# Short vowels and tanwin (fathatan to kasra), and every harakah including shadda and sukun
+_VOWEL_MARKS = "ً-ِ"
+_MARKS = "ً-ْ"
+_SHADDA = "ّ"
+
+# Marks that can share a letter with shadda
+_SHADDA_PARTNERS = "ًٌٍَُِْ"
+
+# The original character for character mapping, kept as it was so existing transliterations do not change
+_SIMPLIFIED = {
+    "ا": "a", "أ": "a", "إ": "i", "آ": "aa",
+    "ب": "b", "ت": "t", "ث": "th",
+    "ج": "j", "ح": "h", "خ": "kh",
+    "د": "d", "ذ": "dh", "ر": "r",
+    "ز": "z", "س": "s", "ش": "sh",
+    "ص": "s", "ض": "d", "ط": "t",
+    "ظ": "z", "ع": "`", "غ": "gh",
+    "ف": "f", "ق": "q", "ك": "k",
+    "ل": "l", "م": "m", "ن": "n",
+    "ه": "h", "و": "w", "ي": "y",
+    "ة": "h", "ى": "a", "ء": "'",
+    "ؤ": "w", "ئ": "y",
+    # Vowels and diacritics
+    "َ": "a", "ُ": "u", "ِ": "i",
+    "ّ": "", "ْ": "", "ٌ": "un",
+    "ٍ": "in", "ً": "an", "ـ": "",
+    # Numbers
+    "٠": "0", "١": "1", "٢": "2",
+    "٣": "3", "٤": "4", "٥": "5",
+    "٦": "6", "٧": "7", "٨": "8",
+    "٩": "9",
+    # Punctuation
+    "،": ",", "؛": ";", "؟": "?",
+}
+
+# Characters shared by the schemes of the letter table: digits and punctuation
+_COMMON = {
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+    "،": ",", "؛": ";", "؟": "?", "٪": "%",
+}
+
+# Column order of the letter table below
+_SCHEME_COLUMNS = ("phonetic", "ala-lc", "din31635", "buckwalter")
+
+# Arabic letters and marks in each scheme
+_LETTERS = {
+    "ء": ("'", "ʼ", "ʾ", "'"),
+    "آ": ("aa", "ʼā", "ʾā", "|"),
+    "أ": ("a", "a", "ʾa", ">"),
+    "إ": ("i", "i", "ʾi", "<"),
+    "ؤ": ("w", "ʼ", "ʾ", "&"),
+    "ئ": ("y", "ʼ", "ʾ", "}"),
+    "ا": ("a", "ā", "ā", "A"),
+    "ٱ": ("a", "a", "a", "{"),
+    "ب": ("b", "b", "b", "b"),
+    "ة": ("h", "h", "a", "p"),
+    "ت": ("t", "t", "t", "t"),
+    "ث": ("th", "th", "ṯ", "v"),
+    "ج": ("j", "j", "ǧ", "j"),
+    "ح": ("h", "ḥ", "ḥ", "H"),
+    "خ": ("kh", "kh", "ḫ", "x"),
+    "د": ("d", "d", "d", "d"),
+    "ذ": ("dh", "dh", "ḏ", "*"),
+    "ر": ("r", "r", "r", "r"),
+    "ز": ("z", "z", "z", "z"),
+    "س": ("s", "s", "s", "s"),
+    "ش": ("sh", "sh", "š", "$"),
+    "ص": ("s", "ṣ", "ṣ", "S"),
+    "ض": ("d", "ḍ", "ḍ", "D"),
+    "ط": ("t", "ṭ", "ṭ", "T"),
+    "ظ": ("z", "ẓ", "ẓ", "Z"),
+    "ع": ("`", "ʻ", "ʿ", "E"),
+    "غ": ("gh", "gh", "ġ", "g"),
+    "ـ": ("", "", "", "_"),
+    "ف": ("f", "f", "f", "f"),
+    "ق": ("q", "q", "q", "q"),
+    "ك": ("k", "k", "k", "k"),
+    "ل": ("l", "l", "l", "l"),
+    "م": ("m", "m", "m", "m"),
+    "ن": ("n", "n", "n", "n"),
+    "ه": ("h", "h", "h", "h"),
+    "و": ("w", "w", "w", "w"),
+    "ى": ("a", "á", "ā", "Y"),
+    "ي": ("y", "y", "y", "y"),
+    # Vowels and diacritics
+    "ً": ("an", "an", "an", "F"),
+    "ٌ": ("un", "un", "un", "N"),
+    "ٍ": ("in", "in", "in", "K"),
+    "َ": ("a", "a", "a", "a"),
+    "ُ": ("u", "u", "u", "u"),
+    "ِ": ("i", "i", "i", "i"),
+    "ّ": ("", "", "", "~"),
+    "ْ": ("", "", "", "o"),
+    "ٰ": ("a", "ā", "ā", "`"),
+}
+
+# Context rules of the phonetic schemes: long vowels, pause and construct forms
+# of tāʾ marbūṭa, and the sign a hamza seat leaves before its own vowel mark
+_RULES = {
+    "phonetic": {"ā": "aa", "á": "a", "ū": "uu", "ī": "ii", "pause": "ah", "construct": "t", "hamza": "'"},
+    "ala-lc": {"ā": "ā", "á": "á", "ū": "ū", "ī": "ī", "pause": "ah", "construct": "t", "hamza": "ʼ"},
+    "din31635": {"ā": "ā", "á": "ā", "ū": "ū", "ī": "ī", "pause": "a", "construct": "t", "hamza": "ʾ"},
+}
+
+
+class TransliterationScheme:
+    """An Arabic to Latin transliteration scheme compiled for fast repeated use
+
+    The character table is compiled once into a ``str.translate`` map. Schemes
+    with context rules first rewrite the combinations a character table cannot
+    express (doubled consonants, long vowels, tāʾ marbūṭa) with compiled regular
+    expressions or ``str.replace``; every pass runs in C over the whole text.
+    """
+
+    def __init__(self, name: str, letters: Dict[str, str], rules: Optional[Dict[str, str]] = None):
+        self.name = name
+        self._table = str.maketrans(letters)
+        self._rules: List[Tuple[Union[str, Pattern], str]] = []
+
+        if rules:
+            # Shadda is moved in front of a vowel mark typed before it
+            self._rules = [(mark + _SHADDA, _SHADDA + mark) for mark in _SHADDA_PARTNERS]
+            self._rules += [
+                # Alif after fathatan is silent
+                ("ًا", letters["ً"]),
+                ("اً", letters["ً"]),
+                # Long vowels: fatha + alif or alif maqsura, damma + waw, kasra + ya
+                ("َا", rules["ā"]),
+                ("َى", rules["á"]),
+                (re.compile(f"ُو(?![{_MARKS}])"), rules["ū"]),
+                (re.compile(f"ِي(?![{_MARKS}])"), rules["ī"]),
+                # A word-initial alif is a short vowel
+                (re.compile(f"ا(?<![\\w{_MARKS}]ا)"), "a"),
+                # Tāʾ marbūṭa is pronounced before a case ending and silent at a pause
+                (re.compile(f"ة(?=[{_VOWEL_MARKS}])"), rules["construct"]),
+                (re.compile("َ?ة"), rules["pause"]),
+                # A hamza seat followed by its vowel mark leaves only the hamza
+                (re.compile(f"[أإ](?=[{_VOWEL_MARKS}])"), rules["hamza"]),
+                # Shadda doubles its consonant (matched from the shadda, which is quicker to find)
+                (re.compile(f"{_SHADDA}(?<=([ء-ي]){_SHADDA})"), "\\1"),
+            ]
+
+    def transliterate(self, text: str) -> str:
+        """Transliterate Arabic text"""
+        for pattern, replacement in self._rules:
+            # Fixed sequences use str.replace, which is much faster than a regex pass
+            if isinstance(pattern, str):
+                text = text.replace(pattern, replacement)
+            else:
+                text = pattern.sub(replacement, text)
+        return text.translate(self._table)
+
+
+def _compile_schemes() -> Dict[str, TransliterationScheme]:
+    """Build every supported scheme: simplified, and the schemes of the letter table"""
+    schemes = {"simplified": TransliterationScheme("simplified", _SIMPLIFIED)}
+    for column, name in enumerate(_SCHEME_COLUMNS):
+        letters = {**_COMMON, **{letter: values[column] for letter, values in _LETTERS.items()}}
+        schemes[name] = TransliterationScheme(name, letters, _RULES.get(name))
+    return schemes
+
+
+# Supported schemes, compiled once at import
+TRANSLITERATION_SCHEMES = _compile_schemes()
+
+
+def get_scheme(scheme: Optional[str] = None) -> TransliterationScheme:
+    """Return a compiled scheme by name, raising ValueError if it is unknown"""
+    name = (scheme or TRANSLITERATION_SCHEME).lower()
+    if name not in TRANSLITERATION_SCHEMES:
+        raise ValueError(f"Unknown transliteration scheme: {name}")
+    return TRANSLITERATION_SCHEMES[name]
+
+
+def transliterate_text(text: str, scheme: Optional[str] = None) -> str:
     """Transliterate Arabic text to Latin script"""
     if not text:
         return ""
-    
+
     try:
-        # Use the arabic_reshaper and python-bidi libraries for proper handling of Arabic text
-        import arabic_reshaper
-        from bidi.algorithm import get_display
-        
-        # Reshape the Arabic text
-        reshaped_text = arabic_reshaper.reshape(text)
-        
-        # Handle bidirectional text
-        bidi_text = get_display(reshaped_text)
-        
-        # For actual transliteration, we would use a dedicated library
-        # This is a simplified implementation for demonstration purposes
-        # In a real application, you might use a more sophisticated transliteration library
-        
-        # Arabic to Latin character mapping (simplified)
-        arabic_to_latin = {
-            'ا': 'a', 'أ': 'a', 'إ': 'i', 'آ': 'aa',
-            'ب': 'b', 'ت': 't', 'ث': 'th',
-            'ج': 'j', 'ح': 'h', 'خ': 'kh',
-            'د': 'd', 'ذ': 'dh', 'ر': 'r',
-            'ز': 'z', 'س': 's', 'ش': 'sh',
-            'ص': 's', 'ض': 'd', 'ط': 't',
-            'ظ': 'z', 'ع': '`', 'غ': 'gh',
-            'ف': 'f', 'ق': 'q', 'ك': 'k',
-            'ل': 'l', 'م': 'm', 'ن': 'n',
-            'ه': 'h', 'و': 'w', 'ي': 'y',
-            'ة': 'h', 'ى': 'a', 'ء': '\'',
-            'ؤ': 'w', 'ئ': 'y',
-            # Vowels and diacritics
-            'َ': 'a', 'ُ': 'u', 'ِ': 'i',
-            'ّ': '', 'ْ': '', 'ٌ': 'un',
-            'ٍ': 'in', 'ً': 'an', 'ـ': '',
-            # Numbers
-            '٠': '0', '١': '1', '٢': '2',
-            '٣': '3', '٤': '4', '٥': '5',
-            '٦': '6', '٧': '7', '٨': '8',
-            '٩': '9',
-            # Punctuation and spaces
-            ' ': ' ', '،': ',', '؛': ';',
-            '؟': '?', '.': '.', '!': '!',
-            '(': '(', ')': ')', '\n': '\n',
-        }
-        
-        # Perform character-by-character transliteration
-        transliterated = ''
-        for char in text:
-            transliterated += arabic_to_latin.get(char, char)
-        
-        return transliterated
-    
+        return get_scheme(scheme).transliterate(text)
+
     except Exception as e:
         error_message = f"Transliteration error: {str(e)}"
         print(error_message)
-        return error_message
\ No newline at end of file
+        return error_message
+
+
+def iter_transliterate(
+    text: Union[str, Iterable[str]],
+    scheme: Optional[str] = None,
+    chunk_size: int = TRANSLITERATION_CHUNK_SIZE,
+) -> Iterator[str]:
+    """Transliterate a large text, or an iterable of text chunks, piece by piece
+
+    Pieces are cut after whitespace so context rules never see a word split
+    across two pieces; joining the yielded strings gives the same result as
+    ``transliterate_text``.
+    """
+    compiled = get_scheme(scheme)
+    chunks = text
+    if isinstance(text, str):
+        chunks = (text[start:start + chunk_size] for start in range(0, len(text), chunk_size))
+
+    carry = ""
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = max(buffer.rfind(" "), buffer.rfind("\n")) + 1
+        if not cut:
+            # No word boundary yet; keep collecting
+            carry = buffer
+            continue
+        carry = buffer[cut:]
+        yield compiled.transliterate(buffer[:cut])
+
+    if carry:
+        yield compiled.transliterate(carry)
+
+
+def transliterate_batch(items: List[Tuple[str, Optional[str]]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Transliterate many ``(text, scheme)`` items, returning ``(transliteration, error)`` for each
+
+    Identical items are transliterated once.
+    """
+    results: Dict[Tuple[str, str], Tuple[Optional[str], Optional[str]]] = {}
+    batch = []
+    for text, scheme in items:
+        key = (text, (scheme or TRANSLITERATION_SCHEME).lower())
+        if key not in results:
+            if key[1] not in TRANSLITERATION_SCHEMES:
+                results[key] = (None, f"Unknown transliteration scheme: {key[1]}")
+            else:
+                results[key] = (TRANSLITERATION_SCHEMES[key[1]].transliterate(text), None)
+        batch.append(results[key])
+    return batch
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.utils.file_utils import UPLOAD_CHUNK_SIZE, safe_filename, write_chunks
+from app.utils.storage import StorageManager
+
+try:
+    import fcntl
+except ImportError:  # Windows: chunks are only kept apart within one process
+    fcntl = None
+
+# Seconds an unfinished resumable upload is kept after its last chunk
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+# File in an upload's workspace that holds the state of the upload
+_SESSION_FILE = "upload.json"
+
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start where the upload left off"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadBusyError(Exception):
+    """Raised when a chunk arrives while another chunk of the same upload is being written"""
+
+
+def _hash_file(path: Path) -> Any:
+    """SHA-256 of the bytes of a file so far, ready to be updated with more"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest
+
+
+class UploadSessionManager:
+    """Track resumable uploads that arrive in chunks
+
+    An upload is started with its file name and total size, filled with
+    chunks that each continue at the current offset, and finished once every
+    byte has arrived. A client that loses its connection asks for the offset
+    and carries on from there. Each upload gets its own storage workspace,
+    named after the upload id.
+
+    The state of an upload lives in its workspace (the file name, size and
+    times in ``upload.json``, the offset as the size of the part file), so
+    any web worker can take the next chunk and uploads survive a restart.
+    The SHA-256 is updated as chunks are written and kept in memory; a
+    worker that did not see the earlier chunks hashes them from disk once.
+    """
+
+    def __init__(self, storage: StorageManager, ttl: int = UPLOAD_SESSION_TTL):
+        self._storage = storage
+        self._ttl = ttl
+        # Running hash of the uploads this process wrote to, with the offset it covers
+        self._digests: Dict[str, Tuple[int, Any, float]] = {}
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def create(self, filename: str, size: int) -> Dict[str, Any]:
+        """Start an upload of ``size`` bytes and return its state
+
+        Raises StorageQuotaError if there is no room for the file.
+        """
+        self._prune()
+
+        folder = self._storage.create(reserve=size, ttl=self._ttl)
+        upload_id = folder.name
+        name = safe_filename(filename)
+        (folder / f"{name}.part").touch()
+
+        now = time.time()
+        self._write_state(upload_id, {"upload_id": upload_id, "filename": name, "size": size, "created_at": now})
+        with self._lock:
+            self._digests[upload_id] = (0, hashlib.sha256(), now)
+        return self.get(upload_id)
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Return the public state of an upload, or None if it is unknown or has expired"""
+        state = self._read_state(upload_id)
+        if state is None:
+            return None
+        part_path = self._part_path(upload_id, state)
+        try:
+            stat = part_path.stat()
+        except FileNotFoundError:
+            return None
+        if stat.st_mtime < time.time() - self._ttl:
+            self._forget(upload_id)
+            self._storage.release(upload_id)
+            return None
+        return {
+            "upload_id": upload_id, "filename": state["filename"], "size": state["size"],
+            "offset": stat.st_size, "updated_at": stat.st_mtime,
+        }
+
+    def part_path(self, upload_id: str) -> Path:
+        """Return the file an upload is being written to; raises KeyError for an unknown upload"""
+        state = self._read_state(upload_id)
+        if state is None:
+            raise KeyError(upload_id)
+        return self._part_path(upload_id, state)
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Write a chunk that starts at ``offset`` and return the new offset
+
+        Raises KeyError for an unknown upload, UploadOffsetError when the chunk
+        does not continue the upload, UploadBusyError while another chunk is
+        being written and FileTooLargeError if it runs past the declared size.
+        Bytes received before a dropped connection or an error are kept.
+        """
+        session = self.get(upload_id)
+        if session is None:
+            # Never started, finished, or collected by the storage janitor once abandoned
+            raise KeyError(upload_id)
+
+        part_path = self._part_path(upload_id, session)
+        with self._writing(upload_id, part_path) as output:
+            current = output.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadOffsetError(current)
+            digest = await self._digest(upload_id, part_path, current)
+            try:
+                await write_chunks(chunks, output, digest, session["size"] - offset)
+            finally:
+                output.flush()
+                with self._lock:
+                    self._digests[upload_id] = (output.tell(), digest, time.time())
+                self._storage.touch(upload_id)
+                self._storage.measure(upload_id)
+            return output.tell()
+
+    async def finish(self, upload_id: str) -> Tuple[Path, str]:
+        """Close a completely received upload and return its file path and SHA-256
+
+        Raises KeyError for an unknown upload, UploadBusyError while a chunk is
+        being written and UploadOffsetError if bytes are still missing. The
+        workspace stays in place, back on the default TTL; the caller owns it
+        from now on.
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+
+        part_path = self._part_path(upload_id, session)
+        with self._writing(upload_id, part_path):
+            offset = part_path.stat().st_size
+            if offset != session["size"]:
+                raise UploadOffsetError(offset)
+            digest = await self._digest(upload_id, part_path, offset)
+            file_path = part_path.with_name(session["filename"])
+            part_path.rename(file_path)
+            (self._storage.root / upload_id / _SESSION_FILE).unlink(missing_ok=True)
+
+        self._forget(upload_id)
+        self._storage.touch(upload_id, ttl=self._storage.ttl)
+        return file_path, digest.hexdigest()
+
+    def discard(self, upload_id: str) -> bool:
+        """Cancel an upload and delete what was received; returns False if it is unknown"""
+        if self._read_state(upload_id) is None:
+            return False
+        self._forget(upload_id)
+        self._storage.release(upload_id)
+        return True
+
+    @contextmanager
+    def _writing(self, upload_id: str, part_path: Path) -> Iterator[Any]:
+        """Open an upload's part file for appending, as the only writer in any process
+
+        Raises UploadBusyError if another request is writing to it.
+        """
+        with self._lock:
+            if upload_id in self._busy:
+                raise UploadBusyError("Another chunk of this upload is being written")
+            self._busy.add(upload_id)
+        try:
+            with open(part_path, "ab") as output:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(output, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        raise UploadBusyError("Another chunk of this upload is being written")
+                yield output
+        finally:
+            with self._lock:
+                self._busy.discard(upload_id)
+
+    async def _digest(self, upload_id: str, part_path: Path, offset: int) -> Any:
+        """The running hash of an upload up to ``offset``, hashing the part file if this process has not got it"""
+        with self._lock:
+            cached = self._digests.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        # Earlier chunks went to another worker, or to this one before a restart
+        return await run_in_threadpool(_hash_file, part_path)
+
+    def _part_path(self, upload_id: str, state: Dict[str, Any]) -> Path:
+        """The file an upload is written to"""
+        return self._storage.root / upload_id / f"{state['filename']}.part"
+
+    def _read_state(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Read the state file of an upload, or None if there is no such upload"""
+        try:
+            # Upload ids come from the URL; only ids this manager hands out name a workspace
+            if str(uuid.UUID(upload_id)) != upload_id:
+                return None
+            with open(self._storage.root / upload_id / _SESSION_FILE, encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            return None
+
+    def _write_state(self, upload_id: str, state: Dict[str, Any]) -> None:
+        """Write the state file of an upload"""
+        path = self._storage.root / upload_id / _SESSION_FILE
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(state), encoding="utf-8")
+        temp_path.replace(path)
+
+    def _forget(self, upload_id: str) -> None:
+        """Drop this process's running hash of an upload"""
+        with self._lock:
+            self._digests.pop(upload_id, None)
+
+    def _prune(self) -> None:
+        """Drop running hashes of uploads that have not received a chunk within the TTL
+
+        Their workspaces are left to the storage janitor, which collects them
+        once they have been idle for the upload TTL.
+        """
+        cutoff = time.time() - self._ttl
+        with self._lock:
+            self._digests = {
+                upload_id: entry for upload_id, entry in self._digests.items() if entry[2] >= cutoff
+            }
@@ -0,0 +1,78 @@
+import argparse
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils.job_queue import JobWorker, SQLiteJobQueue
+from app.utils.job_states import OCR_WORKERS
+from app.utils.metrics import registry
+from app.utils.mistral_client import close_mistral_client
+from app.utils.ocr_executors import shutdown_executors, warm_up_engines
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve this worker's metrics, which the web process cannot see"""
+
+    def do_GET(self) -> None:
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+def main() -> None:
+    """Run OCR workers for the durable job queue (JOB_BACKEND=sqlite)
+
+    Start as many worker processes as the OCR load needs, next to the API or
+    on other machines sharing STORAGE_ROOT and JOB_QUEUE_PATH. Stopping a
+    worker (SIGTERM or Ctrl+C) lets its running jobs finish first; jobs of a
+    worker that was killed are taken over once their lease runs out.
+    """
+    parser = argparse.ArgumentParser(description="ArabicOCR job worker")
+    parser.add_argument("--concurrency", type=int, default=OCR_WORKERS, help="jobs to run at the same time")
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this port")
+    parser.add_argument("--list-failed", action="store_true", help="list dead-lettered jobs and exit")
+    parser.add_argument("--requeue", nargs="+", metavar="JOB_ID", help="retry dead-lettered jobs and exit")
+    args = parser.parse_args()
+
+    queue = SQLiteJobQueue()
+
+    if args.list_failed:
+        for job in queue.dead_letters():
+            print(f"{job['upload_id']}\tattempts={job['attempts']}\t{job['error']}")
+        return
+
+    if args.requeue:
+        for job_id in args.requeue:
+            print(f"{job_id}: {'requeued' if queue.requeue(job_id) else 'not a dead-lettered job'}")
+        return
+
+    if args.metrics_port:
+        server = ThreadingHTTPServer(("0.0.0.0", args.metrics_port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+    warm_up_engines()
+    worker = JobWorker(queue, concurrency=args.concurrency)
+
+    def stop(signum, frame) -> None:
+        print("Stopping after the running jobs")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"OCR worker {worker.worker_id} running {args.concurrency} jobs at a time")
+    try:
+        worker.run()
+    finally:
+        shutdown_executors()
+        close_mistral_client()
+
+
+if __name__ == "__main__":
+    main()
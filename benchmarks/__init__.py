@@ -0,0 +1 @@
+# Benchmarks for ArabicOCR
\ No newline at end of file
@@ -0,0 +1,381 @@
+"""Benchmark the OCR, translation and export paths end to end and in isolation
+
+Run from the repository root:
+
+    python -m benchmarks.run --documents 8 --pages 4 --output results.json
+
+Synthetic Arabic documents go through upload -> OCR -> translate ->
+transliterate -> DOCX export against the app in this process. Mistral and
+OpenAI are replaced by a local stub server and Google by the stub
+translation backend, so runs are repeatable and offline. Latency (p50/p95),
+pages per second and peak RSS are reported per stage, followed by
+microbenchmarks of transliteration and DOCX creation on large inputs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from benchmarks.stubs import StubAPIServer
+from benchmarks.synthetic import large_arabic_text, write_documents
+
+# Seconds between job status checks while waiting for OCR
+POLL_INTERVAL = 0.01
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of some values"""
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies: List[float], pages: int = 0, peak_rss: int = 0) -> Dict[str, Any]:
+    """Latency percentiles of a stage, with its throughput and memory peak"""
+    if not latencies:
+        return {"count": 0}
+    summary = {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1),
+    }
+    if pages:
+        summary["pages_per_sec"] = round(pages / sum(latencies), 2)
+    return summary
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No procfs: fall back to the lifetime peak (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Sample resident memory on a background thread and keep the peak of each stage"""
+
+    def __init__(self, interval: float = 0.005):
+        self._interval = interval
+        self._active: Dict[str, int] = {}
+        self.peaks: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self.sample()
+
+    def sample(self) -> None:
+        rss = current_rss()
+        with self._lock:
+            for stage in self._active:
+                self.peaks[stage] = max(self.peaks.get(stage, 0), rss)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+        self.sample()
+        try:
+            yield
+        finally:
+            self.sample()
+            with self._lock:
+                self._active[name] -= 1
+                if not self._active[name]:
+                    del self._active[name]
+
+    def start(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+class StageRecorder:
+    """Latencies, pages and peak memory of each stage"""
+
+    def __init__(self, sampler: RSSSampler):
+        self._sampler = sampler
+        self._latencies: Dict[str, List[float]] = {}
+        self._pages: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, pages: int = 0) -> Iterator[None]:
+        start = time.perf_counter()
+        with self._sampler.stage(name):
+            yield
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._latencies.setdefault(name, []).append(elapsed)
+            self._pages[name] = self._pages.get(name, 0) + pages
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            name: summarize(latencies, self._pages.get(name, 0), self._sampler.peaks.get(name, 0))
+            for name, latencies in self._latencies.items()
+        }
+
+
+def configure_environment(args: argparse.Namespace, stub: StubAPIServer, work_dir: Path) -> None:
+    """Point the app at the stubs; must run before the app is imported"""
+    os.environ.update(
+        {
+            "MISTRAL_API_KEY": "benchmark",
+            "MISTRAL_API_URL": stub.mistral_url,
+            "MISTRAL_RATE_LIMIT": "0",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": stub.openai_url,
+            "TRANSLATION_SERVICE": args.translation,
+            "OCR_FAKE_ENGINE": "true",
+            "OCR_FAKE_DELAY": str(args.latency),
+            "STORAGE_ROOT": str(work_dir / "storage"),
+            "JOB_BACKEND": "memory",
+            # Every run must do the work: no cached OCR or translations
+            "OCR_CACHE_DIR": "",
+            "TRANSLATION_CACHE_ENTRIES": "0",
+            "TRANSLATION_CACHE_DIR": "",
+            # All requests come from one client; measure throughput, not the admission limits
+            "ADMISSION_ENABLED": "false",
+        }
+    )
+
+
+def _check(response, stage: str) -> Dict[str, Any]:
+    if response.status_code >= 400:
+        raise RuntimeError(f"{stage} failed with {response.status_code}: {response.text[:200]}")
+    return response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+
+
+def run_flow(client, document: Path, engine: str, pages: int, recorder: StageRecorder, timeout: float) -> None:
+    """Push one document through upload, OCR, translation, transliteration and DOCX export"""
+    media_type = "application/pdf" if document.suffix == ".pdf" else "image/png"
+    with recorder.stage("upload"):
+        with open(document, "rb") as f:
+            response = client.post(
+                "/api/ocr/upload",
+                files={"file": (document.name, f, media_type)},
+                data={"engine": engine, "use_cache": "false"},
+            )
+        upload_id = _check(response, "upload")["upload_id"]
+
+    with recorder.stage("ocr", pages=pages):
+        deadline = time.monotonic() + timeout
+        while True:
+            job = _check(client.get(f"/api/ocr/jobs/{upload_id}"), "ocr")
+            if job["status"] == "failed":
+                raise RuntimeError(f"OCR failed: {job['error']}")
+            if job["status"] == "completed":
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError("OCR timed out")
+            time.sleep(POLL_INTERVAL)
+
+    with recorder.stage("translate"):
+        _check(client.post("/api/translation/translate", json={"upload_id": upload_id, "target_language": "en"}), "translate")
+
+    with recorder.stage("transliterate"):
+        _check(client.post("/api/translation/transliterate", json={"upload_id": upload_id}), "transliterate")
+
+    with recorder.stage("export_docx"):
+        _check(client.post("/api/export/docx", json={"upload_id": upload_id}), "export_docx")
+
+
+def run_end_to_end(args: argparse.Namespace, documents: List[Path], warm_up: List[Path], sampler: RSSSampler) -> Dict[str, Any]:
+    """Run every document through the whole flow, ``concurrency`` at a time"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    pages = 1 if args.format == "png" else args.pages
+    with TestClient(app) as client:
+        # Warm-up documents load lazy imports and open connection pools; they are not recorded
+        for document in warm_up:
+            run_flow(client, document, args.engine, pages, StageRecorder(sampler), args.timeout)
+
+        recorder = StageRecorder(sampler)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            futures = [
+                executor.submit(run_flow, client, document, args.engine, pages, recorder, args.timeout)
+                for document in documents
+            ]
+            errors = [str(future.exception()) for future in futures if future.exception() is not None]
+        wall_time = time.perf_counter() - start
+
+    completed = len(documents) - len(errors)
+    return {
+        "stages": recorder.summary(),
+        "documents": len(documents),
+        "errors": errors,
+        "wall_seconds": round(wall_time, 3),
+        "documents_per_sec": round(completed / wall_time, 3),
+        "pages_per_sec": round(completed * pages / wall_time, 2),
+    }
+
+
+def time_calls(func: Callable[[], Any], repeat: int, sampler: RSSSampler, name: str) -> List[float]:
+    """Latencies of ``repeat`` calls of ``func``"""
+    latencies = []
+    for _ in range(repeat):
+        with sampler.stage(name):
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_micro(args: argparse.Namespace, sampler: RSSSampler) -> Dict[str, Any]:
+    """Microbenchmarks of transliteration and DOCX creation on large inputs"""
+    from app.utils.document_export import create_docx
+    from app.utils.transliteration import transliterate_text
+
+    text = large_arabic_text(args.micro_chars)
+    lines = text.count("\n") + 1
+    results = {}
+
+    transliterate_text(text[:1000])
+    latencies = time_calls(lambda: transliterate_text(text), args.micro_repeat, sampler, "transliterate_text")
+    results["transliterate_text"] = {
+        **summarize(latencies, peak_rss=sampler.peaks.get("transliterate_text", 0)),
+        "characters": len(text),
+        "chars_per_sec": round(len(text) * len(latencies) / sum(latencies)),
+    }
+
+    transliterated = transliterate_text(text)
+    translated = "\n".join(f"[en] {line}" for line in text.split("\n"))
+    create_docx(text[:1000])
+    latencies = time_calls(lambda: create_docx(text, translated, transliterated), args.micro_repeat, sampler, "create_docx")
+    results["create_docx"] = {
+        **summarize(latencies, peak_rss=sampler.peaks.get("create_docx", 0)),
+        "lines": lines * 3,
+        "lines_per_sec": round(lines * 3 * len(latencies) / sum(latencies)),
+    }
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print a table of the results, with the change in p50 against a baseline run"""
+    sections = [("end to end", results.get("end_to_end", {}).get("stages", {})), ("micro", results.get("micro", {}))]
+    for title, stages in sections:
+        if not stages:
+            continue
+        print(f"\n{title}:")
+        print(f"  {'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'pages/s':>10}{'rss MB':>10}{'vs base':>10}")
+        for name, stage in stages.items():
+            change = ""
+            if baseline:
+                base_stages = baseline.get("end_to_end", {}).get("stages", {}) if title == "end to end" else baseline.get("micro", {})
+                base = base_stages.get(name, {}).get("p50_ms")
+                if base:
+                    change = f"{(stage['p50_ms'] - base) / base * 100:+.1f}%"
+            print(
+                f"  {name:<20}{stage.get('p50_ms', ''):>10}{stage.get('p95_ms', ''):>10}"
+                f"{stage.get('pages_per_sec', ''):>10}{stage.get('peak_rss_mb', ''):>10}{change:>10}"
+            )
+
+    end_to_end = results.get("end_to_end")
+    if end_to_end:
+        print(
+            f"\n{end_to_end['documents']} documents in {end_to_end['wall_seconds']} s: "
+            f"{end_to_end['pages_per_sec']} pages/s, {len(end_to_end['errors'])} errors"
+        )
+        for error in end_to_end["errors"][:5]:
+            print(f"  {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ArabicOCR benchmarks")
+    parser.add_argument("--documents", type=int, default=8, help="documents to push through the flow")
+    parser.add_argument("--pages", type=int, default=4, help="pages per PDF document")
+    parser.add_argument("--dpi", type=int, default=150, help="resolution of the synthetic pages")
+    parser.add_argument("--format", choices=("pdf", "png"), default="pdf", help="document type (PDF needs poppler)")
+    parser.add_argument("--text-layer", action="store_true", help="give PDFs a text layer, like searchable scans")
+    parser.add_argument("--engine", default="mistral", help="OCR engine selection (mistral, fake, qari, both, merge)")
+    parser.add_argument("--translation", choices=("openai", "stub"), default="openai",
+                        help="openai uses the stub API server; stub is the local backend that stands in for google")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each stubbed API call or fake page takes")
+    parser.add_argument("--concurrency", type=int, default=1, help="documents in flight at the same time")
+    parser.add_argument("--warm-up", type=int, default=1, help="unrecorded documents run first")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for one document's OCR")
+    parser.add_argument("--micro-chars", type=int, default=500_000, help="characters of text for the microbenchmarks")
+    parser.add_argument("--micro-repeat", type=int, default=5, help="runs of each microbenchmark")
+    parser.add_argument("--skip-end-to-end", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", default="benchmark-results.json", help="JSON file the results are written to")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="arabicocr-bench-"))
+    stub = StubAPIServer(latency=args.latency).start()
+    configure_environment(args, stub, work_dir)
+    sampler = RSSSampler().start()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": vars(args),
+        }
+    }
+
+    try:
+        if not args.skip_end_to_end:
+            documents = write_documents(work_dir / "documents", args.documents, args.pages, args.dpi, args.format, args.text_layer)
+            # Warm-up documents get their own seeds so nothing they leave behind helps the measured ones
+            warm_up = write_documents(
+                work_dir / "warm_up", args.warm_up, args.pages, args.dpi, args.format, args.text_layer, first_seed=100_000
+            )
+            results["end_to_end"] = run_end_to_end(args, documents, warm_up, sampler)
+            results["end_to_end"]["stub_api_requests"] = stub.requests
+
+        if not args.skip_micro:
+            results["micro"] = run_micro(args, sampler)
+    finally:
+        sampler.stop()
+        stub.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    Path(args.output).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    print_report(results, baseline)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
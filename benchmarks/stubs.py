@@ -0,0 +1,109 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+from benchmarks.synthetic import arabic_lines
+
+# Text the translation prompt is followed by
+_PROMPT_TEXT = re.compile(r"explanations:\n\n(.*)\Z", re.DOTALL)
+
+
+def _completion(content: str, model: str) -> Dict[str, Any]:
+    """An OpenAI-compatible chat completion response"""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def stub_ocr_text(payload: Dict[str, Any]) -> str:
+    """Deterministic Arabic "OCR" text for the image in a Mistral request"""
+    image_url = payload["messages"][0]["content"][1]["image_url"]["url"]
+    seed = int(hashlib.sha256(image_url.encode("utf-8")).hexdigest()[:8], 16)
+    return "\n".join(arabic_lines(seed, 30))
+
+
+def stub_translation(payload: Dict[str, Any]) -> str:
+    """Tag each line of the text in a translation prompt, keeping the segment markers"""
+    prompt = payload["messages"][-1]["content"]
+    match = _PROMPT_TEXT.search(prompt)
+    text = match.group(1) if match else prompt
+    return "\n".join(
+        line if not line.strip() or line.startswith("[[") else f"[en] {line}" for line in text.split("\n")
+    )
+
+
+class StubAPIServer:
+    """Local stand-in for the Mistral and OpenAI chat APIs
+
+    Serves ``/mistral/v1/chat/completions`` with text derived from the image
+    and ``/openai/v1/chat/completions`` with a tagged copy of the text to
+    translate, each after ``latency`` seconds, so runs are repeatable and
+    never touch the network.
+    """
+
+    def __init__(self, latency: float = 0.05, port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+
+                if self.path.startswith("/mistral/"):
+                    content = stub_ocr_text(payload)
+                elif self.path.startswith("/openai/"):
+                    content = stub_translation(payload)
+                else:
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(_completion(content, payload.get("model", "stub")), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-api", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def mistral_url(self) -> str:
+        return f"{self.base_url}/mistral/v1/chat/completions"
+
+    @property
+    def openai_url(self) -> str:
+        return f"{self.base_url}/openai/v1"
+
+    def start(self) -> "StubAPIServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,133 @@
+import random
+from pathlib import Path
+from typing import List
+
+import arabic_reshaper
+from bidi.algorithm import get_display
+from PIL import Image, ImageDraw, ImageFont
+
+# Words the synthetic pages are made of
+ARABIC_WORDS = (
+    "بسم الله الرحمن الرحيم كتاب باب فصل قال رسول العلم الناس يوم الدين مدينة بيت "
+    "الماء الأرض السماء الشمس القمر الليل النهار طريق قلب عقل حكمة صبر شكر علم عمل "
+    "تاريخ مكتبة مخطوطة صفحة سطر كلمة حرف قرأ كتب جلس ذهب رجع خرج دخل عربي لغة"
+).split()
+
+# TrueType font with Arabic glyphs; pages fall back to PIL's built-in font without it
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+# A4 in inches
+PAGE_SIZE = (8.27, 11.69)
+
+
+def arabic_lines(seed: int, count: int, words_per_line: int = 9) -> List[str]:
+    """Deterministic lines of Arabic words for one page"""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(ARABIC_WORDS) for _ in range(rng.randint(words_per_line // 2, words_per_line)))
+        for _ in range(count)
+    ]
+
+
+def _load_font(size: int) -> ImageFont.ImageFont:
+    try:
+        return ImageFont.truetype(FONT_PATH, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_page(lines: List[str], dpi: int = 150, seed: int = 0) -> Image.Image:
+    """Render lines as a right-aligned scanned-looking page at ``dpi``"""
+    width, height = int(PAGE_SIZE[0] * dpi), int(PAGE_SIZE[1] * dpi)
+    image = Image.new("L", (width, height), 250)
+    draw = ImageDraw.Draw(image)
+    font = _load_font(max(dpi // 6, 8))
+    rng = random.Random(seed)
+
+    margin = dpi // 2
+    line_height = int(dpi / 6 * 1.8)
+    y = margin + rng.randint(0, dpi // 2)
+    for line in lines:
+        if y + line_height > height - margin:
+            break
+        # Shape and reorder so the glyphs join and run right to left
+        text = get_display(arabic_reshaper.reshape(line))
+        text_width = draw.textlength(text, font=font)
+        draw.text((width - margin - text_width - rng.randint(0, dpi // 4), y), text, fill=20, font=font)
+        y += line_height + rng.randint(0, line_height // 2)
+
+    return image.convert("RGB")
+
+
+def write_document(
+    path: Path,
+    pages: int,
+    dpi: int = 150,
+    seed: int = 0,
+    lines_per_page: int = 30,
+    text_layer: bool = False,
+) -> Path:
+    """Write a synthetic Arabic document; its type follows the extension of ``path``
+
+    PDFs hold one scanned-looking image per page, plus an invisible text
+    layer with ``text_layer``. Image files hold a single page.
+    """
+    path = Path(path)
+    page_images = [
+        render_page(arabic_lines(seed * 1000 + number, lines_per_page), dpi, seed * 1000 + number)
+        for number in range(1 if path.suffix.lower() != ".pdf" else pages)
+    ]
+
+    if path.suffix.lower() != ".pdf":
+        page_images[0].save(path)
+    elif text_layer:
+        _write_pdf_with_text(path, page_images, seed, lines_per_page)
+    else:
+        page_images[0].save(path, save_all=True, append_images=page_images[1:], resolution=dpi)
+    return path
+
+
+def _write_pdf_with_text(path: Path, page_images: List[Image.Image], seed: int, lines_per_page: int) -> None:
+    """Write page images with their text as an invisible layer, like a searchable scan"""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont("BenchmarkArabic", FONT_PATH))
+    page_width, page_height = PAGE_SIZE[0] * 72, PAGE_SIZE[1] * 72
+    pdf = canvas.Canvas(str(path), pagesize=(page_width, page_height))
+    for number, image in enumerate(page_images):
+        pdf.drawImage(ImageReader(image), 0, 0, page_width, page_height)
+        text = pdf.beginText(36, page_height - 48)
+        text.setTextRenderMode(3)
+        text.setFont("BenchmarkArabic", 10)
+        for line in arabic_lines(seed * 1000 + number, lines_per_page):
+            text.textLine(get_display(arabic_reshaper.reshape(line)))
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+
+
+def large_arabic_text(characters: int, seed: int = 0) -> str:
+    """Arabic text of about ``characters`` characters, for microbenchmarks"""
+    lines: List[str] = []
+    size = 0
+    page = 0
+    while size < characters:
+        for line in arabic_lines(seed * 1000 + page, 50):
+            lines.append(line)
+            size += len(line) + 1
+        page += 1
+    return "\n".join(lines)[:characters]
+
+
+def write_documents(
+    directory: Path, count: int, pages: int, dpi: int, extension: str, text_layer: bool = False, first_seed: int = 1
+) -> List[Path]:
+    """Write ``count`` distinct synthetic documents into ``directory``, seeded from ``first_seed`` on"""
+    directory.mkdir(parents=True, exist_ok=True)
+    return [
+        write_document(directory / f"document_{number}.{extension}", pages, dpi, seed=first_seed + number, text_layer=text_layer)
+        for number in range(count)
+    ]
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from app.utils.job_queue import SQLiteJobQueue
+from app.utils.jobs import JOB_COMPLETED, JOB_PROCESSING
+from app.utils.ocr_pipeline import run_ocr_job
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_worker_imports_with_sqlite_backend(tmp_path):
+    env = {**os.environ, "JOB_BACKEND": "sqlite", "JOB_QUEUE_PATH": str(tmp_path / "jobs.sqlite3")}
+    completed = subprocess.run(
+        [sys.executable, "-c", "import app.worker, app.utils.jobs as jobs; print(type(jobs.job_manager).__name__)"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "SQLiteJobQueue"
+
+
+def test_complete_after_losing_the_lease_is_dropped(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    queue.submit("job", run_ocr_job, "missing.png", "fake", "job")
+    assert queue.claim("first", lease_seconds=0)["id"] == "job"
+    time.sleep(0.01)
+    # The lease expired and another worker took the job over
+    assert queue.claim("second")["id"] == "job"
+
+    assert not queue.complete("job", "first", {"text": "stale", "page_count": 1})
+    job = queue.get("job")
+    assert job["status"] == JOB_PROCESSING and job["result"] is None
+    assert all(event["event"] != JOB_COMPLETED for event in queue.events_since("job", 0)[0])
+
+    assert queue.complete("job", "second", {"text": "fresh", "page_count": 1})
+    assert queue.get("job")["result"]["text"] == "fresh"
+    assert queue.events_since("job", 0)[0][-1]["event"] == JOB_COMPLETED
@@ -0,0 +1,24 @@
+from app.utils.ocr_merge import merge_texts
+
+
+def test_agreeing_lines_are_kept_once():
+    text = "السطر الأول\nالسطر الثاني"
+    assert merge_texts(text, text) == text
+
+
+def test_dissimilar_paired_lines_keep_the_more_plausible_reading():
+    primary = "السطر الأول\n#@! 12 ?%\nالسطر الأخير"
+    secondary = "السطر الأول\nكتاب جديد\nالسطر الأخير"
+    assert merge_texts(primary, secondary) == "السطر الأول\nكتاب جديد\nالسطر الأخير"
+    assert merge_texts(secondary, primary) == "السطر الأول\nكتاب جديد\nالسطر الأخير"
+
+
+def test_lines_only_one_engine_read_are_kept():
+    primary = "السطر الأول\nالسطر الأخير"
+    secondary = "السطر الأول\nسطر إضافي\nالسطر الأخير"
+    assert merge_texts(primary, secondary) == secondary
+
+
+def test_an_error_from_one_engine_keeps_the_other_text():
+    assert merge_texts("Error: timeout", "نص") == "نص"
+    assert merge_texts("نص", "Mistral API error: 500") == "نص"
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from app.utils.storage import StorageManager, StorageQuotaError
+
+
+def test_usage_is_counted_on_reserve_write_and_release(tmp_path):
+    (tmp_path / "leftover").mkdir()
+    (tmp_path / "leftover" / "file").write_bytes(b"x" * 100)
+    storage = StorageManager(root=tmp_path, quota=1000, page_root=None)
+    assert storage.usage() == 100
+
+    workspace = storage.create("a", reserve=300)
+    assert storage.usage() == 400
+
+    (workspace / "file").write_bytes(b"y" * 500)
+    storage.measure("a")
+    assert storage.usage() == 600
+    with pytest.raises(StorageQuotaError):
+        storage.create("b", reserve=500)
+
+    with storage.lease("a"):
+        (workspace / "more").write_bytes(b"z" * 50)
+    assert storage.usage() == 650
+
+    storage.release("a")
+    assert storage.usage() == 100
+
+
+def test_janitor_recounts_the_root(tmp_path):
+    storage = StorageManager(root=tmp_path, quota=0, page_root=None)
+    workspace = storage.create("a", reserve=10)
+    (workspace / "file").write_bytes(b"y" * 200)
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "file").write_bytes(b"x" * 70)
+
+    storage.collect()
+    assert storage.usage() == 270
+
+
+def test_janitor_honours_workspaces_of_other_processes(tmp_path):
+    owner = StorageManager(root=tmp_path, quota=0, ttl=60, page_root=None)
+    other = StorageManager(root=tmp_path, quota=0, ttl=60, page_root=None)
+    for workspace_id in ("leased", "pinned", "touched", "idle"):
+        owner.create(workspace_id, ttl=1)
+    owner.pin("pinned")
+    other.touch("touched", ttl=3600)
+
+    with owner.lease("leased"):
+        time.sleep(1.1)
+        # The owner's janitor keeps its lease alive; the other one takes the idle workspace
+        owner.collect()
+        other.collect()
+        assert not (tmp_path / "idle").exists()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["leased", "pinned", "touched"]
@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.utils.tiling import plan_tiles, stitch_texts
+
+# Word blocks of the synthetic page: 80 pixels wide, 10 apart, on lines 30 high and 60 apart
+_WORD, _STEP, _LINE, _LEADING, _MARGIN = 80, 90, 30, 60, 100
+
+
+def _words(width: int, height: int):
+    """(line, word, left, top) of every word on a gutterless page; every fifth line is short"""
+    words = []
+    for line, top in enumerate(range(_MARGIN, height - _MARGIN, _LEADING)):
+        # Arabic lines start on the right, so a short line stops early on the left
+        stop = width // 2 if line % 5 == 4 else _MARGIN
+        for number, right in enumerate(range(width - _MARGIN, stop, -_STEP)):
+            if right - _WORD >= _MARGIN:
+                words.append((line, number, right - _WORD, top))
+    return words
+
+
+def _page(width: int, height: int) -> np.ndarray:
+    """A light page with lines of "words" running its full width and no gutter"""
+    page = np.full((height, width), 250, dtype=np.uint8)
+    for _, _, left, top in _words(width, height):
+        page[top:top + _LINE, left:left + _WORD] = 20
+    return page
+
+
+def _read(tile, words) -> str:
+    """What an engine reads on a tile: the lines it sees, with every word it sees part of, right to left"""
+    left, top, right, bottom = tile.box
+    lines = {}
+    for line, number, word_left, word_top in words:
+        if top <= word_top + _LINE // 2 < bottom and word_left < right and word_left + _WORD > left:
+            lines.setdefault(line, []).append((number, f"w{line}.{number}"))
+    return "\n".join(" ".join(word for _, word in sorted(lines[line])) for line in sorted(lines))
+
+
+def test_tiles_stay_within_the_tile_size():
+    words = _words(5000, 3000)
+    tiles = plan_tiles(_page(5000, 3000), tile_size=1000, overlap=20)
+    assert len({tile.column for tile in tiles}) == 1
+    assert all(right - left <= 1000 and bottom - top <= 1000 for left, top, right, bottom in (t.box for t in tiles))
+    # Lines are cut into pieces between words, never through one
+    pieces = [tile.box for tile in tiles if tile.row == 0]
+    assert len(pieces) > 1
+    cuts = [left + 20 for left, _, _, _ in pieces[:-1]]
+    assert all(not left < cut < left + _WORD for cut in cuts for _, _, left, _ in words)
+
+
+def test_tiles_cover_the_page():
+    page = _page(5000, 3000)
+    covered = np.zeros(page.shape, dtype=bool)
+    for left, top, right, bottom in (tile.box for tile in plan_tiles(page, tile_size=1000, overlap=20)):
+        covered[top:bottom, left:right] = True
+    assert covered[page < 128].all()
+
+
+def test_a_gutterless_wide_page_is_stitched_back_in_reading_order():
+    words = _words(5000, 3000)
+    tiles = plan_tiles(_page(5000, 3000), tile_size=1000, overlap=20)
+    text = stitch_texts(tiles, [_read(tile, words) for tile in tiles])
+
+    expected = {}
+    for line, number, _, _ in words:
+        expected.setdefault(line, []).append(f"w{line}.{number}")
+    assert text == "\n".join(" ".join(line_words) for _, line_words in sorted(expected.items()))
+
+
+def test_columns_are_stitched_right_to_left():
+    page = np.full((1000, 3000), 250, dtype=np.uint8)
+    for top in range(100, 900, 60):
+        page[top:top + 30, 1700:2900] = 20
+        page[top:top + 30, 100:1300] = 20
+    tiles = plan_tiles(page, tile_size=2000, overlap=20)
+    assert [tile.column for tile in tiles] == [0, 1]
+    assert tiles[0].box[0] > tiles[1].box[0]
+    assert stitch_texts(tiles, ["right\nside", "left"]) == "right\nside\n\nleft"
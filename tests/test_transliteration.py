@@ -0,0 +1,29 @@
+import pytest
+
+from app.utils.transliteration import iter_transliterate, transliterate_text
+
+# A vowelled sentence with shadda, long vowels, hamza seats, tāʾ marbūṭa and Arabic digits
+TEXT = "إِنَّ المَدْرَسَةَ الكَبِيرَةُ في مَدِينَةٍ قَدِيمَةٍ، أَسْئِلَةٌ؟ ٢٠٢٤\nسَأَلَ مُؤْمِنٌ عَنْ ماءٍ"
+
+
+def test_simplified_is_the_original_character_mapping():
+    assert transliterate_text("مدرسة كبيرة") == "mdrsh kbyrh"
+    # Every letter and mark maps on its own: the seat and the kasra both give "i", shadda is dropped
+    assert transliterate_text("إِنَّ ماءٍ ٢٠٢٤") == "iina ma'in 2024"
+
+
+def test_phonetic_applies_context_rules():
+    assert transliterate_text("مَدْرَسَةٌ", "phonetic") == "madrasatun"
+    assert transliterate_text("مَدْرَسَة", "phonetic") == "madrasah"
+    assert transliterate_text("إِنَّ", "phonetic") == "'inna"
+    assert transliterate_text("كِتَابٌ", "phonetic") == "kitaabun"
+
+
+def test_ala_lc_keeps_the_hamza_of_alif_madda():
+    assert transliterate_text("آمَنَ", "ala-lc") == "ʼāmana"
+    assert transliterate_text("القُرْآن", "ala-lc") == "alqurʼān"
+
+
+@pytest.mark.parametrize("scheme", ["simplified", "phonetic", "ala-lc", "din31635", "buckwalter"])
+def test_pieces_join_to_the_whole(scheme):
+    assert "".join(iter_transliterate(TEXT * 50, scheme, chunk_size=37)) == transliterate_text(TEXT * 50, scheme)
@@ -0,0 +1,39 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from app.utils.storage import StorageManager
+from app.utils.uploads import UploadOffsetError, UploadSessionManager
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+def test_an_upload_can_be_continued_by_another_worker(tmp_path):
+    # Two web workers: their own managers, one storage root
+    first = UploadSessionManager(StorageManager(root=tmp_path, page_root=None))
+    second = UploadSessionManager(StorageManager(root=tmp_path, page_root=None))
+    data = b"0123456789" * 1000
+
+    upload_id = first.create("scan.png", len(data))["upload_id"]
+    assert asyncio.run(first.append(upload_id, 0, _chunks(data[:3000]))) == 3000
+    assert second.get(upload_id)["offset"] == 3000
+    with pytest.raises(UploadOffsetError):
+        asyncio.run(second.append(upload_id, 0, _chunks(data[:3000])))
+
+    assert asyncio.run(second.append(upload_id, 3000, _chunks(data[3000:7000]))) == 7000
+    assert asyncio.run(first.append(upload_id, 7000, _chunks(data[7000:]))) == len(data)
+    file_path, digest = asyncio.run(second.finish(upload_id))
+
+    assert file_path.read_bytes() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert first.get(upload_id) is None
+
+
+def test_unknown_and_malformed_upload_ids_are_not_found(tmp_path):
+    sessions = UploadSessionManager(StorageManager(root=tmp_path, page_root=None))
+    assert sessions.get("../etc") is None
+    assert sessions.get("0b5c2b46-2f0e-4a47-9d52-5f7a1e0d9c11") is None
+    assert not sessions.discard("0b5c2b46-2f0e-4a47-9d52-5f7a1e0d9c11")